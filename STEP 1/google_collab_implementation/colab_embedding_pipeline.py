@@ -14,13 +14,29 @@
 # What it does:
 # Installs the required Python libraries (`google-generativeai` for the Gemini API
 # and `pandas` for data manipulation) directly into the Colab environment.
-# The `-q` flag makes the installation "quiet" by reducing the output.
+# Only the packages that are missing are installed, with the same `pip` as the
+# running Python. The `-q` flag makes the installation "quiet".
 # Why it's here:
 # Colab environments are temporary and don't come with all libraries pre-installed.
-# This command ensures the script has the tools it needs to run.
+# This ensures the script has the tools it needs to run. It is plain Python
+# (not the `!pip` shell magic), so the file also runs outside a notebook.
 # ------------------------------------------------------------------------------
 print("BLOCK 1: Installing dependencies...")
-!pip install google-generativeai pandas -q
+import importlib.util
+import subprocess
+import sys
+
+REQUIRED_PACKAGES = {"google.generativeai": "google-generativeai", "pandas": "pandas"}
+missing = []
+for module_name, package in REQUIRED_PACKAGES.items():
+    try:
+        found = importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:  # the parent package (`google`) is missing
+        found = False
+    if not found:
+        missing.append(package)
+if missing:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "-q", *missing])
 print("Dependencies installed.")
 print("="*50)
 
@@ -42,6 +58,9 @@ import json
 import pandas as pd
 import time
 import io
+import hashlib
+import sqlite3
+from array import array
 from google.colab import userdata, files
 
 # Retrieve the API key from Colab secrets
@@ -85,12 +104,14 @@ try:
     # Read the CSV content from memory (bytes) into a DataFrame
     df = pd.read_csv(io.BytesIO(csv_content))
 
-    # Convert the DataFrame to a list of dictionaries (JSON records)
-    data_json = df.to_dict(orient="records")
+    # Convert the DataFrame to a list of dictionaries (JSON records).
+    # Empty cells become None, which is written as a valid JSON `null`.
+    df = df.astype(object)
+    data_json = df.where(df.notna(), None).to_dict(orient="records")
 
     # Write the JSON data to a file with nice formatting (indent=4)
     with open("output.json", "w") as f:
-        json.dump(data_json, f, indent=4)
+        json.dump(data_json, f, indent=4, allow_nan=False)
 
     print(f"CSV '{csv_file_name}' converted to 'output.json' with {len(data_json)} records.")
 
@@ -103,25 +124,25 @@ print("="*50)
 # BLOCK 4: CLEAN JSON (NaN to null)
 # ------------------------------------------------------------------------------
 # What it does:
-# Reads the raw text of the generated `output.json`, replaces all non-standard
-# `NaN` values with the valid JSON `null`, and saves the result to a new file
-# called `output_cleaned.json`.
+# Parses the generated `output.json`, turns any non-standard `NaN`/`Infinity`
+# values into the valid JSON `null`, and saves the result to a new file called
+# `output_cleaned.json`.
 # Why it's here:
 # `NaN` is not valid in the JSON standard. Vector databases and other strict
-# parsers will reject it. This block ensures the data is clean and compliant
-# before we proceed to the embedding step.
+# parsers will reject it. BLOCK 3 already writes `null` for empty cells, so this
+# is a safety net; because the JSON parser does the replacement, text such as an
+# operator or town name containing "NaN" is never changed.
 # ------------------------------------------------------------------------------
 print("BLOCK 4: Cleaning generated JSON...")
 try:
+    replaced = []
     with open("output.json", 'r') as f:
-        raw_content = f.read()
-    
-    cleaned_content = raw_content.replace('NaN', 'null')
-    
+        data_json = json.load(f, parse_constant=lambda constant: replaced.append(constant))
+
     with open("output_cleaned.json", 'w') as f:
-        f.write(cleaned_content)
-        
-    print("✅ Replaced NaN with null and saved to 'output_cleaned.json'.")
+        json.dump(data_json, f, indent=4, allow_nan=False)
+
+    print(f"✅ Replaced {len(replaced):,} NaN values with null and saved to 'output_cleaned.json'.")
 except FileNotFoundError:
     print("ERROR: 'output.json' not found. Please ensure the previous step ran correctly.")
 except Exception as e:
@@ -171,7 +192,8 @@ def record_to_text(record):
     parts = []
     for key, value in record.items():
         # Skip empty or null values to keep the text clean
-        if pd.isna(value) or value is None or str(value).strip() == "":
+        # (`value != value` is only true for NaN)
+        if value is None or value != value or str(value).strip() == "":
             continue
         # Clean up keys and values for better readability
         clean_key = str(key).replace("_", " ")
@@ -179,6 +201,50 @@ def record_to_text(record):
         parts.append(f"{clean_key}: {clean_value}")
     return " | ".join(parts)
 
+# Previously generated embeddings are kept in a small SQLite file, keyed by a
+# hash of the model, task type and exact text. Point EMBEDDING_CACHE_FILE at a
+# mounted Google Drive folder to keep the cache between Colab sessions.
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+
+def open_embedding_cache(path=EMBEDDING_CACHE_FILE):
+    """Opens (or creates) the on-disk embedding cache."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings "
+        "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+    )
+    return conn
+
+def embedding_cache_key(text, model="models/text-embedding-004", task_type="retrieval_document"):
+    """Hashes the model, task type and text into a cache key."""
+    return hashlib.sha256(f"{model}\0{task_type}\0{text}\0".encode("utf-8")).hexdigest()
+
+def cache_lookup(conn, text):
+    """Returns the cached vector for a text, or None if it was never embedded."""
+    key = embedding_cache_key(text)
+    row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+    return array("d", row[0]).tolist()
+
+def cache_store(conn, text, vector):
+    """Saves a newly generated vector in the cache."""
+    conn.execute(
+        "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+        (embedding_cache_key(text), array("d", vector).tobytes(), time.time()),
+    )
+
+def cache_commit(conn):
+    """Drops the least recently used entries if the cache is full, then saves it."""
+    conn.execute(
+        "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings "
+        "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (EMBEDDING_CACHE_MAX_ENTRIES,),
+    )
+    conn.commit()
+
 def get_embedding(text, model="models/text-embedding-004"):
     """Generates an embedding for a given text using the Gemini API."""
     try:
@@ -210,7 +276,8 @@ print("="*50)
 # 4. Uses `get_embedding` to generate the embedding vector.
 # 5. Bundles the original text, the vector, and some metadata into a new object.
 # 6. Prints progress updates, including an estimated time of arrival (ETA).
-# 7. Adds a small delay (`time.sleep`) to avoid overwhelming the API.
+# 7. Reuses cached vectors for unchanged text and only pauses (`time.sleep`)
+#    between real API calls to avoid overwhelming the API.
 # 8. Saves the final list of embedded objects to `embeddings.json`.
 # Why it's here:
 # This block ties everything together and executes the main goal of the script.
@@ -234,6 +301,9 @@ def process_records(limit=10000):
 
     results = []
     start_time = time.time()
+    cache = open_embedding_cache()
+    cache_hits = 0
+    api_calls = 0
 
     for i, record in enumerate(data_to_process):
         text_to_embed = record_to_text(record)
@@ -241,10 +311,21 @@ def process_records(limit=10000):
             print(f"Skipped record {i + 1} because it was empty after cleaning.")
             continue
 
-        vector = get_embedding(text_to_embed)
-        if not vector:
-            print(f"Skipped record {i + 1} due to an embedding error.")
-            continue
+        # Reuse the stored vector if this exact text was embedded before
+        vector = cache_lookup(cache, text_to_embed)
+        if vector is not None:
+            cache_hits += 1
+        else:
+            api_calls += 1
+            vector = get_embedding(text_to_embed)
+            if not vector:
+                print(f"Skipped record {i + 1} due to an embedding error.")
+                continue
+            cache_store(cache, text_to_embed, vector)
+
+            # Rate limit: pause for 1 second every 10 API calls to be kind to the API
+            if api_calls % 10 == 0:
+                time.sleep(1)
 
         # Structure the final output object
         result = {
@@ -267,14 +348,17 @@ def process_records(limit=10000):
             remaining_records = actual_limit - (i + 1)
             eta_minutes = (remaining_records * avg_time_per_record) / 60
             print(f"Progress: {i + 1:,}/{actual_limit:,} ({percentage:.1f}%) | ETA: {eta_minutes:.1f} min")
+            cache_commit(cache)
 
-        # Rate limit: pause for 1 second every 10 records to be kind to the API
-        if (i + 1) % 10 == 0:
-            time.sleep(1)
+    cache_commit(cache)
+    cache.close()
 
     total_time_minutes = (time.time() - start_time) / 60
+    lookups = cache_hits + api_calls
+    hit_rate = cache_hits / lookups if lookups else 0.0
     print(f"\nProcessing complete in {total_time_minutes:.1f} minutes.")
     print(f"Generated {len(results):,} embeddings.")
+    print(f"Cache: {cache_hits:,} hits, {api_calls:,} API calls ({hit_rate:.1%} hit rate).")
 
     # Save the final results to a file
     with open("embeddings.json", "w") as f:
@@ -4,7 +4,12 @@
 # What it does:
 # This script loads a CSV file named 'original.csv' using the pandas library,
 # converts its contents into a structured JSON format (a list of records),
-# and saves the result to a file named 'output.json'.
+# and saves the result to a file named 'output.json'. Empty cells are written
+# as JSON `null`, so the output is valid JSON without a separate cleaning step.
+#
+# For large files, set `STREAMING_MODE = True`: the CSV is then read in
+# fixed-size chunks and written to 'output.jsonl' (one JSON record per line)
+# as it goes, so memory use stays the same no matter how big the CSV is.
 #
 # Why it's here:
 # This is the first step in the data preparation pipeline. Converting the data
@@ -20,47 +25,148 @@ import pandas as pd
 import json
 import os
 
+from metrics import Metrics, profile
+
 # --- CONFIGURATION ---
 # The name of the input CSV file. Make sure this file is in the same directory.
 CSV_FILE = "original.csv"
 # The name of the output JSON file that will be created.
 JSON_OUTPUT_FILE = "output.json"
+# Streaming mode reads the CSV in chunks and writes JSON Lines incrementally.
+# Use it for files that are too large to fit in memory.
+STREAMING_MODE = False
+# The name of the JSON Lines file written in streaming mode.
+JSONL_OUTPUT_FILE = "output.jsonl"
+# The number of CSV rows read into memory at a time in streaming mode.
+CHUNK_SIZE = 50_000
+# Time, records/sec and peak memory of the run are saved here (JSON, or
+# Prometheus text for a `.prom` name). Set to None to skip.
+METRICS_FILE = "convert_metrics.json"
+# Set PROFILE=cprofile or PROFILE=tracemalloc to profile the conversion.
+PROFILE = os.getenv("PROFILE")
 # ---------------------
 
-def convert_csv_to_json():
-    """Reads a CSV file and writes its content to a JSON file."""
-    print(f"Starting conversion of '{CSV_FILE}' to JSON...")
+# Explicit types for the known well-production columns. Without them, pandas
+# guesses a type for every chunk separately (a chunk with a blank cell turns a
+# whole count column into floats). Counts and years use the nullable "Int64"
+# type so blank cells do not force them to floats. Unknown columns are inferred.
+COLUMN_DTYPES = {
+    "Production Year": "Int64",
+    "Production Date Entered": "string",
+    "Operator": "string",
+    "County": "string",
+    "Town": "string",
+    "Field": "string",
+    "Producing Formation": "string",
+    "Active Oil Wells": "Int64",
+    "Inactive Oil Wells": "Int64",
+    "Active Gas Wells": "Int64",
+    "Inactive Gas Wells": "Int64",
+    "Injection Wells": "Int64",
+    "Disposal Wells": "Int64",
+    "Self-use Well": "Int64",
+    "Oil Produced, bbl": "float64",
+    "Gas Produced, Mcf": "float64",
+    "Water produced, bbl": "float64",
+    "Taxable Gas, Mcf": "float64",
+    "Purchaser Codes": "string",
+    "Location": "string",
+}
+
+def csv_dtypes(csv_file):
+    """`COLUMN_DTYPES` for the columns that are really in `csv_file`."""
+    header = pd.read_csv(csv_file, nrows=0).columns
+    return {column: COLUMN_DTYPES[column] for column in header if column in COLUMN_DTYPES}
+
+def chunk_to_records(chunk):
+    """Converts a DataFrame chunk into plain Python records, with blanks as None."""
+    # Going through `object` turns numpy/pandas scalars into plain Python values,
+    # and `where` replaces every missing value (NaN, NA, NaT) with None.
+    chunk = chunk.astype(object)
+    return chunk.where(chunk.notna(), None).to_dict(orient="records")
+
+def convert_csv_to_json(csv_file=CSV_FILE, output_file=JSON_OUTPUT_FILE):
+    """Reads a CSV file and writes its content to a JSON file; returns the record count."""
+    print(f"Starting conversion of '{csv_file}' to JSON...")
 
     # Check if the CSV file actually exists before trying to read it.
-    if not os.path.exists(CSV_FILE):
-        print(f"\nERROR: The file '{CSV_FILE}' was not found in this directory.")
+    if not os.path.exists(csv_file):
+        print(f"\nERROR: The file '{csv_file}' was not found in this directory.")
         print("Please add your CSV file to this folder and name it correctly.")
         return
 
     try:
         # Load the CSV file into a pandas DataFrame.
         # A DataFrame is a powerful, table-like data structure.
-        df = pd.read_csv(CSV_FILE)
+        # The same column types as the streaming path and the pipeline, so a
+        # year column with blanks is written as 1995, not 1995.0.
+        df = pd.read_csv(csv_file, dtype=csv_dtypes(csv_file))
 
-        # Convert the DataFrame to a list of dictionaries.
-        # The `orient="records"` argument specifies the format: `[{column: value}, ...]`
-        data_json = df.to_dict(orient="records")
+        # Convert the DataFrame to a list of dictionaries: `[{column: value}, ...]`.
+        # Missing cells become None, so the file is written with valid `null`
+        # values instead of the non-standard `NaN` token.
+        data_json = chunk_to_records(df)
 
         # Write the JSON data to the output file.
         # `with open(...)` ensures the file is properly closed even if errors occur.
         # `json.dump` serializes the Python list into a JSON formatted string.
         # `indent=4` makes the JSON file human-readable with pretty-printing.
-        with open(JSON_OUTPUT_FILE, "w") as f:
-            json.dump(data_json, f, indent=4)
+        # `allow_nan=False` guarantees no `NaN` token can slip into the file.
+        with open(output_file, "w") as f:
+            json.dump(data_json, f, indent=4, allow_nan=False)
 
         print(f"Success! Converted {len(data_json):,} records.")
-        print(f"Output saved to '{JSON_OUTPUT_FILE}'.")
+        print(f"Output saved to '{output_file}'.")
+        return len(data_json)
 
     except Exception as e:
         # Catch any other potential errors during file processing.
         print(f"\nAn unexpected error occurred: {e}")
 
-# This block ensures that the `convert_csv_to_json` function is called only
+def convert_csv_to_jsonl(csv_file=CSV_FILE, output_file=JSONL_OUTPUT_FILE, chunk_size=CHUNK_SIZE):
+    """Streams a CSV file into a JSON Lines file, one chunk of rows at a time; returns the record count."""
+    print(f"Starting streaming conversion of '{csv_file}' to JSON Lines...")
+
+    if not os.path.exists(csv_file):
+        print(f"\nERROR: The file '{csv_file}' was not found in this directory.")
+        print("Please add your CSV file to this folder and name it correctly.")
+        return
+
+    try:
+        dtypes = csv_dtypes(csv_file)
+
+        total = 0
+        with open(output_file, "w", encoding="utf-8") as f:
+            for chunk in pd.read_csv(csv_file, dtype=dtypes, chunksize=chunk_size):
+                # Each chunk is written and then released before the next one is read.
+                lines = [
+                    json.dumps(record, ensure_ascii=False, allow_nan=False)
+                    for record in chunk_to_records(chunk)
+                ]
+                f.write("\n".join(lines) + "\n")
+                total += len(lines)
+                print(f"  ...{total:,} records written")
+
+        print(f"Success! Converted {total:,} records.")
+        print(f"Output saved to '{output_file}'.")
+        return total
+
+    except Exception as e:
+        print(f"\nAn unexpected error occurred: {e}")
+
+# This block ensures that the conversion function is called only
 # when the script is executed directly (not when imported as a module).
+def main():
+    metrics = Metrics()
+    with profile(PROFILE, "convert.prof"), metrics.stage("convert") as timer:
+        if STREAMING_MODE:
+            timer.records = convert_csv_to_jsonl() or 0
+        else:
+            timer.records = convert_csv_to_json() or 0
+    metrics.finish()
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE)
+        print(f"Metrics saved to '{METRICS_FILE}': " + "; ".join(metrics.summary()))
+
 if __name__ == "__main__":
-    convert_csv_to_json()
\ No newline at end of file
+    main()
@@ -6,53 +6,187 @@
 # values, and converts them to the standard JSON `null` value. It then saves
 # the cleaned data to a new file, `output_cleaned.json`.
 #
+# The file is processed one record at a time and the replacement is done by the
+# JSON parser itself, so only real `NaN` (and `Infinity`) values are touched -
+# text such as an operator or town name containing "NaN" is left alone - and
+# memory use does not grow with the size of the file. JSON Lines input
+# (`.jsonl`) is cleaned line by line into a `.jsonl` output.
+#
 # Why it's necessary:
 # The official JSON specification does not include `NaN` (Not a Number).
 # Strict JSON parsers and vector databases will fail if they encounter `NaN`.
 # The correct representation for a missing value in JSON is `null`. This script
 # ensures the file is compliant before the embedding step.
 #
+# Note: files written by the current version of step 1 already use `null`, so
+# this step is only needed for older outputs that are already on disk.
+#
 # How to run:
 # > python 3_clean_json.py
 # ==============================================================================
 
 import json
+import os
+
+from metrics import Metrics, profile
 
 # --- CONFIGURATION ---
 INPUT_FILENAME = "output.json"
 OUTPUT_FILENAME = "output_cleaned.json"
+# Time, records/sec and peak memory of the run are saved here (JSON, or
+# Prometheus text for a `.prom` name). Set to None to skip.
+METRICS_FILE = "clean_metrics.json"
+# Set PROFILE=cprofile or PROFILE=tracemalloc to profile the cleaning.
+PROFILE = os.getenv("PROFILE")
 # ---------------------
 
-def clean_json_nan_values():
-    """Reads a JSON file, replaces NaN with null, and saves to a new file."""
-    print(f"Starting the cleaning process for '{INPUT_FILENAME}'...")
+# How much of a JSON array file is read at a time.
+READ_SIZE = 1024 * 1024
+# A parse error this close to the end of the buffer may just be a token the
+# read cut in two; the longest such token is `-Infinity` or a `\uXXXX` escape.
+_CUT_MARGIN = 16
+
+
+def _cut_off(error, buffer):
+    """True if a decode error may only mean the item runs past the end of `buffer`."""
+    return error.msg.startswith("Unterminated string") or error.pos + _CUT_MARGIN >= len(buffer)
 
-    try:
-        print(f"Step 1: Reading raw content from '{INPUT_FILENAME}'.")
-        with open(INPUT_FILENAME, 'r') as f:
-            raw_content = f.read()
 
-        print("Step 2: Replacing all occurrences of 'NaN' with 'null'.")
-        cleaned_content = raw_content.replace('NaN', 'null')
+class _Replaced:
+    """Counts the non-standard constants the parser has turned into null."""
 
-        print("Step 3: Validating the cleaned content...")
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, constant):
+        # Called by the parser for NaN, Infinity and -Infinity only.
+        self.count += 1
+        return None
+
+
+def iter_json_array(f, decoder, replaced=None):
+    """Yields the items of a top-level JSON array one at a time.
+
+    Only the item currently being parsed (plus one read buffer) is held in memory.
+    `replaced` is the decoder's constant counter, rewound when a parse is retried.
+    """
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators between items.
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                raise ValueError("unexpected end of file inside the JSON array")
+            buffer, position = f.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("the file does not contain a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        before = replaced.count if replaced is not None else 0
         try:
-            json.loads(cleaned_content)
-            print("Validation successful. The content is now valid JSON.")
+            item, end = decoder.raw_decode(buffer, position)
+            # An item is complete once a separator follows it. Otherwise it may be
+            # a number the read cut in two (`123` of `12345`, `1.` of `1.5`).
+            complete = eof or (end < len(buffer) and buffer[end] in " \t\r\n,]")
+            if not complete and end + _CUT_MARGIN < len(buffer):
+                raise ValueError(f"unexpected {buffer[end]!r} after an item of the JSON array")
         except json.JSONDecodeError as e:
-            print(f"ERROR: Validation failed after replacement: {e}")
-            return
+            if eof or not _cut_off(e, buffer):
+                raise
+            complete = False
+        if not complete:
+            if replaced is not None:
+                replaced.count = before
+            # The item is cut off by the end of the buffer: read more and retry.
+            more = f.read(READ_SIZE)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        yield item
+        position = end
+
+
+def clean_jsonl_nan_values(input_file, output_file):
+    """Cleans a JSON Lines file record by record; returns (records, replaced values)."""
+    replaced = _Replaced()
+    decoder = json.JSONDecoder(parse_constant=replaced)
+    records = 0
+    with open(input_file, "r", encoding="utf-8") as src, open(output_file, "w", encoding="utf-8") as dst:
+        for line_number, line in enumerate(src, start=1):
+            if not line.strip():
+                continue
+            before = replaced.count
+            try:
+                record = decoder.decode(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {line_number} is not valid JSON: {e}") from None
+            if replaced.count == before:
+                # Nothing to fix: copy the line through untouched.
+                dst.write(line if line.endswith("\n") else line + "\n")
+            else:
+                dst.write(json.dumps(record, ensure_ascii=False, allow_nan=False) + "\n")
+            records += 1
+    return records, replaced.count
+
+
+def clean_json_array_nan_values(input_file, output_file):
+    """Cleans a JSON array file item by item; returns (records, replaced values)."""
+    replaced = _Replaced()
+    decoder = json.JSONDecoder(parse_constant=replaced)
+    records = 0
+    with open(input_file, "r", encoding="utf-8") as src, open(output_file, "w", encoding="utf-8") as dst:
+        dst.write("[")
+        for item in iter_json_array(src, decoder, replaced):
+            dst.write(",\n" if records else "\n")
+            dst.write(json.dumps(item, indent=4, ensure_ascii=False, allow_nan=False))
+            records += 1
+        dst.write("\n]\n")
+    return records, replaced.count
 
-        print(f"Step 4: Saving the cleaned data to '{OUTPUT_FILENAME}'.")
-        with open(OUTPUT_FILENAME, 'w') as f:
-            f.write(cleaned_content)
 
-        print(f"\nSuccess! Cleaned JSON saved to '{OUTPUT_FILENAME}'.")
+def clean_json_nan_values(input_file=INPUT_FILENAME, output_file=OUTPUT_FILENAME):
+    """Reads a JSON file, replaces NaN with null, and saves to a new file; returns the record count."""
+    print(f"Starting the cleaning process for '{input_file}'...")
+
+    try:
+        if input_file.endswith(".jsonl"):
+            print("Reading JSON Lines input one record at a time.")
+            records, replaced = clean_jsonl_nan_values(input_file, output_file)
+        else:
+            print("Reading the JSON array one record at a time.")
+            records, replaced = clean_json_array_nan_values(input_file, output_file)
+
+        print(f"Validation successful. {records:,} records parsed, "
+              f"{replaced:,} NaN/Infinity values replaced with null.")
+        print(f"\nSuccess! Cleaned JSON saved to '{output_file}'.")
+        return records
 
     except FileNotFoundError:
-        print(f"ERROR: The input file '{INPUT_FILENAME}' was not found. Run step 1 first.")
+        print(f"ERROR: The input file '{input_file}' was not found. Run step 1 first.")
+    except ValueError as e:
+        print(f"ERROR: Validation failed: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
+def main():
+    metrics = Metrics()
+    with profile(PROFILE, "clean.prof"), metrics.stage("clean") as timer:
+        timer.records = clean_json_nan_values() or 0
+    metrics.finish()
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE)
+        print(f"Metrics saved to '{METRICS_FILE}': " + "; ".join(metrics.summary()))
+
 if __name__ == "__main__":
-    clean_json_nan_values()
+    main()
+
@@ -3,8 +3,11 @@
 # ==============================================================================
 # What it does:
 # This script loads the `output.json` file created by the previous script.
-# It then iterates through each record, converts it into a clean text string,
-# and calls the Gemini API to generate a numerical embedding for that text.
+# It then converts each record into a clean text string, splits texts that are
+# too long for one request into overlapping chunks (see `chunking.py`), and
+# sends them to the Gemini API (or the offline "local" backend, see
+# `embedders.py`) in batches, several batches at a time, to
+# generate a numerical embedding for each text.
 # The final output, including the text, vector, and metadata, is saved to
 # `embeddings.json`.
 #
@@ -15,46 +18,103 @@
 #
 # How to run:
 # > python 2_generate_embeddings.py
+#
+# Importing the script only defines its functions: the embedding backend is
+# set up (and the .env file read) the first time an embedding is needed.
 # ==============================================================================
 
 import os
-import google.generativeai as genai
 import json
-import pandas as pd
 import time
-from dotenv import load_dotenv
 
-# --- CONFIGURATION ---
-# Load environment variables from a .env file (for the API key)
-load_dotenv()
+from chunking import CHUNK_OVERLAP, MAX_CHUNK_TOKENS, count_tokens, split_record
+from embedders import create_embedder
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine, error_reason
+from embedding_output import (
+    CheckpointedJsonlWriter, embedding_result, iter_jsonl, replace_records, stale_records, text_digest,
+)
+from enrichment import record_metadata
+from metrics import Metrics, profile
+from record_ids import assign_record_ids
+from text_serializer import record_to_text
 
-# The name of the JSON file to read from.
+# --- CONFIGURATION ---
+# The name of the JSON file to read from. A JSON Lines file (`.jsonl`), such as
+# the streaming output of step 1, can be used as well.
 JSON_INPUT_FILE = "output_cleaned.json"
 # The name of the final output file.
 EMBEDDINGS_OUTPUT_FILE = "embeddings.json"
+# Streaming mode: append each finished batch to a JSON Lines file as it
+# completes and keep a checkpoint next to it. If the run stops (crash, quota,
+# Ctrl+C), simply run the script again and it resumes where it left off.
+# Set to False to write a single `EMBEDDINGS_OUTPUT_FILE` at the end instead.
+STREAMING_OUTPUT = True
+EMBEDDINGS_JSONL_FILE = "embeddings.jsonl"
+# After the run, the embeddings are also saved as a compact binary vector store
+# (float32 matrix + JSON Lines records) that opens instantly for search and
+# import. Set to None to skip it.
+VECTOR_STORE_DIR = "embeddings_store"
+# The embedding backend: "gemini", or "local" for offline hash vectors (see
+# `embedders.py`). None uses EMBEDDING_BACKEND from the environment or the
+# .env file (default "gemini").
+EMBEDDING_BACKEND = None
 # The Gemini model to use for generating embeddings.
 EMBEDDING_MODEL = "models/text-embedding-004"
 # The maximum number of records to process. Set to a high number for all.
 RECORD_LIMIT = 10000
+# Texts longer than this many tokens are embedded as several overlapping chunks
+# (ids `<record id>#0`, `#1`, ...) instead of being cut off.
+CHUNK_TOKENS = MAX_CHUNK_TOKENS
+CHUNK_OVERLAP_TOKENS = CHUNK_OVERLAP
+# How many record texts are packed into a single embedding request (max 100).
+BATCH_SIZE = 100
+# How many batch requests are allowed to run at the same time.
+MAX_IN_FLIGHT = 4
+# Request budget for the embedding API. Lower it if you keep seeing 429 errors.
+REQUESTS_PER_MINUTE = 150
+# How many times a failed batch is retried (with backoff) before giving up.
+MAX_RETRIES = 5
+# On-disk cache of previously generated embeddings. Unchanged records are read
+# from here instead of being sent to the API again. Set to None to disable.
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+# The maximum number of vectors kept in the cache (least recently used go first).
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+# Time per stage, API call latencies, retries and skips by reason, and peak
+# memory of the run are saved here (JSON, or Prometheus text for a `.prom`
+# name). Set to None to skip.
+METRICS_FILE = "embedding_metrics.json"
+# Set PROFILE=cprofile or PROFILE=tracemalloc to profile the embedding loop.
+PROFILE = os.getenv("PROFILE")
 # ---------------------
 
 
-# BLOCK 1: SETUP API KEY
+# BLOCK 1: SETUP THE EMBEDDING BACKEND
 # ------------------------------------------------------------------------------
 # What it does:
-# Retrieves the Gemini API key from the environment variables and configures the
-# `genai` library to use it. Using environment variables is a security best
-# practice that avoids hard-coding secrets in your code.
+# Creates the embedder. For Gemini, it retrieves the API key from the
+# environment variables and configures the `genai` library to use it. Using
+# environment variables is a security best practice that avoids hard-coding
+# secrets in your code. The "local" backend needs no key or network.
 # ------------------------------------------------------------------------------
-print("BLOCK 1: Configuring API key...")
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("❌ ERROR: GEMINI_API_KEY not found in environment variables.")
-    print("👉 Please create a .env file and add: GEMINI_API_KEY='YOUR_KEY_HERE'")
-else:
-    genai.configure(api_key=api_key)
-    print("✅ API key configured successfully.")
-print("="*50)
+embedder = None
+
+def setup_embedder():
+    """Creates the embedder on first use; returns None if it can't be configured."""
+    global embedder
+    if embedder is not None:
+        return embedder
+    print("BLOCK 1: Configuring the embedding backend...")
+    try:
+        embedder = create_embedder(EMBEDDING_BACKEND, model=EMBEDDING_MODEL)
+    except RuntimeError:
+        print("❌ ERROR: GEMINI_API_KEY not found in environment variables.")
+        print("👉 Please create a .env file and add: GEMINI_API_KEY='YOUR_KEY_HERE'")
+        print("👉 Or set EMBEDDING_BACKEND='local' to run offline with hash vectors.")
+    else:
+        print(f"✅ Embedding backend ({embedder.model}) configured successfully.")
+    print("="*50)
+    return embedder
 
 
 # BLOCK 2: HELPER FUNCTIONS
@@ -63,51 +123,61 @@ print("="*50)
 # These functions modularize the script's logic, making it cleaner and more
 # maintainable. Each function has a single, clear responsibility.
 # ------------------------------------------------------------------------------
-print("BLOCK 2: Defining helper functions...")
 
 def load_json_file(filename):
-    """Loads data from a specified JSON file."""
+    """Loads data from a specified JSON (or JSON Lines) file."""
     if not os.path.exists(filename):
         print(f"❌ ERROR: JSON file '{filename}' not found.")
         print("👉 Please run the '1_convert_csv_to_json.py' script first.")
         return None
     try:
-        with open(filename, "r") as f:
-            data = json.load(f)
+        if filename.endswith(".jsonl"):
+            data = list(iter_jsonl(filename))
+        else:
+            with open(filename, "r") as f:
+                data = json.load(f)
         print(f"✅ Loaded {len(data)} records from '{filename}'.")
         return data
     except json.JSONDecodeError:
         print(f"❌ ERROR: Could not decode JSON from '{filename}'. The file may be corrupt.")
         return None
 
-def record_to_text(record):
-    """Converts a single JSON record (dictionary) into a clean text string."""
-    parts = []
-    for key, value in record.items():
-        if pd.isna(value) or value is None or str(value).strip() == "":
-            continue
-        clean_key = str(key).replace("_", " ")
-        clean_value = str(value).replace("\n", " ")
-        parts.append(f"{clean_key}: {clean_value}")
-    return " | ".join(parts)
-
 def get_embedding(text):
-    """Generates an embedding for a given text string using the Gemini API."""
+    """Generates one embedding for a text string using the embedding backend.
+
+    A text that is too long for one request is embedded chunk by chunk in a
+    single batch call, and the chunk vectors are averaged.
+    """
     try:
-        if len(text) > 20000: # Truncate text to stay within API limits
-            text = text[:20000]
-        result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=text,
-            task_type="retrieval_document"
-        )
-        return result['embedding']
+        chunks = [chunk for _, _, chunk in split_record("", text, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)]
+        vectors = get_embeddings(chunks)
+        if len(vectors) == 1:
+            return vectors[0]
+        mean = [sum(values) / len(vectors) for values in zip(*vectors)]
+        norm = sum(value * value for value in mean) ** 0.5 or 1.0
+        return [value / norm for value in mean]
     except Exception as e:
         print(f"\n❌ API call for embedding failed: {e}")
         return []
 
-print("✅ Helper functions are ready.")
-print("="*50)
+def build_result(result_id, text, vector, record, record_id, offset):
+    """Assembles the final structured output for one embedded record or chunk.
+
+    The metadata is the full field set from the STEP 3 guide, taken from this
+    exact record, so no `$lookup` enrichment is needed after the import.
+    Chunks also store the id of their record and where in its text they start.
+    """
+    return embedding_result(result_id, text, vector, record_metadata(record), record_id, offset)
+
+def get_embeddings(texts):
+    """Generates embeddings for a batch of texts in a single backend call.
+
+    Errors are raised rather than swallowed so the embedding engine can retry
+    the batch with backoff.
+    """
+    if setup_embedder() is None:
+        raise RuntimeError("the embedding backend is not configured")
+    return embedder(texts)
 
 
 # BLOCK 3: MAIN PROCESSING LOGIC
@@ -117,14 +187,16 @@ print("="*50)
 # It loads the data, iterates through it, calls the helper functions to process
 # each record, and saves the final result, while providing progress updates.
 # ------------------------------------------------------------------------------
-print("BLOCK 3: Starting the embedding generation process...")
-
 def process_records():
     """Loads, processes, and generates embeddings for the records."""
-    if not api_key: # Stop if the API key wasn't configured
+    if setup_embedder() is None: # Stop if the backend wasn't configured
         return
+    print("BLOCK 3: Starting the embedding generation process...")
 
-    data = load_json_file(JSON_INPUT_FILE)
+    metrics = Metrics()
+    with metrics.stage("load") as timer:
+        data = load_json_file(JSON_INPUT_FILE)
+        timer.records = len(data or [])
     if not data:
         return
 
@@ -135,56 +207,166 @@ def process_records():
     print(f"📊 Processing {actual_limit:,} of {total_available:,} available records.")
     print("-" * 50)
 
+    # Turn every record into text (and long texts into chunks) up front;
+    # empty records are skipped here and counted by reason.
+    planned = []
+    chunked = 0
+    with metrics.stage("serialize", records=len(data_to_process)):
+        # Stable ids come from each record's content, not from its position.
+        record_ids = assign_record_ids(data_to_process)
+        for i, record in enumerate(data_to_process):
+            text_to_embed = record_to_text(record)
+            if not text_to_embed:
+                metrics.count("records_skipped_total", reason="empty_after_cleaning")
+                continue
+            chunks = split_record(record_ids[i], text_to_embed, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+            chunked += len(chunks) > 1
+            planned.append((i, chunks))
+
+    writer = None
+    done = {}
+    if STREAMING_OUTPUT:
+        writer = CheckpointedJsonlWriter(EMBEDDINGS_JSONL_FILE)
+        # A record counts as done only if its stored text is still the same;
+        # changed records and records no longer in the input are removed first.
+        stale = stale_records(writer.done_digests, {
+            record_ids[i]: [(result_id, text) for result_id, _, text in chunks] for i, chunks in planned
+        })
+        if stale:
+            writer.close()
+            replace_records(EMBEDDINGS_JSONL_FILE, None, stale)
+            writer = CheckpointedJsonlWriter(EMBEDDINGS_JSONL_FILE)
+            print(f"♻️ Removed {len(stale):,} records from '{EMBEDDINGS_JSONL_FILE}' that changed "
+                  f"or are no longer in the input.")
+        done = writer.done_digests
+        if done:
+            print(f"♻️ Resuming: {len(done):,} embeddings are already in '{EMBEDDINGS_JSONL_FILE}'.")
+
+    items = []
+    for i, chunks in planned:
+        todo = [(result_id, offset, text) for result_id, offset, text in chunks
+                if done.get(result_id) != text_digest(text)]
+        if not todo:
+            metrics.count("records_skipped_total", reason="already_embedded")
+        for result_id, offset, text in todo:
+            items.append(((i, result_id, offset), text))
+    if chunked:
+        print(f"✂️ {chunked:,} long records were split into chunks of up to {CHUNK_TOKENS:,} tokens.")
+
+    cache = None
+    if EMBEDDING_CACHE_FILE:
+        cache = EmbeddingCache(
+            EMBEDDING_CACHE_FILE,
+            model=embedder.model,
+            task_type="retrieval_document",
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+
+    engine = EmbeddingEngine(
+        get_embeddings,
+        batch_size=BATCH_SIZE,
+        max_in_flight=MAX_IN_FLIGHT,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        max_retries=MAX_RETRIES,
+        cache=cache,
+        metrics=metrics,
+    )
+
     results = []
+    failed = 0
+    completed = 0
+    embedded_tokens = 0
+    write_seconds = 0.0
     start_time = time.time()
 
-    for i, record in enumerate(data_to_process):
-        text_to_embed = record_to_text(record)
-        if not text_to_embed:
-            print(f"⚠️ Skipped record #{i + 1} (was empty after cleaning).")
-            continue
-
-        vector = get_embedding(text_to_embed)
-        if not vector:
-            print(f"⚠️ Skipped record #{i + 1} (embedding generation failed).")
-            continue
-
-        # Assemble the final structured data for this record
-        result = {
-            "id": i,
-            "text": text_to_embed,
-            "vector": vector,
-            "metadata": {
-                "year": record.get("Production Year"),
-                "operator": record.get("Operator"),
-                "county": record.get("County")
-            }
-        }
-        results.append(result)
-
-        # Log progress every 100 records for user feedback
-        if (i + 1) % 100 == 0:
-            percentage = ((i + 1) / actual_limit) * 100
+    # Batches come back in completion order, so results are sorted at the end.
+    with profile(PROFILE, "embedding.prof"):
+        for batch in engine.embed(items):
+            completed += len(batch.items)
+            if not batch.ok:
+                failed += len(batch.items)
+                metrics.count("records_failed_total", len(batch.items), reason=error_reason(batch.error))
+                continue
+
+            if not batch.cached:
+                embedded_tokens += sum(count_tokens(text) for _, text in batch.items)
+            write_start = time.perf_counter()
+            batch_results = [
+                build_result(result_id, text_to_embed, vector, data_to_process[i], record_ids[i], offset)
+                for ((i, result_id, offset), text_to_embed), vector in zip(batch.items, batch.vectors)
+            ]
+            if writer is not None:
+                # Written and checkpointed right away, so nothing is held in memory.
+                writer.write_batch(batch_results)
+            else:
+                results.extend(zip((key for key, _ in batch.items), batch_results))
+            write_seconds += time.perf_counter() - write_start
+
+            # Log progress after every batch for user feedback
+            percentage = (completed / len(items)) * 100
             elapsed = time.time() - start_time
-            avg_time = elapsed / (i + 1)
-            eta_minutes = (actual_limit - (i + 1)) * avg_time / 60
-            print(f"🔥 Progress: {i + 1:,}/{actual_limit:,} ({percentage:.1f}%) | ETA: {eta_minutes:.1f} min")
+            avg_time = elapsed / completed
+            eta_minutes = (len(items) - completed) * avg_time / 60
+            print(f"🔥 Progress: {completed:,}/{len(items):,} ({percentage:.1f}%) | ETA: {eta_minutes:.1f} min")
 
-        # Add a small delay every 10 records to avoid hitting API rate limits
-        if (i + 1) % 10 == 0:
-            time.sleep(1)
+    total_seconds = time.time() - start_time
+    generated = writer.written if writer is not None else len(results)
+    # The loop's time is split into waiting for embeddings and writing them out.
+    metrics.add_time("embed", total_seconds - write_seconds, completed - failed)
+    metrics.add_time("write", write_seconds, generated)
+    metrics.count("embedding_tokens_total", embedded_tokens)
+    print(f"\n✅ Processing complete in {total_seconds / 60:.1f} minutes.")
+    print(f"✅ Generated {generated:,} embeddings in {engine.calls:,} API calls ({engine.retries:,} retries).")
+    print(f"✅ Sent about {embedded_tokens:,} tokens to the API "
+          f"({generated / max(total_seconds, 1e-9):,.1f} embeddings/sec, "
+          f"{embedded_tokens / max(total_seconds, 1e-9):,.0f} tokens/sec).")
+    if cache is not None:
+        print(f"✅ {cache.summary()}")
+        cache.close()
+    skipped = metrics.by_label("records_skipped_total", "reason")
+    skipped.pop("already_embedded", None)
+    if skipped:
+        reasons = ", ".join(f"{reason}: {count:,}" for reason, count in skipped.items())
+        print(f"⚠️ {sum(skipped.values()):,} records were skipped ({reasons}).")
+    if failed:
+        reasons = ", ".join(f"{reason}: {count:,}" for reason, count
+                            in metrics.by_label("records_failed_total", "reason").items())
+        print(f"⚠️ {failed:,} records could not be embedded ({reasons}); "
+              f"re-run the script to try them again.")
 
-    total_time_minutes = (time.time() - start_time) / 60
-    print(f"\n✅ Processing complete in {total_time_minutes:.1f} minutes.")
-    print(f"✅ Generated {len(results):,} embeddings.")
+    with metrics.stage("output"):
+        if writer is not None:
+            writer.close()
+            output_file = EMBEDDINGS_JSONL_FILE
+            print(f"✅ {len(writer.done_ids):,} embeddings in total saved to '{output_file}'.")
+        else:
+            # Save the final list of results to the output file, in source order
+            results.sort(key=lambda pair: (pair[0][0], pair[0][2]))
+            output_file = EMBEDDINGS_OUTPUT_FILE
+            with open(output_file, "w") as f:
+                json.dump([result for _, result in results], f, indent=2)
+            print(f"✅ Final embeddings saved to '{output_file}'.")
 
-    # Save the final list of results to the output file
-    with open(EMBEDDINGS_OUTPUT_FILE, "w") as f:
-        json.dump(results, f, indent=2)
-    print(f"✅ Final embeddings saved to '{EMBEDDINGS_OUTPUT_FILE}'.")
+    if VECTOR_STORE_DIR:
+        from vector_store import convert_embeddings_file
 
-# This ensures the main function is called when the script is run directly.
-if __name__ == "__main__":
+        with metrics.stage("vector_store") as timer:
+            timer.records = stored = convert_embeddings_file(output_file, VECTOR_STORE_DIR)
+        print(f"✅ {stored:,} embeddings saved to the vector store '{VECTOR_STORE_DIR}'.")
+
+    metrics.finish()
+    print("📈 Where the time went:")
+    for line in metrics.summary():
+        print(f"   {line}")
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE)
+        print(f"📈 Metrics saved to '{METRICS_FILE}'.")
+
+def main():
     process_records()
     print("="*50)
-    print("🎉 All steps completed!")
\ No newline at end of file
+    print("🎉 All steps completed!")
+
+# This ensures the main function is called when the script is run directly.
+if __name__ == "__main__":
+    main()
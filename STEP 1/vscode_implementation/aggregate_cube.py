@@ -0,0 +1,459 @@
+# ==============================================================================
+# COLUMNAR AGGREGATE CUBE FOR NUMERIC PRODUCTION QUESTIONS
+# ==============================================================================
+# What it does:
+# Keeps the numeric metadata fields of every record (`oil_produced_bbl`,
+# `gas_produced_mcf`, `water_produced_bbl`, `taxable_gas_mcf` and the well
+# counts) in columns, next to dictionary-encoded `year`, `county`,
+# `operator`, `field` and `town` columns, and answers sums over them:
+#
+#   cube.sum("gas_produced_mcf", operator="Operator 12 Resources, Inc.", year=2018)
+#   cube.group_by(["county"], ["active_oil_wells"], year=2018)
+#   cube.top("oil_produced_bbl", "operator", n=5, county="Allegany")
+#
+# Every combination of grouping and filter fields is a "cuboid": the sums of
+# every measure per distinct combination of those fields' values. A cuboid is
+# built from the columns the first time a question needs it and then kept, so
+# later questions are a dictionary lookup (a single sum) or a scan of the
+# cuboid's groups (group-by and top-N), not of the records.
+#
+# The cube is keyed by record id (see `record_ids.py`): `add_records` and
+# `remove_records` update the columns and every cuboid already built, and
+# `refresh_from_csv` applies only the rows of a revised CSV that were added,
+# changed or deleted (with `change_detection.py`).
+#
+# Why it's here:
+# "Total gas produced by operator X in 2018" or "active oil wells per county"
+# are sums over many rows. The three nearest records of a vector search can't
+# answer them, and a pandas group-by scans every row for every question.
+#
+# How to run (builds `aggregate_cube.npz` from the CSV, or updates it):
+# > python aggregate_cube.py
+# ==============================================================================
+
+import json
+import os
+
+import numpy as np
+
+from change_detection import CSV_FILE, ChangeSet, iter_csv_records
+from enrichment import record_metadata
+from record_ids import RecordIdAssigner, record_fingerprint
+from text_serializer import is_null
+
+# --- CONFIGURATION ---
+CUBE_FILE = "aggregate_cube.npz"
+# Rows of the CSV to read; None reads them all. The embedding steps cap their
+# rows to bound API cost, but a cap here would make every total wrong.
+RECORD_LIMIT = None
+# ---------------------
+
+DIMENSIONS = ("year", "county", "operator", "field", "town")
+MEASURES = (
+    "oil_produced_bbl", "gas_produced_mcf", "water_produced_bbl", "taxable_gas_mcf",
+    "active_oil_wells", "inactive_oil_wells", "active_gas_wells", "inactive_gas_wells",
+    "injection_wells", "disposal_wells", "self_use_well",
+)
+# The number of records in a group, available like a measure.
+RECORDS = "records"
+
+_MEASURE_INDEX = {measure: i for i, measure in enumerate(MEASURES)}
+
+
+def dimension_value(dimension, value):
+    """The normalized value of a grouping field: years as int, names stripped, blanks None."""
+    if is_null(value):
+        return None
+    if dimension == "year":
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+    value = str(value).strip()
+    return value or None
+
+
+def measure_value(value):
+    """A numeric field as float; blanks and unreadable values count as 0."""
+    if is_null(value):
+        return 0.0
+    if isinstance(value, str):
+        value = value.replace(",", "").strip()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _grown(array, size):
+    """`array` with room for at least `size` rows (doubling, so appends stay cheap)."""
+    if size <= len(array):
+        return array
+    bigger = np.zeros((max(size, 2 * len(array), 16),) + array.shape[1:], dtype=array.dtype)
+    bigger[:len(array)] = array
+    return bigger
+
+
+def _unique_rows(codes, sizes):
+    """Distinct rows of an integer code matrix; returns (rows, inverse)."""
+    if codes.shape[1] == 0:
+        return np.zeros((1, 0), dtype=codes.dtype), np.zeros(len(codes), dtype=np.intp)
+    if np.prod([float(size) for size in sizes]) < 2 ** 62:
+        # Pack each row into one int64 (mixed radix): a 1-D unique is far faster.
+        packed = np.zeros(len(codes), dtype=np.int64)
+        for column, size in enumerate(sizes):
+            packed = packed * size + codes[:, column]
+        _, first, inverse = np.unique(packed, return_index=True, return_inverse=True)
+        return codes[first], inverse.reshape(-1)
+    rows, inverse = np.unique(codes, axis=0, return_inverse=True)
+    return rows, inverse.reshape(-1)
+
+
+class _Cuboid:
+    """Sums of every measure per distinct combination of some dimensions' codes."""
+
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self.groups = {}
+        self.codes = np.zeros((0, len(dimensions)), dtype=np.int32)
+        self.sums = np.zeros((0, len(MEASURES)), dtype=np.float64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.size = 0
+        # Per dimension: (size when built, group numbers sorted by code, sorted codes).
+        self._sorted = {}
+
+    def matching(self, wanted):
+        """Groups with records whose codes are in `wanted` ({dimension: [codes]}).
+
+        The most selective dimension is looked up in a sorted copy of its
+        column; only those groups are checked against the other dimensions.
+        """
+        candidates = None
+        for dimension, codes in wanted.items():
+            position = self.dimensions.index(dimension)
+            index = self._sorted.get(position)
+            if index is None or index[0] != self.size:
+                order = np.argsort(self.codes[:self.size, position], kind="stable")
+                index = self._sorted[position] = (self.size, order, self.codes[order, position])
+            _, order, column = index
+            found = np.concatenate([order[np.searchsorted(column, code):np.searchsorted(column, code, "right")]
+                                    for code in codes]) if codes else order[:0]
+            if candidates is None or len(found) < len(candidates):
+                candidates = found
+        if candidates is None:
+            candidates = np.arange(self.size)
+        mask = self.counts[candidates] > 0
+        for dimension, codes in wanted.items():
+            column = self.codes[candidates, self.dimensions.index(dimension)]
+            mask &= column == codes[0] if len(codes) == 1 else np.isin(column, codes)
+        return np.sort(candidates[mask])
+
+    def apply(self, codes, measures, sign, sizes):
+        """Adds (sign 1) or subtracts (sign -1) rows given as full code and measure matrices."""
+        if not len(codes):
+            return
+        keys, inverse = _unique_rows(codes[:, self.dimensions], [sizes[d] for d in self.dimensions])
+        sums = np.zeros((len(keys), len(MEASURES)))
+        np.add.at(sums, inverse, measures)
+        counts = np.bincount(inverse, minlength=len(keys))
+        groups = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(map(tuple, keys.tolist())):
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = self.size
+                self.size += 1
+                self.codes = _grown(self.codes, self.size)
+                self.sums = _grown(self.sums, self.size)
+                self.counts = _grown(self.counts, self.size)
+                self.codes[group] = key
+            groups[i] = group
+        self.sums[groups] += sign * sums
+        self.counts[groups] += sign * counts
+
+
+class AggregateCube:
+    """Group-by sums over the numeric fields, by year, county, operator, field and town."""
+
+    def __init__(self):
+        # Dictionary encoding: value -> code, and code -> value, per dimension.
+        self._codes_of = [{} for _ in DIMENSIONS]
+        self._values = [[] for _ in DIMENSIONS]
+        self._codes = np.zeros((0, len(DIMENSIONS)), dtype=np.int32)
+        self._measures = np.zeros((0, len(MEASURES)), dtype=np.float64)
+        self._size = 0
+        self._rows = {}
+        self._fingerprints = {}
+        self._cuboids = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """A cube over source records (CSV columns), with the same record ids as step 2."""
+        assign = RecordIdAssigner()
+        cube = cls()
+        cube.add_records((assign(record), record) for record in records)
+        return cube
+
+    @classmethod
+    def from_csv(cls, csv_file=CSV_FILE, record_limit=RECORD_LIMIT):
+        """A cube over the rows of the CSV."""
+        cube = cls()
+        cube.refresh_from_csv(csv_file, record_limit)
+        return cube
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, record_id):
+        return record_id in self._rows
+
+    # --- updates ---
+
+    def _encode(self, metadata):
+        codes = []
+        for dimension, (name, codes_of) in enumerate(zip(DIMENSIONS, self._codes_of)):
+            value = dimension_value(name, metadata.get(name))
+            code = codes_of.get(value)
+            if code is None:
+                code = codes_of[value] = len(self._values[dimension])
+                self._values[dimension].append(value)
+            codes.append(code)
+        return codes
+
+    def _sizes(self):
+        return [max(len(values), 1) for values in self._values]
+
+    def _apply(self, codes, measures, sign):
+        sizes = self._sizes()
+        for cuboid in self._cuboids.values():
+            cuboid.apply(codes, measures, sign, sizes)
+
+    def _remove_rows(self, rows):
+        """Takes rows out of every cuboid and zeroes them; returns nothing."""
+        if not rows:
+            return
+        rows = np.array(rows, dtype=np.intp)
+        self._apply(self._codes[rows], self._measures[rows], -1)
+        self._measures[rows] = 0.0
+
+    def add_records(self, pairs, fingerprints=None):
+        """Adds `(record id, source record)` pairs; an id that is already there is replaced.
+
+        Returns the number of records added or replaced.
+        """
+        codes, measures, replaced = [], [], []
+        # The last record of an id that appears more than once wins.
+        for record_id, record in dict(pairs).items():
+            metadata = record_metadata(record)
+            codes.append(self._encode(metadata))
+            measures.append([measure_value(metadata.get(name)) for name in MEASURES])
+            row = self._rows.get(record_id)
+            if row is not None:
+                replaced.append(row)
+            self._rows[record_id] = self._size + len(codes) - 1
+            if fingerprints is None:
+                self._fingerprints[record_id] = record_fingerprint(record)
+        if fingerprints is not None:
+            self._fingerprints.update(fingerprints)
+        if not codes:
+            return 0
+        self._remove_rows(replaced)
+        start, self._size = self._size, self._size + len(codes)
+        self._codes = _grown(self._codes, self._size)
+        self._measures = _grown(self._measures, self._size)
+        self._codes[start:self._size] = codes
+        self._measures[start:self._size] = measures
+        self._apply(self._codes[start:self._size], self._measures[start:self._size], 1)
+        return len(codes)
+
+    def remove_records(self, record_ids):
+        """Removes records by id (unknown ids are ignored); returns how many were removed."""
+        rows = []
+        for record_id in record_ids:
+            row = self._rows.pop(record_id, None)
+            self._fingerprints.pop(record_id, None)
+            if row is not None:
+                rows.append(row)
+        self._remove_rows(rows)
+        return len(rows)
+
+    def refresh_from_csv(self, csv_file=CSV_FILE, record_limit=RECORD_LIMIT):
+        """Applies the CSV's added, changed and deleted rows; returns the `ChangeSet`."""
+        changes = ChangeSet(self._fingerprints)
+        changed = []
+        for record_id, record in iter_csv_records(csv_file, record_limit):
+            if changes.check(record_id, record):
+                changed.append((record_id, record))
+        changes.finish()
+        self.add_records(changed, fingerprints={record_id: changes.fingerprints[record_id]
+                                                for record_id, _ in changed})
+        self.remove_records(changes.deleted)
+        return changes
+
+    # --- queries ---
+
+    def _dimensions(self, names):
+        unknown = [name for name in names if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"unknown field(s) {', '.join(unknown)}; group by {', '.join(DIMENSIONS)}")
+        return [DIMENSIONS.index(name) for name in names]
+
+    def _measures_of(self, names):
+        unknown = [name for name in names if name != RECORDS and name not in _MEASURE_INDEX]
+        if unknown:
+            raise ValueError(f"unknown measure(s) {', '.join(unknown)}; "
+                             f"available: {', '.join(MEASURES + (RECORDS,))}")
+        return list(names)
+
+    def _filter_codes(self, filters):
+        """{dimension: [codes]}; a value (or list of values) nobody has gives an empty list."""
+        wanted = {}
+        for dimension, values in zip(self._dimensions(list(filters)), filters.values()):
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            name = DIMENSIONS[dimension]
+            codes_of = self._codes_of[dimension]
+            wanted[dimension] = sorted({codes_of[value] for value in
+                                        (dimension_value(name, item) for item in values)
+                                        if value in codes_of})
+        return wanted
+
+    def _cuboid(self, dimensions):
+        """The cuboid over `dimensions` (indices), built from the columns on first use."""
+        key = tuple(sorted(set(dimensions)))
+        cuboid = self._cuboids.get(key)
+        if cuboid is None:
+            cuboid = _Cuboid(key)
+            live = np.zeros(self._size, dtype=bool)
+            live[list(self._rows.values())] = True
+            cuboid.apply(self._codes[:self._size][live], self._measures[:self._size][live], 1,
+                         self._sizes())
+            self._cuboids[key] = cuboid
+        return cuboid
+
+    def _column(self, cuboid, groups, measure):
+        if measure == RECORDS:
+            return cuboid.counts[groups].astype(np.float64)
+        return cuboid.sums[groups, _MEASURE_INDEX[measure]]
+
+    def sum(self, measure, **filters):
+        """The total of `measure` over the records matching every filter.
+
+        A filter is `field=value` or `field=[value, ...]`, e.g. `year=2018`.
+        """
+        self._measures_of([measure])
+        wanted = self._filter_codes(filters)
+        cuboid = self._cuboid(list(wanted))
+        if all(len(codes) == 1 for codes in wanted.values()):
+            group = cuboid.groups.get(tuple(wanted[dimension][0] for dimension in cuboid.dimensions))
+            if group is None:
+                return 0 if measure == RECORDS else 0.0
+            value = self._column(cuboid, group, measure)
+            return int(value) if measure == RECORDS else float(value)
+        rows = self.group_by([], [measure], **filters)
+        return rows[0][measure] if rows else (0 if measure == RECORDS else 0.0)
+
+    def group_by(self, by, measures=None, limit=None, **filters):
+        """Totals per distinct value of the `by` fields, over the records matching the filters.
+
+        Returns one dict per group (`by` fields plus each measure), largest
+        first by the first measure; `limit` keeps only the top groups.
+        """
+        by_dimensions = self._dimensions(by)
+        measures = self._measures_of(measures or [RECORDS])
+        wanted = self._filter_codes(filters)
+        cuboid = self._cuboid(by_dimensions + list(wanted))
+        groups = cuboid.matching(wanted)
+        positions = [cuboid.dimensions.index(dimension) for dimension in by_dimensions]
+        keys = cuboid.codes[groups][:, positions]
+        columns = np.column_stack([self._column(cuboid, groups, measure) for measure in measures])
+        if len(wanted) and any(len(codes) > 1 and dimension not in by_dimensions
+                               for dimension, codes in wanted.items()):
+            # Several filter values fall into each `by` group: add them up.
+            keys, inverse = _unique_rows(keys, [self._sizes()[d] for d in by_dimensions])
+            totals = np.zeros((len(keys), len(measures)))
+            np.add.at(totals, inverse, columns)
+            columns = totals
+        first = -columns[:, 0]
+        if limit is not None and limit < len(first):
+            # Only the top `limit` groups are sorted.
+            candidates = np.argpartition(first, limit - 1)[:limit] if limit > 0 else np.empty(0, dtype=np.intp)
+            order = candidates[np.argsort(first[candidates], kind="stable")]
+        else:
+            order = np.argsort(first, kind="stable")
+        results = []
+        for index in order.tolist():
+            row = {name: self._values[dimension][code] for name, dimension, code
+                   in zip(by, by_dimensions, keys[index].tolist())}
+            for measure, value in zip(measures, columns[index].tolist()):
+                row[measure] = int(value) if measure == RECORDS else value
+            results.append(row)
+        return results
+
+    def top(self, measure, by, n=10, **filters):
+        """The `n` values of field `by` with the largest total `measure`: [(value, total), ...]."""
+        return [(row[by], row[measure]) for row in self.group_by([by], [measure], limit=n, **filters)]
+
+    def values(self, field):
+        """The distinct values of a grouping field."""
+        return list(self._values[self._dimensions([field])[0]])
+
+    # --- files ---
+
+    def save(self, filename=CUBE_FILE):
+        """Saves the records' columns, ids and fingerprints to one `.npz` file (cuboids are rebuilt)."""
+        ids = list(self._rows)
+        rows = np.fromiter(self._rows.values(), dtype=np.intp, count=len(ids))
+        meta = json.dumps({
+            "values": self._values,
+            "ids": ids,
+            "fingerprints": [self._fingerprints.get(record_id) for record_id in ids],
+        })
+        tmp = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, codes=self._codes[rows], measures=self._measures[rows],
+                     meta=np.frombuffer(meta.encode("utf-8"), dtype=np.uint8))
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename=CUBE_FILE):
+        """Loads a cube written by `save`."""
+        with np.load(filename) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            cube = cls()
+            cube._codes = data["codes"].astype(np.int32)
+            cube._measures = data["measures"].astype(np.float64)
+        cube._size = len(meta["ids"])
+        cube._values = meta["values"]
+        cube._codes_of = [{value: code for code, value in enumerate(values)} for values in cube._values]
+        cube._rows = {record_id: row for row, record_id in enumerate(meta["ids"])}
+        cube._fingerprints = {record_id: fingerprint for record_id, fingerprint
+                              in zip(meta["ids"], meta["fingerprints"]) if fingerprint}
+        return cube
+
+
+def main():
+    try:
+        if os.path.exists(CUBE_FILE):
+            cube = AggregateCube.load(CUBE_FILE)
+            changes = cube.refresh_from_csv()
+            print(f"Updated '{CUBE_FILE}' from '{CSV_FILE}': {changes.summary()}.")
+        else:
+            cube = AggregateCube.from_csv()
+            print(f"Built '{CUBE_FILE}' from {len(cube):,} rows of '{CSV_FILE}'.")
+        cube.save(CUBE_FILE)
+    except FileNotFoundError as e:
+        print(f"ERROR: The file '{e.filename}' was not found.")
+        return
+    years = [year for year in cube.values("year") if year is not None]
+    if years:
+        year = max(years)
+        print(f"\nTop 5 operators by oil produced in {year}:")
+        for operator, total in cube.top("oil_produced_bbl", "operator", n=5, year=year):
+            print(f"  {operator}: {total:,.0f} bbl")
+        print(f"\nActive oil wells per county in {year}:")
+        for row in cube.group_by(["county"], ["active_oil_wells"], year=year):
+            print(f"  {row['county']}: {row['active_oil_wells']:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
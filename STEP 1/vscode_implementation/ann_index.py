@@ -0,0 +1,224 @@
+# ==============================================================================
+# APPROXIMATE NEAREST-NEIGHBOUR INDEX (IVF)
+# ==============================================================================
+# What it does:
+# Splits the normalized embedding vectors into `n_lists` clusters with
+# spherical k-means (the "coarse quantizer"). A query is compared with the
+# cluster centroids first, and only the vectors in the closest clusters are
+# scored exactly. This is an inverted-file (IVF) index.
+#
+# Recall/latency knob:
+# `num_candidates` works like `numCandidates` in Atlas `$vectorSearch`: the
+# index keeps opening the next-closest cluster until at least that many
+# vectors have been scored. More candidates means better recall and slower
+# queries. `n_probe` can be passed instead to fix the number of clusters.
+#
+# Why it's here:
+# Exact search has to read every vector for every query. At our corpus size
+# that no longer fits the latency budget; IVF reads only a small fraction.
+#
+# How to use:
+# >>> index = IVFIndex.build(engine.vectors, engine.ids, engine.texts, engine.metadata)
+# >>> index.search(query_vector, limit=3, num_candidates=100)
+# >>> index.save("embeddings.ivf.npz"); IVFIndex.load("embeddings.ivf.npz")
+# >>> index.add(new_vectors, new_ids, new_texts, new_metadata)
+# ==============================================================================
+
+import json
+
+import numpy as np
+
+from vector_search import VectorSearchEngine, normalize_rows, top_k
+
+# --- DEFAULTS ---
+# Same default as the `$vectorSearch` test stage in the STEP 3 guide.
+DEFAULT_NUM_CANDIDATES = 100
+# k-means training settings.
+KMEANS_ITERATIONS = 15
+# At most this many vectors per cluster are sampled to train the centroids.
+TRAINING_SAMPLES_PER_LIST = 256
+# ----------------
+
+# Rows scored per block during k-means assignment, to bound temporary memory.
+_ASSIGN_BLOCK = 65_536
+
+
+def default_n_lists(count):
+    """A common rule of thumb: about sqrt(N) clusters."""
+    return max(1, min(count, int(np.sqrt(count))))
+
+
+def assign_to_centroids(vectors, centroids):
+    """Returns the index of the most similar centroid for every row."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = vectors[start:start + _ASSIGN_BLOCK]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Clusters unit vectors by cosine similarity; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=clusters)
+        # Sum the members of every cluster in one pass over the sorted vectors.
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        non_empty = counts > 0
+        sums[non_empty] = np.add.reduceat(vectors[order], starts[non_empty], axis=0)
+        # Re-seed empty clusters with random vectors so no centroid is wasted.
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex(VectorSearchEngine):
+    """Inverted-file index: exact scoring inside the clusters closest to the query."""
+
+    def __init__(self, centroids, vectors, ids, texts, metadata, assignments=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.ids, self.texts, self.metadata = [], [], []
+        self._buffer = np.empty((0, self.centroids.shape[1]), dtype=np.float32)
+        self._size = 0
+        self._members = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        self.add(vectors, ids, texts, metadata, normalized=True, assignments=assignments)
+
+    @classmethod
+    def build(cls, vectors, ids, texts, metadata, n_lists=None, seed=0, normalized=False):
+        """Trains the coarse quantizer on (a sample of) the vectors and indexes them all."""
+        if normalized:
+            vectors = np.asarray(vectors, dtype=np.float32)
+        else:
+            vectors = normalize_rows(np.array(vectors, dtype=np.float32, order="C"))
+        n_lists = n_lists or default_n_lists(len(vectors))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), n_lists * TRAINING_SAMPLES_PER_LIST)
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        centroids = spherical_kmeans(sample, n_lists, seed=seed)
+        return cls(centroids, vectors, ids, texts, metadata)
+
+    @classmethod
+    def from_engine(cls, engine, n_lists=None, seed=0):
+        """Builds an index over the vectors already loaded in a `VectorSearchEngine`."""
+        return cls.build(
+            engine.vectors, engine.ids, engine.texts, engine.metadata, n_lists, seed, normalized=True
+        )
+
+    @property
+    def vectors(self):
+        return self._buffer[:self._size]
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def add(self, vectors, ids, texts, metadata, normalized=False, assignments=None):
+        """Adds vectors to their nearest clusters without retraining the centroids."""
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+        if len(vectors) == 0:
+            return
+        if not normalized:
+            vectors = normalize_rows(vectors)
+        if assignments is None:
+            assignments = assign_to_centroids(vectors, self.centroids)
+        start = self._size
+        end = start + len(vectors)
+        if end > len(self._buffer):
+            # Grow geometrically so repeated small adds stay cheap.
+            grown = np.empty((max(end, 2 * len(self._buffer)), vectors.shape[1]), dtype=np.float32)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+        self._buffer[start:end] = vectors
+        self._size = end
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadata.extend(metadata)
+        if self._metadata_index is not None:
+            self._metadata_index.add(metadata)
+        rows = np.arange(start, end, dtype=np.int64)
+        assignments = np.asarray(assignments, dtype=np.int64)
+        for cluster in np.unique(assignments):
+            self._members[cluster] = np.concatenate(
+                [self._members[cluster], rows[assignments == cluster]]
+            )
+
+    def _candidates(self, query, num_candidates, n_probe, allowed=None):
+        """Row indices from the closest clusters, until enough candidates are found.
+
+        With an `allowed` mask, only rows that pass the filter count as candidates.
+        """
+        order = np.argsort(-(self.centroids @ query))
+        if n_probe is not None:
+            probed = [self._members[cluster] for cluster in order[:n_probe]]
+            if allowed is not None:
+                probed = [members[allowed[members]] for members in probed]
+        else:
+            probed, found = [], 0
+            for cluster in order:
+                members = self._members[cluster]
+                if allowed is not None:
+                    members = members[allowed[members]]
+                if len(members) == 0:
+                    continue
+                probed.append(members)
+                found += len(members)
+                if found >= num_candidates:
+                    break
+        return np.concatenate(probed) if probed else np.empty(0, dtype=np.int64)
+
+    def search(self, query_vector, limit=3, num_candidates=DEFAULT_NUM_CANDIDATES, n_probe=None,
+               filter=None):
+        """Approximate top-k search; see `num_candidates` in the module notes.
+
+        With a `filter`, clusters are searched for matching records only, like
+        Atlas pre-filtering, so `num_candidates` counts matching records.
+        """
+        query = self._prepare_queries([query_vector])[0]
+        allowed = None
+        if filter:
+            allowed = np.zeros(self._size, dtype=bool)
+            allowed[self.metadata_index.rows(filter)] = True
+        rows = self._candidates(query, max(num_candidates, limit), n_probe, allowed)
+        similarities = self._buffer[rows] @ query
+        best = top_k(similarities, limit)
+        return [self.result(rows[i], similarities[i]) for i in best]
+
+    def search_batch(self, query_vectors, limit=3, num_candidates=DEFAULT_NUM_CANDIDATES, n_probe=None,
+                     filter=None):
+        """Runs `search` for every query vector."""
+        return [
+            self.search(query, limit, num_candidates, n_probe, filter)
+            for query in np.array(query_vectors, dtype=np.float32, ndmin=2)
+        ]
+
+    def save(self, filename):
+        """Saves centroids, vectors, cluster assignments and records to one `.npz` file."""
+        assignments = np.empty(self._size, dtype=np.int64)
+        for cluster, members in enumerate(self._members):
+            assignments[members] = cluster
+        records = json.dumps({"ids": self.ids, "texts": self.texts, "metadata": self.metadata})
+        with open(filename, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                assignments=assignments,
+                records=np.frombuffer(records.encode("utf-8"), dtype=np.uint8),
+            )
+
+    @classmethod
+    def load(cls, filename):
+        """Loads an index written by `save`."""
+        with np.load(filename) as data:
+            records = json.loads(data["records"].tobytes().decode("utf-8"))
+            return cls(
+                data["centroids"], data["vectors"],
+                records["ids"], records["texts"], records["metadata"],
+                assignments=data["assignments"],
+            )
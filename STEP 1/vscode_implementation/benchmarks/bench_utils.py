@@ -0,0 +1,68 @@
+# ==============================================================================
+# SHARED BENCHMARK HELPERS
+# ==============================================================================
+# What it does:
+# Runs a single function from one of the pipeline scripts in a fresh Python
+# process and reports its wall time and the peak resident memory (RSS) of
+# that process, so the numbers of two runs never influence each other.
+# Where the peak cannot be read (no /proc and no `resource` module, i.e. on
+# Windows), it is reported as n/a.
+# ==============================================================================
+
+import json
+import os
+import subprocess
+import sys
+
+IMPLEMENTATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD = r"""
+import contextlib, importlib, io, json, sys, time
+sys.path.insert(0, {path!r})
+sys.path.insert(0, {benchmarks!r})
+
+def peak_rss():
+    # On Linux, ru_maxrss can carry over the parent's peak across fork/exec;
+    # VmHWM belongs to this process only.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+module = importlib.import_module({module!r})
+baseline = peak_rss()
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    getattr(module, {function!r})(*{args!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "peak_rss": peak_rss(), "baseline_rss": baseline}}))
+"""
+
+
+def measure(module, function, *args):
+    """Runs `module.function(*args)` in a child process; returns seconds and RSS in bytes."""
+    code = _CHILD.format(
+        path=IMPLEMENTATION_DIR, benchmarks=BENCHMARKS_DIR,
+        module=module, function=function, args=args,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def megabytes(size):
+    if size is None:
+        return "n/a"
+    return f"{size / 1024 / 1024:,.0f} MB"
@@ -0,0 +1,165 @@
+# ==============================================================================
+# BENCHMARK: AGGREGATE CUBE vs FULL-SCAN PANDAS GROUP-BY
+# ==============================================================================
+# What it does:
+# Writes a synthetic CSV, loads it into `AggregateCube` and into a pandas
+# DataFrame, and answers three kinds of chatbot questions both ways:
+#   sum     total gas of one operator in one year;
+#   group   active oil wells per county in one year;
+#   top     the 10 operators with the most oil in one county.
+# For each it reports the median and p99 latency per question (pandas filters
+# and groups the whole frame every time; the cube's first question of a kind
+# builds its cuboid, timed separately) and checks that the answers agree.
+# Then `--change` of the rows are revised in the CSV, and the cube is updated
+# with `refresh_from_csv` (which reads the whole CSV to find the changes), and
+# with `add_records` of as many rows (the cost of the update itself), against
+# rebuilding it. Saving and reloading the cube is timed too.
+#
+# How to run:
+# > python benchmarks/benchmark_aggregate_cube.py --rows 200000 --queries 300
+# ==============================================================================
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregate_cube import DIMENSIONS, MEASURES, AggregateCube
+from benchmark_incremental import revise_csv
+from change_detection import iter_csv_records
+from enrichment import METADATA_FIELDS
+from synthetic_data import write_synthetic_csv
+
+COLUMN_DTYPES = __import__("importlib").import_module("1_convert_csv").COLUMN_DTYPES
+
+
+def load_frame(csv_file):
+    """The CSV as a DataFrame with the metadata field names, blanks as 0 / NaN."""
+    df = pd.read_csv(csv_file, dtype=COLUMN_DTYPES)
+    df = df.rename(columns={column: field for field, column in METADATA_FIELDS.items()})
+    df = df[list(DIMENSIONS) + list(MEASURES)]
+    df[list(MEASURES)] = df[list(MEASURES)].astype("float64").fillna(0.0)
+    return df
+
+
+def questions(df, count, seed=0):
+    """`count` random (kind, arguments) questions about values that occur in `df`."""
+    rng = random.Random(seed)
+    operators = df["operator"].dropna().unique().tolist()
+    years = sorted(df["year"].dropna().unique().tolist())
+    counties = df["county"].dropna().unique().tolist()
+    kinds = []
+    for i in range(count):
+        kind = ("sum", "group", "top")[i % 3]
+        if kind == "sum":
+            kinds.append((kind, (rng.choice(operators), int(rng.choice(years)))))
+        elif kind == "group":
+            kinds.append((kind, (int(rng.choice(years)),)))
+        else:
+            kinds.append((kind, (rng.choice(counties),)))
+    return kinds
+
+
+def ask_pandas(df, kind, args):
+    if kind == "sum":
+        operator, year = args
+        return float(df.loc[(df["operator"] == operator) & (df["year"] == year), "gas_produced_mcf"].sum())
+    if kind == "group":
+        return df[df["year"] == args[0]].groupby("county")["active_oil_wells"].sum().to_dict()
+    return df[df["county"] == args[0]].groupby("operator")["oil_produced_bbl"].sum().nlargest(10)
+
+
+def ask_cube(cube, kind, args):
+    if kind == "sum":
+        operator, year = args
+        return cube.sum("gas_produced_mcf", operator=operator, year=year)
+    if kind == "group":
+        rows = cube.group_by(["county"], ["active_oil_wells"], year=args[0])
+        return {row["county"]: row["active_oil_wells"] for row in rows}
+    return cube.top("oil_produced_bbl", "operator", n=10, county=args[0])
+
+
+def same_answer(kind, expected, answer):
+    if kind == "sum":
+        return np.isclose(expected, answer)
+    if kind == "group":
+        return (set(expected) == set(answer)
+                and all(np.isclose(expected[key], answer[key]) for key in expected))
+    if isinstance(expected, pd.Series):
+        expected = list(expected.items())
+    return np.allclose([total for _, total in expected], [total for _, total in answer])
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--change", type=float, default=0.01, help="share of rows revised")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, "original.csv")
+        write_synthetic_csv(csv_file, args.rows)
+        build_seconds, cube = timed(AggregateCube.from_csv, csv_file, None)
+        cube_file = os.path.join(tmp, "aggregate_cube.npz")
+        save_seconds, _ = timed(cube.save, cube_file)
+        reload_seconds, _ = timed(AggregateCube.load, cube_file)
+        load_seconds, df = timed(load_frame, csv_file)
+        print(f"{args.rows:,} rows: cube built from the CSV in {build_seconds:.2f}s, saved in "
+              f"{save_seconds:.2f}s, loaded in {reload_seconds:.2f}s "
+              f"(pandas read_csv: {load_seconds:.2f}s)\n")
+
+        asked = questions(df, args.queries)
+        latencies = {kind: {"pandas": [], "cube": []} for kind in ("sum", "group", "top")}
+        first = {}
+        mismatches = 0
+        for kind, question in asked:
+            pandas_seconds, expected = timed(ask_pandas, df, kind, question)
+            cube_seconds, answer = timed(ask_cube, cube, kind, question)
+            if kind not in first:
+                first[kind] = cube_seconds
+            else:
+                latencies[kind]["cube"].append(cube_seconds)
+            latencies[kind]["pandas"].append(pandas_seconds)
+            mismatches += not same_answer(kind, expected, answer)
+
+        print(f"{'question':>8} | {'pandas p50':>10} | {'pandas p99':>10} | {'cube p50':>9} | "
+              f"{'cube p99':>9} | {'first (build)':>13} | speed-up")
+        for kind, runs in latencies.items():
+            pandas_p50, pandas_p99 = np.percentile(runs["pandas"], [50, 99]) * 1e6
+            cube_p50, cube_p99 = np.percentile(runs["cube"], [50, 99]) * 1e6
+            print(f"{kind:>8} | {pandas_p50:>7,.0f} µs | {pandas_p99:>7,.0f} µs | {cube_p50:>6,.0f} µs | "
+                  f"{cube_p99:>6,.0f} µs | {first[kind] * 1000:>10.1f} ms | {pandas_p50 / cube_p50:,.0f}x")
+        print(f"Answers that differ from pandas: {mismatches}")
+
+        updated, deleted, added = revise_csv(csv_file, args.change)
+        records = list(iter_csv_records(csv_file, None))
+        sample = random.Random(1).sample(records, updated)
+        refresh_seconds, changes = timed(cube.refresh_from_csv, csv_file, None)
+        add_seconds, _ = timed(cube.add_records, sample)
+        rebuild_seconds, fresh = timed(AggregateCube.from_csv, csv_file, None)
+        for kind, question in asked[:30]:
+            mismatches += not same_answer(kind, ask_cube(fresh, kind, question), ask_cube(cube, kind, question))
+        print(f"\nRevised CSV ({changes.summary()}):")
+        print(f"  refresh_from_csv (scan + apply): {refresh_seconds:.2f}s")
+        print(f"  add_records of {len(sample):,} rows again, with {len(cube._cuboids)} cuboids built: "
+              f"{add_seconds * 1000:.1f} ms ({add_seconds / len(sample) * 1e6:.0f} µs per row)")
+        print(f"  full rebuild: {rebuild_seconds:.2f}s")
+        print(f"Answers that differ after the update: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# ==============================================================================
+# BENCHMARK: IVF INDEX RECALL AND LATENCY VS EXACT SEARCH
+# ==============================================================================
+# What it does:
+# Builds an exact `VectorSearchEngine` and an `IVFIndex` over the same
+# clustered 768-dimension vectors, then, for several `num_candidates`
+# settings, reports recall@k against the exact results and the mean and p99
+# latency of single-query search.
+#
+# How to run:
+# > python benchmarks/benchmark_ann_index.py --size 100000
+# ==============================================================================
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex
+from synthetic_data import clustered_unit_vectors
+from vector_search import VectorSearchEngine
+
+
+def timed_search(search, queries):
+    """Runs `search` once per query; returns (results, per-query seconds)."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies)
+
+
+def recall(results, expected):
+    """Mean share of the exact top-k ids that the approximate search also returned."""
+    hits = [
+        len({hit["id"] for hit in got} & {hit["id"] for hit in want}) / len(want)
+        for got, want in zip(results, expected)
+    ]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--candidates", default="100,500,1000,2000,5000")
+    args = parser.parse_args()
+
+    # Queries come from the same distribution as the corpus but are not in it.
+    vectors = clustered_unit_vectors(args.size + args.queries, args.dimensions,
+                                     clusters=max(1, args.size // 100))
+    queries = vectors[args.size:]
+    vectors = vectors[:args.size]
+    ids = [f"rec-{i}" for i in range(args.size)]
+    texts = [f"record {i}" for i in range(args.size)]
+    metadata = [{"year": 1990 + i % 35} for i in range(args.size)]
+
+    exact = VectorSearchEngine(vectors, ids, texts, metadata, normalized=True)
+    start = time.perf_counter()
+    index = IVFIndex.from_engine(exact)
+    build_seconds = time.perf_counter() - start
+    print(f"{args.size:,} vectors, {index.n_lists:,} lists, built in {build_seconds:.1f} s")
+
+    expected, latencies = timed_search(lambda q: exact.search(q, args.limit), queries)
+    print(f"\n{'search':>16} | {'recall@' + str(args.limit):>9} | {'mean ms':>8} | {'p99 ms':>8}")
+    print(f"{'exact':>16} | {1.0:>9.3f} | {latencies.mean() * 1000:>8.2f} | "
+          f"{np.percentile(latencies, 99) * 1000:>8.2f}")
+    for candidates in (int(value) for value in args.candidates.split(",")):
+        results, latencies = timed_search(
+            lambda q: index.search(q, args.limit, num_candidates=candidates), queries
+        )
+        print(f"{'ivf ' + str(candidates):>16} | {recall(results, expected):>9.3f} | "
+              f"{latencies.mean() * 1000:>8.2f} | {np.percentile(latencies, 99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# ==============================================================================
+# BENCHMARK: TRUNCATION vs TOKEN-AWARE CHUNKING
+# ==============================================================================
+# What it does:
+# Builds long multi-row records (several synthetic well-production rows
+# serialized with `record_to_text` and joined), so that many are longer than
+# the old 20,000-character cut. Then, for "truncate" (the old `text[:20000]`)
+# and "chunk" (`split_record`):
+# - embeds everything through `EmbeddingEngine` against the fake backend and
+#   reports embeddings, API calls, estimated tokens sent, and throughput;
+# - embeds everything with a simple lexical embedder (hashed TF-IDF words),
+#   and searches for single rows taken from random records. It reports the
+#   share of queries whose record is in the top 5, for all queries and for
+#   rows that lie past the 20,000-character cut. Chunk hits are collapsed
+#   to records with `collapse_hits` ("max" and "mean").
+#
+# How to run:
+# > python benchmarks/benchmark_chunking.py --records 1000
+# ==============================================================================
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import ParentSearch, count_tokens, split_record
+from embedding_engine import EmbeddingEngine
+from fake_backend import FakeEmbeddingBackend
+from synthetic_data import COLUMNS, iter_rows
+from text_serializer import FIELD_SEPARATOR, record_to_text
+from vector_search import VectorSearchEngine
+
+OLD_CUT = 20_000
+_WORD = re.compile(r"\w+")
+
+
+def long_records(count, max_rows, seed=0):
+    """Returns (texts, rows): each text joins 1..`max_rows` serialized rows."""
+    rng = random.Random(seed)
+    row_texts = (record_to_text(dict(zip(COLUMNS, row))) for row in iter_rows(count * max_rows))
+    texts, rows = [], []
+    for _ in range(count):
+        parts = [next(row_texts) for _ in range(rng.randint(1, max_rows))]
+        texts.append(FIELD_SEPARATOR.join(parts))
+        rows.append(parts)
+    return texts, rows
+
+
+class LexicalEmbedder:
+    """Hashed word counts: a stand-in embedding that rewards shared words."""
+
+    def __init__(self, dimensions=4096):
+        self.dimensions = dimensions
+        self._slots = {}
+
+    def _slot(self, word):
+        slot = self._slots.get(word)
+        if slot is None:
+            slot = self._slots[word] = zlib.crc32(word.encode("utf-8")) % self.dimensions
+        return slot
+
+    def __call__(self, texts):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            slots = [self._slot(word) for word in _WORD.findall(text.lower())]
+            np.add.at(matrix[row], slots, 1.0)
+        return matrix
+
+
+def prepare(texts, ids, strategy, max_tokens):
+    """(ids, texts) actually embedded for one strategy."""
+    if strategy == "truncate":
+        return ids, [text[:OLD_CUT] for text in texts]
+    pieces = [piece for record_id, text in zip(ids, texts)
+              for piece in split_record(record_id, text, max_tokens)]
+    return [piece[0] for piece in pieces], [piece[2] for piece in pieces]
+
+
+def embed_with_engine(texts, latency):
+    """Runs texts through the batched engine and fake backend; returns (calls, seconds)."""
+    backend = FakeEmbeddingBackend(dimensions=64, latency=latency)
+    engine = EmbeddingEngine(backend, requests_per_minute=60_000)
+    start = time.perf_counter()
+    for batch in engine.embed(list(enumerate(texts))):
+        if not batch.ok:
+            raise RuntimeError(batch.error)
+    return engine.calls, time.perf_counter() - start
+
+
+def weighted(counts, idf):
+    """Log term frequency times inverse document frequency, L2-normalized."""
+    matrix = np.log1p(counts) * idf
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--max-rows", type=int, default=120, help="rows per record, at most")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake API call")
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts, rows = long_records(args.records, args.max_rows)
+    ids = [f"rec-{i}" for i in range(len(texts))]
+    long_count = sum(len(text) > OLD_CUT for text in texts)
+    print(f"{len(texts):,} records, {sum(map(len, texts)) / 2**20:.1f} MB of text, "
+          f"{long_count:,} longer than {OLD_CUT:,} characters")
+
+    rng = random.Random(1)
+    queries = []
+    for _ in range(args.queries):
+        record = rng.randrange(len(texts))
+        row = rng.randrange(len(rows[record]))
+        position = texts[record].index(rows[record][row])
+        queries.append((rows[record][row], ids[record], position >= OLD_CUT))
+    embedder = LexicalEmbedder()
+    query_matrix = embedder([text for text, _, _ in queries])
+    tail = np.array([past_cut for _, _, past_cut in queries])
+
+    print(f"\n{'strategy':>9} | {'embeds':>6} | {'calls':>5} | {'tokens':>10} | "
+          f"{'split s':>7} | {'embed/s':>7} | {'tokens/s':>9} | {'R@5 all':>7} | {'R@5 tail':>8}")
+    for strategy in ("truncate", "chunk"):
+        start = time.perf_counter()
+        piece_ids, pieces = prepare(texts, ids, strategy, args.max_tokens)
+        split_seconds = time.perf_counter() - start
+        tokens = sum(count_tokens(piece) for piece in pieces)
+        calls, seconds = embed_with_engine(pieces, args.latency)
+
+        counts = embedder(pieces)
+        idf = np.log(len(pieces) / (1.0 + (counts > 0).sum(axis=0))).astype(np.float32)
+        engine = VectorSearchEngine(weighted(counts, idf), piece_ids, pieces,
+                                    [None] * len(pieces), normalized=True)
+        modes = ["max"] if strategy == "truncate" else ["max", "mean"]
+        for mode in modes:
+            search = ParentSearch(engine, mode=mode)
+            found = np.array([
+                expected in {hit["id"] for hit in search.search(query, 5)}
+                for query, (_, expected, _) in zip(weighted(query_matrix, idf), queries)
+            ])
+            name = strategy if strategy == "truncate" else f"chunk/{mode}"
+            print(f"{name:>9} | {len(pieces):>6,} | {calls:>5,} | {tokens:>10,} | "
+                  f"{split_seconds:>7.2f} | {len(pieces) / seconds:>7,.0f} | "
+                  f"{tokens / seconds:>9,.0f} | {found.mean():>7.3f} | "
+                  f"{found[tail].mean() if tail.any() else float('nan'):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
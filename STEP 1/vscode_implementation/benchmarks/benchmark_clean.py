@@ -0,0 +1,103 @@
+# ==============================================================================
+# BENCHMARK: STRING-REPLACE CLEANING vs STRUCTURAL STREAMING CLEANING
+# ==============================================================================
+# What it does:
+# Writes a synthetic `output.json` (JSON array) and `output.jsonl` of roughly
+# `--size-mb` megabytes, full of `NaN` tokens and names such as "NaN Energy",
+# then cleans them three ways, each in its own process:
+#   1. the original approach: read everything, `replace('NaN', 'null')`,
+#      `json.loads` to validate, write everything back;
+#   2. the structural array cleaner (`clean_json_array_nan_values`);
+#   3. the structural JSON Lines cleaner (`clean_jsonl_nan_values`).
+# Prints wall time, peak RSS and whether any "NaN" inside text was corrupted.
+#
+# How to run (use --size-mb 3000 for a multi-GB run):
+# > python benchmarks/benchmark_clean.py --size-mb 500
+# ==============================================================================
+
+import argparse
+import json
+import os
+import tempfile
+
+from bench_utils import measure, megabytes
+from synthetic_data import COLUMNS, iter_rows
+
+
+def legacy_string_replace(input_file, output_file):
+    """The original `2_clean_json.py` logic, kept here for comparison."""
+    with open(input_file, "r") as f:
+        raw_content = f.read()
+    cleaned_content = raw_content.replace("NaN", "null")
+    json.loads(cleaned_content)
+    with open(output_file, "w") as f:
+        f.write(cleaned_content)
+
+
+def _pandas_like_record(row):
+    """Turns a synthetic CSV row into the record pandas used to emit (blanks as NaN)."""
+    record = {}
+    for column, value in zip(COLUMNS, row):
+        if value == "":
+            record[column] = float("nan")
+        elif value.isdigit():
+            record[column] = float(value)
+        else:
+            record[column] = value
+    return record
+
+
+def write_inputs(directory, size_mb):
+    """Writes matching JSON array and JSON Lines inputs of about `size_mb` each."""
+    templates = [_pandas_like_record(row) for row in iter_rows(2000)]
+    target = size_mb * 1024 * 1024
+    array_file = os.path.join(directory, "output.json")
+    lines_file = os.path.join(directory, "output.jsonl")
+    written = 0
+    with open(array_file, "w") as array_out, open(lines_file, "w") as lines_out:
+        array_out.write("[")
+        i = 0
+        while written < target:
+            record = templates[i % len(templates)]
+            array_out.write(("," if i else "") + "\n" + json.dumps(record, indent=4))
+            line = json.dumps(record)
+            lines_out.write(line + "\n")
+            written += len(line) + 1
+            i += 1
+        array_out.write("\n]")
+    return array_file, lines_file, i
+
+
+def count_corrupted(output_file):
+    """Counts operator names that lost their "NaN" (e.g. "null Energy")."""
+    with open(output_file, "r") as f:
+        return sum(line.count("null Energy") for line in f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        array_file, lines_file, records = write_inputs(tmp, args.size_mb)
+        print(f"Input: {records:,} records, {megabytes(os.path.getsize(array_file))} as a JSON array, "
+              f"{megabytes(os.path.getsize(lines_file))} as JSON Lines")
+
+        runs = [
+            ("String replace (original)", "benchmark_clean", "legacy_string_replace",
+             array_file, os.path.join(tmp, "legacy.json")),
+            ("Structural, JSON array", "2_clean_json", "clean_json_array_nan_values",
+             array_file, os.path.join(tmp, "array.json")),
+            ("Structural, JSON Lines", "2_clean_json", "clean_jsonl_nan_values",
+             lines_file, os.path.join(tmp, "lines.jsonl")),
+        ]
+        for label, module, function, source, target in runs:
+            result = measure(module, function, source, target)
+            print(f"{label}: {result['seconds']:.2f}s, peak RSS {megabytes(result['peak_rss'])}, "
+                  f"corrupted names: {count_corrupted(target):,}")
+            os.remove(target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# ==============================================================================
+# BENCHMARK: COLD START OF THE EMBEDDING AND RETRIEVAL WORKERS
+# ==============================================================================
+# What it does:
+# Starts each kind of worker as a fresh Python process, the way a serverless
+# function or a new pool process starts, and measures:
+# - import time: what `python -X importtime` reports for the worker's imports,
+#   with the three heaviest top-level modules;
+# - time to first result: from process start until the worker has its first
+#   record text, embedding, or search result;
+# for these workers:
+#   serializer  `text_serializer.record_to_text` on one record;
+#   embedding   `3_generate_embeddings.get_embeddings` on one text;
+#   retrieval   `retrieval_service.load_engine` over a small vector store, a
+#               query embedder, and one search.
+# The "local" backend stands in for the embedding API, so no key is needed and
+# the numbers are the client's own start-up cost. A bare `python -c pass` is
+# measured too, for reference.
+#
+# How to run:
+# > python benchmarks/benchmark_cold_start.py --runs 5
+# ==============================================================================
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import IMPLEMENTATION_DIR
+from synthetic_data import COLUMNS, synthetic_row
+
+sys.path.insert(0, IMPLEMENTATION_DIR)
+
+WORKERS = {
+    "bare python": "pass",
+    "serializer": (
+        "from text_serializer import record_to_text\n"
+        "record_to_text({'County': 'Allegany', 'Oil Produced, bbl': 12.0})"
+    ),
+    "embedding": (
+        "import importlib\n"
+        "step3 = importlib.import_module('3_generate_embeddings')\n"
+        "step3.get_embeddings(['County: Allegany | Oil Produced, bbl: 12.0'])"
+    ),
+    "retrieval": (
+        "from embedders import create_query_embedder\n"
+        "from retrieval_service import load_engine\n"
+        "engine = load_engine()\n"
+        "embed = create_query_embedder()\n"
+        "engine.search(embed('oil production in Allegany'), 3)"
+    ),
+}
+
+
+def build_store(directory, records):
+    """Embeds `records` synthetic rows with the local backend into `embeddings_store`."""
+    from embedding_output import CheckpointedJsonlWriter, embedding_result
+    from enrichment import record_metadata
+    from fake_backend import hash_vector
+    from record_ids import assign_record_ids
+    from text_serializer import record_to_text
+    from vector_store import convert_embeddings_file
+
+    rng = random.Random(0)
+    rows = [dict(zip(COLUMNS, synthetic_row(i, rng))) for i in range(records)]
+    embeddings_file = os.path.join(directory, "embeddings.jsonl")
+    writer = CheckpointedJsonlWriter(embeddings_file)
+    results = []
+    for record_id, record in zip(assign_record_ids(rows), rows):
+        text = record_to_text(record)
+        results.append(embedding_result(record_id, text, hash_vector(text), record_metadata(record)))
+    writer.write_batch(results)
+    writer.close()
+    convert_embeddings_file(embeddings_file, os.path.join(directory, "embeddings_store"))
+
+
+def parse_importtime(stderr):
+    """Returns (total seconds, [(seconds, module)] of the top-level imports)."""
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and name.strip() not in ("site", "encodings"):
+            top_level.append((int(cumulative) / 1e6, name.strip()))
+    return sum(seconds for seconds, _ in top_level), top_level
+
+
+def run_worker(code, directory):
+    """Runs one cold worker; returns (seconds to first result, import seconds, top imports)."""
+    env = dict(os.environ, EMBEDDING_BACKEND="local", PYTHONPATH=IMPLEMENTATION_DIR)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=directory,
+                             env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    imports, top_level = parse_importtime(process.stderr)
+    return seconds, imports, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per worker (median)")
+    parser.add_argument("--records", type=int, default=2_000, help="records in the vector store")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_store(tmp, args.records)
+        print(f"Cold starts (median of {args.runs}), local backend, "
+              f"{args.records:,} records in the vector store:\n")
+        print(f"{'worker':>12} | {'first result':>12} | {'imports':>8} | heaviest imports")
+        for label, code in WORKERS.items():
+            # The first run also writes the bytecode caches; it is not counted.
+            run_worker(code, tmp)
+            runs = [run_worker(code, tmp) for _ in range(args.runs)]
+            seconds = statistics.median(run[0] for run in runs)
+            imports = statistics.median(run[1] for run in runs)
+            heaviest = sorted(runs[-1][2], reverse=True)[:3]
+            names = ", ".join(f"{name} {module_seconds * 1000:.0f}"
+                              for module_seconds, name in heaviest if module_seconds >= 0.001)
+            print(f"{label:>12} | {seconds * 1000:9.0f} ms | {imports * 1000:5.0f} ms | {names}")
+
+
+if __name__ == "__main__":
+    main()
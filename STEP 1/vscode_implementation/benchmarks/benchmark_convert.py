@@ -0,0 +1,45 @@
+# ==============================================================================
+# BENCHMARK: IN-MEMORY vs STREAMING CSV CONVERSION
+# ==============================================================================
+# What it does:
+# Writes a synthetic well-production CSV, then converts it with the original
+# `convert_csv_to_json()` and with the chunked `convert_csv_to_jsonl()`, each
+# in its own process. Prints wall time and peak RSS for both.
+#
+# How to run:
+# > python benchmarks/benchmark_convert.py --rows 1000000
+# ==============================================================================
+
+import argparse
+import os
+import tempfile
+
+from bench_utils import measure, megabytes
+from synthetic_data import write_synthetic_csv
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, "original.csv")
+        write_synthetic_csv(csv_file, args.rows)
+        print(f"CSV: {args.rows:,} rows, {megabytes(os.path.getsize(csv_file))}")
+
+        runs = [
+            ("In-memory (read_csv + to_dict + json.dump)", "convert_csv_to_json",
+             (csv_file, os.path.join(tmp, "output.json"))),
+            (f"Streaming (chunks of {args.chunk_size:,}, JSON Lines)", "convert_csv_to_jsonl",
+             (csv_file, os.path.join(tmp, "output.jsonl"), args.chunk_size)),
+        ]
+        for label, function, call_args in runs:
+            result = measure("1_convert_csv", function, *call_args)
+            print(f"{label}: {result['seconds']:.2f}s, peak RSS {megabytes(result['peak_rss'])} "
+                  f"(after imports: {megabytes(result['baseline_rss'])})")
+
+
+if __name__ == "__main__":
+    main()
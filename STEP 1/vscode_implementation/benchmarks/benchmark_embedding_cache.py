@@ -0,0 +1,58 @@
+# ==============================================================================
+# BENCHMARK: RE-RUNNING THE EMBEDDING STEP WITH THE EMBEDDING CACHE
+# ==============================================================================
+# What it does:
+# Embeds a synthetic dataset once into an empty cache (cold run), then again
+# after changing a small share of the records (warm run). Prints API calls,
+# wall time and the cache hit rate for both runs.
+#
+# How to run:
+# > python benchmarks/benchmark_embedding_cache.py --records 5000 --changed 0.01
+# ==============================================================================
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache
+from embedding_engine import EmbeddingEngine
+from fake_backend import FakeEmbeddingBackend
+from benchmark_embedding_engine import make_texts
+
+
+def run(texts, cache_path, latency):
+    """Embeds `texts` through a fresh engine and cache; returns stats for the run."""
+    backend = FakeEmbeddingBackend(latency=latency)
+    with EmbeddingCache(cache_path, model="fake", task_type="retrieval_document") as cache:
+        engine = EmbeddingEngine(backend, requests_per_minute=None, cache=cache)
+        start = time.perf_counter()
+        embedded = sum(len(batch.items) for batch in engine.embed(list(enumerate(texts))) if batch.ok)
+        seconds = time.perf_counter() - start
+        return embedded, seconds, backend.calls, cache.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--changed", type=float, default=0.01, help="share of records changed between runs")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per API call")
+    args = parser.parse_args()
+
+    texts = make_texts(args.records)
+    step = max(1, int(1 / args.changed)) if args.changed else len(texts) + 1
+    changed = [text + " | Revised: yes" if i % step == 0 else text for i, text in enumerate(texts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "cache.sqlite")
+        for label, run_texts in (("Cold run", texts), ("Warm run", changed)):
+            embedded, seconds, calls, summary = run(run_texts, cache_path, args.latency)
+            print(f"{label}: {embedded:,} embedded in {seconds:.2f}s with {calls:,} API calls")
+            print(f"          {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# ==============================================================================
+# BENCHMARK: ONE-CALL-PER-RECORD LOOP vs BATCHED EMBEDDING ENGINE
+# ==============================================================================
+# What it does:
+# Embeds the same synthetic records twice against the local fake backend:
+# once the old way (one call per record, 1 second sleep every 10 records) and
+# once through `EmbeddingEngine`. Prints records/second for both runs.
+#
+# How to run:
+# > python benchmarks/benchmark_embedding_engine.py --records 500 --rate-limit 0.05
+# ==============================================================================
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_engine import EmbeddingEngine
+from fake_backend import FakeEmbeddingBackend
+
+
+def make_texts(count):
+    """Builds `count` synthetic record texts shaped like `record_to_text()` output."""
+    return [
+        f"Production Year: {1990 + i % 30} | Operator: Operator {i % 97} | "
+        f"County: County {i % 17} | Oil Produced, bbl: {i * 3 % 1000}"
+        for i in range(count)
+    ]
+
+
+def run_legacy(texts, backend, sleep_seconds):
+    """The original loop: one request per record and a fixed sleep every 10."""
+    vectors = []
+    for i, text in enumerate(texts):
+        try:
+            vectors.append(backend([text])[0])
+        except Exception:
+            pass  # The old script dropped the record here.
+        if (i + 1) % 10 == 0:
+            time.sleep(sleep_seconds)
+    return len(vectors)
+
+
+def run_engine(texts, backend, args):
+    """The batched, concurrent engine."""
+    engine = EmbeddingEngine(
+        backend,
+        batch_size=args.batch_size,
+        max_in_flight=args.in_flight,
+        requests_per_minute=args.rpm,
+        backoff_base=0.05,
+    )
+    embedded = 0
+    for batch in engine.embed(list(enumerate(texts))):
+        if batch.ok:
+            embedded += len(batch.items)
+    return embedded, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API call")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=6000, help="engine request budget per minute")
+    parser.add_argument("--legacy-sleep", type=float, default=1.0)
+    args = parser.parse_args()
+
+    texts = make_texts(args.records)
+
+    backend = FakeEmbeddingBackend(latency=args.latency, rate_limit_probability=args.rate_limit)
+    start = time.perf_counter()
+    embedded = run_legacy(texts, backend, args.legacy_sleep)
+    legacy_seconds = time.perf_counter() - start
+    print(f"Legacy loop : {embedded:,}/{len(texts):,} embedded in {legacy_seconds:.2f}s "
+          f"({embedded / legacy_seconds:,.0f} records/s, {backend.calls:,} calls)")
+
+    backend = FakeEmbeddingBackend(latency=args.latency, rate_limit_probability=args.rate_limit)
+    start = time.perf_counter()
+    embedded, engine = run_engine(texts, backend, args)
+    engine_seconds = time.perf_counter() - start
+    print(f"Engine      : {embedded:,}/{len(texts):,} embedded in {engine_seconds:.2f}s "
+          f"({embedded / engine_seconds:,.0f} records/s, {engine.calls:,} calls, {engine.retries:,} retries)")
+    print(f"Speedup     : {legacy_seconds / engine_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
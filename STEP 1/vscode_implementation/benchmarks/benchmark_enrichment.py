@@ -0,0 +1,111 @@
+# ==============================================================================
+# BENCHMARK: HASH-JOIN ENRICHMENT vs $lookup-BY-OPERATOR
+# ==============================================================================
+# What it does:
+# Converts a synthetic well-production CSV to JSON Lines source records and
+# writes a matching embeddings file (small vectors, minimal metadata). Then:
+# - runs `enrich_embeddings` in its own process and reports wall time and
+#   peak RSS for indexing the sources and enriching every embedding;
+# - emulates the STEP 3 `$lookup` on `metadata.operator` (a full scan of the
+#   sources per embedding, first match wins) on a sample, extrapolates its
+#   time to every embedding, and counts how often it attaches the wrong row.
+#
+# How to run:
+# > python benchmarks/benchmark_enrichment.py --records 1000000
+# ==============================================================================
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import measure, megabytes
+from embedding_output import iter_jsonl
+from enrichment import record_metadata
+from record_ids import RecordIdAssigner
+from synthetic_data import write_synthetic_csv
+
+convert_csv = importlib.import_module("1_convert_csv")
+
+
+def write_embeddings(source_file, output_file):
+    """One embedding per source record, with the old three-field metadata.
+
+    Returns the operator of every record, in order.
+    """
+    assign = RecordIdAssigner()
+    operators = []
+    with open(output_file, "w", encoding="utf-8") as f:
+        for record in iter_jsonl(source_file):
+            operators.append(record["Operator"])
+            f.write(json.dumps({
+                "id": assign(record),
+                "text": "",
+                "vector": [0.5] * 8,
+                "metadata": {"year": record["Production Year"], "operator": record["Operator"],
+                             "county": record["County"]},
+            }) + "\n")
+    return operators
+
+
+def lookup_by_operator(source_file, operators, sample):
+    """The `$lookup` + `$arrayElemAt: 0` join: returns (seconds, wrong rows) for `sample`."""
+    start = time.perf_counter()
+    first_matches = {}
+    for position in sample:
+        # No index on `Operator`: every lookup scans the whole collection.
+        operator = operators[position]
+        matches = [row for row, candidate in enumerate(operators) if candidate == operator]
+        first_matches[position] = matches[0]
+    seconds = time.perf_counter() - start
+
+    # Compare the attached row with the row that was actually embedded.
+    wanted = set(first_matches) | set(first_matches.values())
+    metadata = {
+        row: record_metadata(record)
+        for row, record in enumerate(iter_jsonl(source_file)) if row in wanted
+    }
+    wrong = sum(metadata[first] != metadata[position] for position, first in first_matches.items())
+    return seconds, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--lookup-sample", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, "original.csv")
+        source_file = os.path.join(tmp, "output.jsonl")
+        embeddings_file = os.path.join(tmp, "embeddings.jsonl")
+        write_synthetic_csv(csv_file, args.records)
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert_csv.convert_csv_to_jsonl(csv_file, source_file)
+        operators = write_embeddings(source_file, embeddings_file)
+        print(f"{args.records:,} source records and embeddings")
+
+        sample = random.Random(0).sample(range(len(operators)), min(args.lookup_sample, len(operators)))
+        seconds, wrong = lookup_by_operator(source_file, operators, sample)
+        del operators
+        print(f"$lookup by operator: {seconds / len(sample) * 1000:,.1f} ms per embedding, "
+              f"about {seconds / len(sample) * args.records / 3600:,.1f} h for all; "
+              f"wrong row attached for {wrong}/{len(sample)} sampled embeddings")
+
+        result = measure("enrichment", "enrich_embeddings",
+                         embeddings_file, source_file, os.path.join(tmp, "enriched.jsonl"))
+        print(f"Hash join (index + enrich): {result['seconds']:.1f} s in total, "
+              f"peak RSS {megabytes(result['peak_rss'])} "
+              f"(after imports: {megabytes(result['baseline_rss'])})")
+
+
+if __name__ == "__main__":
+    main()
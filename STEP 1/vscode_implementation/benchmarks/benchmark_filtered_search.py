@@ -0,0 +1,106 @@
+# ==============================================================================
+# BENCHMARK: PRE-FILTERED VS POST-FILTERED VECTOR SEARCH
+# ==============================================================================
+# What it does:
+# Gives clustered 768-dimension vectors synthetic `year`, `county` and
+# `operator` metadata, then compares two ways of answering a filtered query:
+# - post-filter: search the top `num_candidates` without a filter, then drop
+#   the hits that do not match (what a client can do without filter fields);
+# - pre-filter: restrict the search to matching rows through the posting
+#   lists of `metadata_index.py` (what the `filter` option does).
+# Recall@k is measured against an exact search over only the matching rows,
+# for filters of decreasing selectivity, on both the exact engine and the
+# IVF index.
+#
+# How to run:
+# > python benchmarks/benchmark_filtered_search.py --size 200000
+# ==============================================================================
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex
+from benchmark_ann_index import recall, timed_search
+from synthetic_data import COUNTIES, clustered_unit_vectors
+from vector_search import VectorSearchEngine
+
+
+def synthetic_metadata(count, seed=0):
+    """`year`, `county` and `operator` values like the well-production file's."""
+    rng = np.random.default_rng(seed)
+    years = 1990 + rng.integers(0, 35, count)
+    counties = rng.integers(0, len(COUNTIES), count)
+    operators = rng.integers(0, 2000, count)
+    return [
+        {"year": int(year), "county": COUNTIES[county], "operator": f"Operator {operator}, Inc."}
+        for year, county, operator in zip(years, counties, operators)
+    ]
+
+
+def matches(metadata, filter):
+    return all(metadata.get(path[len("metadata."):]) == value for path, value in filter.items())
+
+
+def post_filtered(search, filter, limit, num_candidates):
+    """Searches without the filter, then keeps the first `limit` hits that match it."""
+    def run(query):
+        hits = search(query, num_candidates)
+        return [hit for hit in hits if matches(hit["metadata"], filter)][:limit]
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=1000)
+    args = parser.parse_args()
+
+    vectors = clustered_unit_vectors(args.size + args.queries, args.dimensions,
+                                     clusters=max(1, args.size // 100))
+    queries = vectors[args.size:]
+    vectors = vectors[:args.size]
+    metadata = synthetic_metadata(args.size)
+    ids = [f"rec-{i}" for i in range(args.size)]
+    texts = [f"record {i}" for i in range(args.size)]
+
+    exact = VectorSearchEngine(vectors, ids, texts, metadata, normalized=True)
+    index = IVFIndex.from_engine(exact)
+    operator = metadata[0]["operator"]
+    filters = [
+        ("county", {"metadata.county": "Allegany"}),
+        ("county+year", {"metadata.county": "Allegany", "metadata.year": 2019}),
+        ("operator", {"metadata.operator": operator}),
+    ]
+    limit, candidates = args.limit, args.candidates
+    print(f"{args.size:,} vectors, {index.n_lists:,} IVF lists, "
+          f"post-filter over the top {candidates:,} candidates")
+    print(f"\n{'filter':>12} | {'rows':>7} | {'search':>16} | {'recall@' + str(limit):>9} | "
+          f"{'mean ms':>8} | {'p99 ms':>8}")
+
+    for name, filter in filters:
+        matching = len(exact.metadata_index.rows(filter))
+        # Ground truth: exact search over the matching rows only.
+        expected = exact.search_batch(queries, limit, filter=filter)
+        runs = [
+            ("exact post", post_filtered(lambda q, n: exact.search(q, n), filter, limit, candidates)),
+            ("exact pre", lambda q: exact.search(q, limit, filter=filter)),
+            ("ivf post", post_filtered(
+                lambda q, n: index.search(q, n, num_candidates=n), filter, limit, candidates)),
+            ("ivf pre", lambda q: index.search(q, limit, num_candidates=candidates, filter=filter)),
+        ]
+        for label, search in runs:
+            results, latencies = timed_search(search, queries)
+            print(f"{name:>12} | {matching:>7,} | {label:>16} | {recall(results, expected):>9.3f} | "
+                  f"{latencies.mean() * 1000:>8.2f} | {np.percentile(latencies, 99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
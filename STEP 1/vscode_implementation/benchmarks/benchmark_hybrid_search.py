@@ -0,0 +1,178 @@
+# ==============================================================================
+# BENCHMARK: BM25 vs VECTOR vs HYBRID (RRF) RETRIEVAL
+# ==============================================================================
+# What it does:
+# Builds synthetic well-production records, serializes them with
+# `record_to_text`, and gives each one a simulated "semantic" embedding: the
+# sum of directions for its county, formation, town and operator *group*
+# (operators 0-99, 100-199, ... embed alike, as similar names do with a real
+# model), plus noise. Two kinds of labelled queries are generated:
+# - exact:      "Operator 123 Resources, Inc. in Allegany" -> the records of
+#               that operator in that county (keyword search should win);
+# - paraphrase: "Medina wells around Olean" (a town-free nickname for the
+#               county) -> Medina records in Cattaraugus (vector should win).
+# It reports recall@k, MRR and latency of BM25, exact vector search and the
+# hybrid RRF retriever, plus the time to build, save and load the BM25 index.
+#
+# How to run:
+# > python benchmarks/benchmark_hybrid_search.py --records 100000
+# ==============================================================================
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_ann_index import timed_search
+from bm25_index import BM25Index
+from hybrid_search import HybridRetriever
+from synthetic_data import COLUMNS, COUNTIES, FORMATIONS, TOWNS, iter_rows
+from text_serializer import record_to_text
+from vector_search import VectorSearchEngine
+
+# Nicknames the records never contain, so only the "semantic" embedding knows them.
+COUNTY_NICKNAMES = {
+    "Allegany": "Wellsville", "Cattaraugus": "Olean", "Chautauqua": "Jamestown",
+    "Erie": "Buffalo", "Steuben": "Corning", "Chemung": "Elmira", "Genesee": "Batavia",
+    "Livingston": "Geneseo", "Wyoming": "Warsaw", "Seneca": "Waterloo", "Tioga": "Owego",
+    "Cayuga": "Auburn",
+}
+OPERATOR_GROUP = 100
+
+
+class SimulatedEmbedder:
+    """Stands in for the embedding model: knows places and formations, blurs operator names."""
+
+    def __init__(self, dimensions, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dimensions = dimensions
+        self._directions = {}
+        for name in COUNTIES + FORMATIONS + TOWNS + [f"group {g}" for g in range(2000 // OPERATOR_GROUP)]:
+            direction = rng.standard_normal(dimensions).astype(np.float32)
+            self._directions[name] = direction / np.linalg.norm(direction)
+        self._rng = rng
+
+    def __call__(self, county=None, formation=None, town=None, operator=None, noise=0.0):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for name, weight in ((county, 1.0), (formation, 0.8), (town, 0.5)):
+            if name in self._directions:
+                vector += weight * self._directions[name]
+        if operator is not None:
+            vector += 0.6 * self._directions[f"group {operator // OPERATOR_GROUP}"]
+        if noise:
+            vector += noise * self._rng.standard_normal(self.dimensions).astype(np.float32) \
+                / np.sqrt(self.dimensions)
+        return vector
+
+
+def operator_number(name):
+    return int(name.split()[1])
+
+
+def build_corpus(count, dimensions):
+    """Returns (ids, texts, metadata, vectors, embedder)."""
+    embedder = SimulatedEmbedder(dimensions)
+    ids, texts, metadata = [], [], []
+    vectors = np.empty((count, dimensions), dtype=np.float32)
+    for i, row in enumerate(iter_rows(count)):
+        record = dict(zip(COLUMNS, row))
+        ids.append(f"rec-{i}")
+        texts.append(record_to_text(record))
+        metadata.append({"county": record["County"], "operator": record["Operator"],
+                         "formation": record["Producing Formation"]})
+        vectors[i] = embedder(record["County"], record["Producing Formation"], record["Town"],
+                              operator_number(record["Operator"]), noise=0.8)
+    return ids, texts, metadata, vectors, embedder
+
+
+def labelled_queries(metadata, embedder, count, seed=0):
+    """(kind, text, vector, relevant ids) for exact-name and paraphrase questions."""
+    rng = random.Random(seed)
+    by_operator, by_formation = {}, {}
+    for i, entry in enumerate(metadata):
+        by_operator.setdefault((entry["operator"], entry["county"]), set()).add(f"rec-{i}")
+        if entry["formation"]:
+            by_formation.setdefault((entry["formation"], entry["county"]), set()).add(f"rec-{i}")
+    queries = []
+    for _ in range(count // 2):
+        operator, county = rng.choice(list(by_operator))
+        queries.append(("exact", f"{operator} in {county}",
+                        embedder(county, operator=operator_number(operator)),
+                        by_operator[(operator, county)]))
+    for _ in range(count - count // 2):
+        formation, county = rng.choice(list(by_formation))
+        queries.append(("paraphrase", f"{formation} wells around {COUNTY_NICKNAMES[county]}",
+                        embedder(county, formation),
+                        by_formation[(formation, county)]))
+    return queries
+
+
+def quality(results, relevant, limit):
+    """(recall@limit, MRR) where recall counts at most `limit` relevant records."""
+    recalls, reciprocal_ranks = [], []
+    for hits, wanted in zip(results, relevant):
+        ids = [hit["id"] for hit in hits[:limit]]
+        recalls.append(len(wanted.intersection(ids)) / min(limit, len(wanted)))
+        rank = next((position for position, hit in enumerate(ids, 1) if hit in wanted), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return float(np.mean(recalls)), float(np.mean(reciprocal_ranks))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    ids, texts, metadata, vectors, embedder = build_corpus(args.records, args.dimensions)
+    engine = VectorSearchEngine(vectors, ids, texts, metadata)
+
+    # Built in two halves to exercise the incremental path.
+    start = time.perf_counter()
+    keywords = BM25Index()
+    half = len(ids) // 2
+    keywords.add(ids[:half], texts[:half])
+    keywords.add(ids, texts)
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25_index.npz")
+        start = time.perf_counter()
+        keywords.save(path)
+        save_seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        keywords = BM25Index.load(path)
+        load_seconds = time.perf_counter() - start
+    print(f"{len(keywords):,} records, {keywords.vocabulary_size:,} tokens: BM25 built in "
+          f"{build_seconds:.1f} s, saved in {save_seconds:.2f} s ({size / 2**20:.0f} MB), "
+          f"loaded in {load_seconds:.2f} s")
+
+    hybrid = HybridRetriever(engine, keywords)
+    queries = labelled_queries(metadata, embedder, args.queries)
+    limit = args.limit
+    runs = [
+        ("bm25", lambda q: keywords.search(q[1], limit)),
+        ("vector", lambda q: engine.search(q[2], limit)),
+        ("hybrid rrf", lambda q: hybrid.search(q[1], q[2], limit)),
+    ]
+    print(f"\n{'queries':>10} | {'search':>10} | {'recall@' + str(limit):>9} | {'MRR':>6} | "
+          f"{'mean ms':>8} | {'p99 ms':>8}")
+    for kind in ("exact", "paraphrase", "all"):
+        selected = [q for q in queries if kind in ("all", q[0])]
+        for name, search in runs:
+            results, latencies = timed_search(search, selected)
+            recall, mrr = quality(results, [q[3] for q in selected], limit)
+            print(f"{kind:>10} | {name:>10} | {recall:>9.3f} | {mrr:>6.3f} | "
+                  f"{latencies.mean() * 1000:>8.2f} | {np.percentile(latencies, 99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
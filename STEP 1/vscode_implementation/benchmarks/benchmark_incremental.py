@@ -0,0 +1,141 @@
+# ==============================================================================
+# BENCHMARK: FULL RE-RUN vs INCREMENTAL UPDATE OF A REVISED CSV
+# ==============================================================================
+# What it does:
+# Builds every output (embeddings, vector store, MongoDB) for a synthetic
+# `original.csv`, then revises the CSV: `--change` of the rows get a new oil
+# figure, and a tenth as many rows are deleted and added. The revised CSV is
+# then brought into the outputs twice, each run in its own process:
+#   1. full re-run: `pipeline.py`, the vector store conversion and
+#      `mongo_loader.load_all`, as without change detection;
+#   2. incremental: `incremental_update.py` against the manifest of the
+#      first build.
+# The embedding API is faked with a fixed latency per call (no local CPU cost)
+# and MongoDB with `MemoryBackend` and a fixed latency per bulk write.
+#
+# How to run:
+# > python benchmarks/benchmark_incremental.py --rows 50000 --change 0.01
+# ==============================================================================
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from bench_utils import measure, megabytes
+from benchmark_pipeline import REQUESTS_PER_MINUTE, RemoteBackend
+from synthetic_data import COLUMNS, synthetic_row, write_synthetic_csv
+
+OIL_COLUMN = COLUMNS.index("Oil Produced, bbl")
+
+
+def revise_csv(path, change, seed=1):
+    """Updates `change` of the rows in place, deletes and adds a tenth as many; returns the counts."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    rng = random.Random(seed)
+    updated = max(1, int(len(rows) * change))
+    other = max(1, updated // 10)
+    chosen = rng.sample(range(len(rows)), updated + other)
+    for index in chosen[:updated]:
+        rows[index][OIL_COLUMN] = str(int(rows[index][OIL_COLUMN] or 0) + 1)
+    deleted = set(chosen[updated:])
+    rows = [row for index, row in enumerate(rows) if index not in deleted]
+    rows.extend(synthetic_row(len(rows) + i, rng) for i in range(other))
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return updated, other, other
+
+
+def build(directory):
+    """The first run: every output plus the manifest (not timed)."""
+    from incremental_update import IncrementalUpdate
+
+    os.chdir(directory)
+    IncrementalUpdate(RemoteBackend(0), record_limit=None, requests_per_minute=REQUESTS_PER_MINUTE,
+                      on_progress=None).run()
+
+
+def run_full(directory, latency, mongo_latency, stats_file):
+    """Everything again: pipeline, vector store conversion and a full MongoDB load."""
+    from mongo_loader import MemoryBackend, load_all
+    from pipeline import Pipeline
+    from vector_store import convert_embeddings_file
+
+    os.chdir(directory)
+    for path in ("embeddings.jsonl", "embeddings.jsonl.checkpoint"):
+        if os.path.exists(path):
+            os.remove(path)
+    pipeline = Pipeline(RemoteBackend(latency), record_limit=None,
+                        requests_per_minute=REQUESTS_PER_MINUTE, on_progress=None)
+    stats = pipeline.run()
+    convert_embeddings_file("embeddings.jsonl", "embeddings_store")
+    load_all(MemoryBackend(mongo_latency), "embeddings.jsonl", "output_cleaned.jsonl")
+    with open(stats_file, "w") as f:
+        json.dump({"api_calls": stats["api_calls"]}, f)
+
+
+def run_incremental(directory, latency, mongo_latency, stats_file):
+    """Only the changed rows, through `IncrementalUpdate`."""
+    from incremental_update import IncrementalUpdate
+    from mongo_loader import MemoryBackend
+
+    os.chdir(directory)
+    update = IncrementalUpdate(RemoteBackend(latency), record_limit=None,
+                               mongo_backend=MemoryBackend(mongo_latency),
+                               requests_per_minute=REQUESTS_PER_MINUTE, on_progress=None)
+    stats = update.run()
+    with open(stats_file, "w") as f:
+        json.dump({"api_calls": stats["api_calls"], "stages": stats["metrics"]["stages"],
+                   "changes": [stats["added"], stats["updated"], stats["deleted"]]}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--change", type=float, default=0.01, help="share of rows updated")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake API call")
+    parser.add_argument("--mongo-latency", type=float, default=0.02, help="seconds per bulk write")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full_dir = os.path.join(tmp, "full")
+        incremental_dir = os.path.join(tmp, "incremental")
+        os.mkdir(incremental_dir)
+        csv_file = os.path.join(incremental_dir, "original.csv")
+        write_synthetic_csv(csv_file, args.rows)
+        measure("benchmark_incremental", "build", incremental_dir)
+        updated, deleted, added = revise_csv(csv_file, args.change)
+        shutil.copytree(incremental_dir, full_dir)
+        print(f"Input: {args.rows:,} rows ({megabytes(os.path.getsize(csv_file))}), revised with "
+              f"{updated:,} updated, {deleted:,} deleted and {added:,} added rows; "
+              f"{args.latency * 1000:.0f} ms per fake API call")
+
+        stats_file = os.path.join(tmp, "stats.json")
+        results = {}
+        for label, function, directory in (("Full re-run", "run_full", full_dir),
+                                           ("Incremental", "run_incremental", incremental_dir)):
+            result = measure("benchmark_incremental", function, directory, args.latency,
+                             args.mongo_latency, stats_file)
+            with open(stats_file) as f:
+                result.update(json.load(f))
+            results[label] = result
+            print(f"{label}: {result['seconds']:.2f}s, {result['api_calls']:,} API calls, "
+                  f"peak RSS {megabytes(result['peak_rss'])}")
+
+        full, incremental = results["Full re-run"], results["Incremental"]
+        print(f"\nIncremental costs {incremental['seconds'] / full['seconds']:.1%} of the time and "
+              f"{incremental['api_calls'] / full['api_calls']:.1%} of the API calls of a full re-run.")
+        print("Incremental stages: " + ", ".join(
+            f"{stage} {values['seconds']:.2f}s" for stage, values in incremental["stages"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# ==============================================================================
+# BENCHMARK: BULK LOADER THROUGHPUT
+# ==============================================================================
+# What it does:
+# Writes a synthetic `embeddings.jsonl` and loads it with `BulkLoader` for
+# several batch sizes and writer counts, reporting docs/sec. By default it
+# uses the in-process `MemoryBackend` with a simulated round-trip time per
+# bulk write; pass `--uri` to load into a real (local) mongod instead.
+# Every configuration is run twice to show that re-runs replace documents
+# instead of duplicating them.
+#
+# How to run:
+# > python benchmarks/benchmark_mongo_loader.py --records 50000 --latency 0.02
+# > python benchmarks/benchmark_mongo_loader.py --uri mongodb://localhost:27017
+# ==============================================================================
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_loader import EMBEDDINGS_COLLECTION, BulkLoader, MemoryBackend, MongoBackend, embedding_documents
+from synthetic_data import random_unit_vectors
+
+_VECTOR_BATCH = 10_000
+
+
+def write_embeddings(path, count, dimensions):
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, count, _VECTOR_BATCH):
+            vectors = random_unit_vectors(min(_VECTOR_BATCH, count - start), dimensions, seed=start)
+            for offset, vector in enumerate(vectors):
+                i = start + offset
+                f.write(json.dumps({
+                    "id": f"{i:016x}",
+                    "text": f"Production Year: {1990 + i % 35} | Operator: Operator {i % 500}",
+                    "vector": [round(value, 6) for value in vector.tolist()],
+                    "metadata": {"year": 1990 + i % 35, "operator": f"Operator {i % 500}"},
+                }) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="simulated seconds per bulk write (MemoryBackend only)")
+    parser.add_argument("--batch-sizes", default="100,1000")
+    parser.add_argument("--writers", default="1,4")
+    parser.add_argument("--uri", help="load into this MongoDB instead of the in-process stand-in")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "embeddings.jsonl")
+        write_embeddings(path, args.records, args.dimensions)
+        target = args.uri or f"in-process stand-in, {args.latency * 1000:.0f} ms per bulk write"
+        print(f"{args.records:,} embeddings -> {target}\n")
+        print(f"{'batch':>6} | {'writers':>7} | {'run':>6} | {'new':>8} | {'replaced':>8} | {'docs/sec':>9}")
+        for batch_size in (int(value) for value in args.batch_sizes.split(",")):
+            for writers in (int(value) for value in args.writers.split(",")):
+                if args.uri:
+                    backend = MongoBackend(args.uri, database="loader_benchmark")
+                    backend.database.drop_collection(EMBEDDINGS_COLLECTION)
+                else:
+                    backend = MemoryBackend(latency=args.latency)
+                loader = BulkLoader(backend, batch_size, writers)
+                for run in ("first", "re-run"):
+                    stats = loader.load(EMBEDDINGS_COLLECTION, embedding_documents(path))
+                    print(f"{batch_size:>6,} | {writers:>7} | {run:>6} | {stats.inserted:>8,} | "
+                          f"{stats.replaced:>8,} | {stats.docs_per_second:>9,.0f}")
+                if args.uri:
+                    backend.client.drop_database("loader_benchmark")
+                backend.close()
+
+
+if __name__ == "__main__":
+    main()
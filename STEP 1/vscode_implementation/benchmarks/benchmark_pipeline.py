@@ -0,0 +1,122 @@
+# ==============================================================================
+# BENCHMARK: THREE SCRIPTS vs THE STREAMING PIPELINE
+# ==============================================================================
+# What it does:
+# Writes a synthetic `original.csv`, then produces `embeddings.jsonl` from it
+# twice against a fake embedding API (fixed latency per call, no local CPU cost),
+# each run in its own process:
+#   1. the current flow: `1_convert_csv.py` -> `2_clean_json.py` ->
+#      `3_generate_embeddings.py`, one after the other;
+#   2. `pipeline.py`, where reading, preparing, embedding and writing overlap.
+# Prints wall time, peak RSS and the number of embeddings of both, then the
+# per-stage throughput and queue depths of the pipeline run.
+#
+# How to run:
+# > python benchmarks/benchmark_pipeline.py --rows 50000
+# ==============================================================================
+
+import argparse
+import importlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+from bench_utils import measure, megabytes
+from synthetic_data import write_synthetic_csv
+
+# Far above what the fake backend needs, so only its latency limits the runs.
+REQUESTS_PER_MINUTE = 1_000_000
+
+
+class RemoteBackend:
+    """Fake API whose vectors are computed "on the server": it only sleeps.
+
+    `FakeEmbeddingBackend` hashes every text in the calling process, which on a
+    small machine costs as much CPU as the client work being compared.
+    """
+
+    def __init__(self, latency, pool=256):
+        from fake_backend import hash_vector
+
+        self.latency = latency
+        self._vectors = [hash_vector(f"vector {i}") for i in range(pool)]
+
+    def __call__(self, texts):
+        time.sleep(self.latency)
+        return [self._vectors[zlib.crc32(text.encode("utf-8")) % len(self._vectors)]
+                for text in texts]
+
+
+def run_three_scripts(directory, rows, latency):
+    """Steps 1, 2 and 3 as separate scripts, each reading the previous one's file."""
+    os.chdir(directory)
+    os.environ["EMBEDDING_BACKEND"] = "local"
+    importlib.import_module("1_convert_csv").convert_csv_to_json("original.csv", "output.json")
+    importlib.import_module("2_clean_json").clean_json_nan_values("output.json", "output_cleaned.json")
+    step3 = importlib.import_module("3_generate_embeddings")
+    step3.get_embeddings = RemoteBackend(latency)
+    step3.RECORD_LIMIT = rows
+    step3.REQUESTS_PER_MINUTE = REQUESTS_PER_MINUTE
+    step3.EMBEDDING_CACHE_FILE = None
+    step3.VECTOR_STORE_DIR = None
+    step3.process_records()
+
+
+def run_pipeline(directory, rows, latency, stats_file):
+    """The same work through `pipeline.Pipeline`; its stats are saved to `stats_file`."""
+    from pipeline import Pipeline
+
+    os.chdir(directory)
+    pipeline = Pipeline(RemoteBackend(latency), csv_file="original.csv", record_limit=rows,
+                        requests_per_minute=REQUESTS_PER_MINUTE, on_progress=None)
+    with open(stats_file, "w") as f:
+        json.dump(pipeline.run(), f)
+
+
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake API call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scripts_dir = os.path.join(tmp, "scripts")
+        pipeline_dir = os.path.join(tmp, "pipeline")
+        for directory in (scripts_dir, pipeline_dir):
+            os.mkdir(directory)
+            write_synthetic_csv(os.path.join(directory, "original.csv"), args.rows)
+        print(f"Input: {args.rows:,} rows, "
+              f"{megabytes(os.path.getsize(os.path.join(scripts_dir, 'original.csv')))}, "
+              f"{args.latency * 1000:.0f} ms per fake API call")
+
+        stats_file = os.path.join(tmp, "stats.json")
+        runs = [
+            ("Three scripts", scripts_dir, "run_three_scripts", (scripts_dir, args.rows, args.latency)),
+            ("Pipeline", pipeline_dir, "run_pipeline",
+             (pipeline_dir, args.rows, args.latency, stats_file)),
+        ]
+        for label, directory, function, function_args in runs:
+            result = measure("benchmark_pipeline", function, *function_args)
+            embeddings = count_lines(os.path.join(directory, "embeddings.jsonl"))
+            print(f"{label}: {result['seconds']:.2f}s, peak RSS {megabytes(result['peak_rss'])}, "
+                  f"{embeddings:,} embeddings ({embeddings / result['seconds']:,.0f}/s)")
+
+        with open(stats_file) as f:
+            stats = json.load(f)
+        print(f"\n{'stage':>8} | {'items':>8} | {'per s':>7} | {'busy s':>7} | "
+              f"{'mean queue':>10} | {'max queue':>9}")
+        for name, stage in stats["stages"].items():
+            print(f"{name:>8} | {stage['items']:>8,} | {stage['per_second']:>7,.0f} | "
+                  f"{stage['busy_seconds']:>7.2f} | {stage['mean_queue']:>10.2f} | "
+                  f"{stage['max_queue']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# ==============================================================================
+# BENCHMARK: QUANTIZED vs FULL-PRECISION VECTOR SEARCH
+# ==============================================================================
+# What it does:
+# Builds exact float32 search and int8 / product-quantized search over the
+# same clustered 768-dimension vectors, then reports the memory used by the
+# searched vectors, QPS for one-at-a-time and batched queries, and recall@k
+# against exact search, both without and with exact re-ranking of the top
+# quantized candidates.
+#
+# How to run:
+# > python benchmarks/benchmark_quantization.py --size 200000
+# ==============================================================================
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import megabytes
+from benchmark_ann_index import recall
+from quantization import QuantizedSearchEngine
+from synthetic_data import clustered_unit_vectors
+from vector_search import VectorSearchEngine
+
+
+def run_queries(engine, queries, **options):
+    """Returns (results, single-query QPS, batched QPS)."""
+    start = time.perf_counter()
+    results = [engine.search(query, **options) for query in queries]
+    single = len(queries) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    engine.search_batch(queries, **options)
+    batched = len(queries) / (time.perf_counter() - start)
+    return results, single, batched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--subspaces", type=int, default=96)
+    parser.add_argument("--rerank", type=int, default=100)
+    args = parser.parse_args()
+
+    # Queries come from the same distribution as the corpus but are not in it.
+    vectors = clustered_unit_vectors(args.size + args.queries, args.dimensions,
+                                     clusters=max(1, args.size // 100))
+    queries = vectors[args.size:]
+    vectors = vectors[:args.size]
+    ids = [f"rec-{i}" for i in range(args.size)]
+    texts = [None] * args.size
+    metadata = [None] * args.size
+
+    exact = VectorSearchEngine(vectors, ids, texts, metadata, normalized=True)
+    expected, single, batched = run_queries(exact, queries, limit=args.limit)
+    print(f"{args.size:,} vectors of {args.dimensions} dimensions, recall@{args.limit}\n")
+    print(f"{'search':>22} | {'memory':>9} | {'QPS':>7} | {'batched':>7} | {'recall':>6}")
+    print(f"{'float32 exact':>22} | {megabytes(exact.vectors.nbytes):>9} | {single:>7,.0f} | "
+          f"{batched:>7,.0f} | {1.0:>6.3f}")
+
+    for method in ("int8", "pq"):
+        start = time.perf_counter()
+        engine = QuantizedSearchEngine.build(vectors, ids, texts, metadata, method, args.subspaces)
+        label = method if method == "int8" else f"pq{args.subspaces}"
+        print(f"{'(' + label + ' built in':>22} {time.perf_counter() - start:.1f} s)")
+        for rerank in (0, args.rerank):
+            results, single, batched = run_queries(engine, queries, limit=args.limit, rerank=rerank)
+            name = f"{label} + rerank {rerank}" if rerank else label
+            print(f"{name:>22} | {megabytes(engine.nbytes):>9} | {single:>7,.0f} | "
+                  f"{batched:>7,.0f} | {recall(results, expected):>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# ==============================================================================
+# LOAD TEST: RETRIEVAL SERVICE
+# ==============================================================================
+# What it does:
+# Starts `RetrievalServer` on a free local port over an exact search engine
+# with synthetic vectors and a fake embedder (hash vectors plus a fixed
+# latency, like a network call). Many keep-alive HTTP clients then send
+# questions drawn from a Zipf distribution (a few popular questions, a long
+# tail), with random case and spacing changes. For each configuration it
+# reports requests/sec, p50/p99 latency, cache hit rates and how many
+# embedding calls were made. A final burst of identical concurrent requests
+# against a fresh service shows the coalescing of in-flight embeddings.
+#
+# How to run:
+# > python benchmarks/benchmark_retrieval_service.py --clients 50 --requests 40
+# ==============================================================================
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_backend import hash_vector
+from retrieval_service import RetrievalServer, RetrievalService, TTLCache
+from synthetic_data import clustered_unit_vectors
+from vector_search import VectorSearchEngine
+
+
+class FakeQueryEmbedder:
+    """Blocking embed call with a fixed latency, like the Gemini client."""
+
+    def __init__(self, dimensions, latency):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def __call__(self, text):
+        time.sleep(self.latency)
+        return hash_vector(" ".join(text.lower().split()), self.dimensions)
+
+
+def question_stream(count, pool, skew, seed):
+    """`count` questions from a pool of `pool`, Zipf-distributed, with cosmetic variations."""
+    rng = random.Random(seed)
+    weights = [1.0 / rank ** skew for rank in range(1, pool + 1)]
+    for number in rng.choices(range(pool), weights=weights, k=count):
+        text = f"oil and gas production question {number}"
+        if rng.random() < 0.3:
+            text = text.upper()
+        if rng.random() < 0.3:
+            text = "  " + text.replace(" ", "  ")
+        yield text
+
+
+async def get(reader, writer, path):
+    """Sends one keep-alive GET request; returns (status, payload)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_clients(port, questions, clients, limit):
+    """Splits `questions` over `clients` connections; returns per-request latencies."""
+    latencies = []
+
+    async def client(batch):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for text in batch:
+                start = time.perf_counter()
+                status, payload = await get(reader, writer, f"/search?q={quote(text)}&limit={limit}")
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    raise RuntimeError(payload)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client(questions[i::clients]) for i in range(clients)))
+    return np.array(latencies)
+
+
+async def load_test(engine, embed_fn, questions, clients, limit, cache_size):
+    service = RetrievalService(
+        embed_fn, engine.search,
+        vector_cache=TTLCache(cache_size, 3600), result_cache=TTLCache(cache_size, 300),
+    )
+    server = RetrievalServer(service, port=0)
+    await server.start()
+    try:
+        start = time.perf_counter()
+        latencies = await run_clients(server.port, questions, clients, limit)
+        seconds = time.perf_counter() - start
+    finally:
+        await server.stop()
+        service.close()
+    return latencies, seconds, service.stats()
+
+
+async def burst(engine, embed_fn, size):
+    """`size` identical requests at once against a cold service; returns its stats."""
+    service = RetrievalService(embed_fn, engine.search)
+    await asyncio.gather(*(service.retrieve("How much oil was produced in Allegany?")
+                           for _ in range(size)))
+    service.close()
+    return service.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=40, help="requests per client")
+    parser.add_argument("--pool", type=int, default=500, help="distinct questions")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--limit", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = VectorSearchEngine(clustered_unit_vectors(args.size, args.dimensions),
+                                [f"rec-{i}" for i in range(args.size)],
+                                [f"record {i}" for i in range(args.size)],
+                                [{"year": 1990 + i % 35} for i in range(args.size)],
+                                normalized=True)
+    embed_fn = FakeQueryEmbedder(args.dimensions, args.embed_latency)
+    questions = list(question_stream(args.clients * args.requests, args.pool, args.skew, seed=0))
+    print(f"{args.size:,} records, {len(questions):,} requests from {args.clients} clients, "
+          f"{args.pool} distinct questions, embed latency {args.embed_latency * 1000:.0f} ms")
+    print(f"\n{'config':>10} | {'req/s':>7} | {'p50 ms':>7} | {'p99 ms':>7} | "
+          f"{'result hit':>10} | {'vector hit':>10} | {'embeds':>6} | {'coalesced':>9}")
+    for name, cache_size in (("no cache", 0), ("cache", 10_000)):
+        latencies, seconds, stats = asyncio.run(
+            load_test(engine, embed_fn, questions, args.clients, args.limit, cache_size)
+        )
+        print(f"{name:>10} | {len(latencies) / seconds:>7.0f} | "
+              f"{np.percentile(latencies, 50) * 1000:>7.1f} | "
+              f"{np.percentile(latencies, 99) * 1000:>7.1f} | "
+              f"{stats['result_cache']['hit_rate']:>10.1%} | "
+              f"{stats['vector_cache']['hit_rate']:>10.1%} | "
+              f"{stats['embed_calls']:>6,} | {stats['coalesced']:>9,}")
+
+    stats = asyncio.run(burst(engine, embed_fn, 100))
+    print(f"\nburst of 100 identical requests: {stats['embed_calls']} embed call(s), "
+          f"{stats['coalesced']} coalesced")
+
+
+if __name__ == "__main__":
+    main()
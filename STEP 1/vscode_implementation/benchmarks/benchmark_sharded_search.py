@@ -0,0 +1,161 @@
+# ==============================================================================
+# BENCHMARK: SHARDED SCATTER-GATHER SEARCH vs ONE PROCESS
+# ==============================================================================
+# What it does:
+# Writes a vector store of random 768-dimension unit vectors, then for each
+# shard count (default: 1, 2, 4, ... up to the number of cores) splits it
+# with `sharded_search.split_store`, starts the shards and lets `--clients`
+# threads send queries back to back. It reports queries per second and the
+# p50 / p95 / p99 latency, and checks the merged top-k against the exact
+# single-process search. The first line is `VectorSearchEngine` in this
+# process, under the same load.
+#
+# The shards run as worker processes behind pipes (`--transport pipes`), or as
+# nodes on local TCP ports (`--transport ports`), each a separate
+# `python sharded_search.py serve` process.
+#
+# How to run (200k vectors need about 600 MB of disk and page cache):
+# > python benchmarks/benchmark_sharded_search.py --records 200000 --clients 8
+# > python benchmarks/benchmark_sharded_search.py --transport ports --shards 1,2,4
+# ==============================================================================
+
+import argparse
+import itertools
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import IMPLEMENTATION_DIR
+from sharded_search import BASE_PORT, ShardedSearch, split_store
+from synthetic_data import random_unit_vectors
+from vector_store import VectorStore, VectorStoreWriter
+
+COUNTIES = ("Allegany", "Cattaraugus", "Chautauqua", "Erie", "Steuben", "Chemung", "Livingston")
+
+
+def build_store(directory, records, dimensions, batch_size=50_000):
+    """A store of random unit vectors with small records and `year`/`county` metadata."""
+    with VectorStoreWriter(directory) as writer:
+        for start in range(0, records, batch_size):
+            count = min(batch_size, records - start)
+            vectors = random_unit_vectors(count, dimensions, seed=start)
+            lines = [
+                json.dumps({"id": f"rec-{i}", "text": f"record {i}",
+                            "metadata": {"year": 1990 + i % 35, "county": COUNTIES[i % len(COUNTIES)]}}
+                           ).encode("utf-8") + b"\n"
+                for i in range(start, start + count)
+            ]
+            writer.write_rows(vectors, lines)
+
+
+def start_nodes(directory, shards, timeout=60):
+    """Starts one `sharded_search.py serve` process per shard; returns them and the engine."""
+    script = os.path.join(IMPLEMENTATION_DIR, "sharded_search.py")
+    authkey = secrets.token_hex(32)
+    env = dict(os.environ, OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1",
+               SHARD_AUTHKEY=authkey)
+    processes = [
+        subprocess.Popen([sys.executable, script, "serve", "--shard", str(shard)], cwd=directory,
+                         env=env, stdout=subprocess.DEVNULL)
+        for shard in range(shards)
+    ]
+    addresses = [("127.0.0.1", BASE_PORT + shard) for shard in range(shards)]
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return processes, ShardedSearch.connect(addresses, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def run_load(search, queries, clients, limit):
+    """Sends every query from `clients` threads; returns (QPS, latencies in seconds)."""
+    latencies = []
+    next_query = itertools.count()
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                index = next(next_query)
+            if index >= len(queries):
+                return
+            start = time.perf_counter()
+            search(queries[index], limit)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(queries) / (time.perf_counter() - start), np.array(latencies)
+
+
+def report(label, qps, latencies, exact):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f"{label:>14} | {qps:>8,.0f} | {p50:>7.2f} | {p95:>7.2f} | {p99:>7.2f} | {exact}")
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_shards = sorted({2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores} | {cores})
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--shards", default=",".join(map(str, default_shards)))
+    parser.add_argument("--by", default="id", help='shard by "id" or a metadata field')
+    parser.add_argument("--transport", choices=("pipes", "ports"), default="pipes")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent query threads")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = os.path.join(tmp, "embeddings_store")
+        build_store(store_dir, args.records, args.dimensions)
+        queries = random_unit_vectors(args.queries, args.dimensions, seed=-1 % 2**32)
+        exact = VectorStore.open(store_dir).search_engine()
+        expected = [[hit["id"] for hit in exact.search(query, args.limit)] for query in queries[:50]]
+        print(f"{args.records:,} vectors, {args.clients} clients, {args.queries:,} queries, "
+              f"top-{args.limit}, {cores} cores, shards over {args.transport}:\n")
+        print(f"{'search':>14} | {'QPS':>8} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | exact")
+        qps, latencies = run_load(exact.search, queries, args.clients, args.limit)
+        report("1 process", qps, latencies, "yes")
+        del exact
+
+        for shards in (int(value) for value in args.shards.split(",")):
+            split_store(store_dir, os.path.join(tmp, "embeddings_shards"), shards, args.by)
+            processes = []
+            if args.transport == "pipes":
+                engine = ShardedSearch.start(os.path.join(tmp, "embeddings_shards"))
+            else:
+                processes, engine = start_nodes(tmp, shards)
+            try:
+                # Warm up: page the shards' vectors in before timing.
+                run_load(engine.search, queries[:50], args.clients, args.limit)
+                merged = [[hit["id"] for hit in engine.search(query, args.limit)] for query in queries[:50]]
+                qps, latencies = run_load(engine.search, queries, args.clients, args.limit)
+                report(f"{shards} shard" + "s" * (shards > 1), qps, latencies,
+                       "yes" if merged == expected else "NO")
+            finally:
+                engine.close()
+                for process in processes:
+                    process.terminate()
+                    process.wait()
+
+
+if __name__ == "__main__":
+    main()
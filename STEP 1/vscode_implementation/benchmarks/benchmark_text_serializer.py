@@ -0,0 +1,77 @@
+# ==============================================================================
+# BENCHMARK: PER-RECORD vs COLUMN-WISE TEXT SERIALIZATION
+# ==============================================================================
+# What it does:
+# Builds synthetic well-production DataFrame chunks (with the same dtypes the
+# streaming converter uses), serializes them with `record_to_text` row by row
+# and with `frame_to_texts` column by column, checks that both produce exactly
+# the same strings (on these chunks and on `text_serializer.edge_case_frame`),
+# and prints rows/second for each.
+#
+# How to run:
+# > python benchmarks/benchmark_text_serializer.py --rows 1000000
+# ==============================================================================
+
+import argparse
+import csv
+import importlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from synthetic_data import COLUMNS, iter_rows
+from text_serializer import check_parity, edge_case_frame, frame_to_texts, record_to_text
+
+convert = importlib.import_module("1_convert_csv")
+
+
+def iter_chunks(rows, chunk_size):
+    """Yields DataFrame chunks parsed exactly like `convert_csv_to_jsonl` parses them."""
+    source = iter_rows(rows)
+    remaining = rows
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        writer.writerows(next(source) for _ in range(size))
+        buffer.seek(0)
+        yield pd.read_csv(buffer, dtype=convert.COLUMN_DTYPES)
+        remaining -= size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    check_parity(edge_case_frame())
+    scalar_seconds = vector_seconds = 0.0
+    for chunk in iter_chunks(args.rows, args.chunk_size):
+        records = convert.chunk_to_records(chunk)
+        start = time.perf_counter()
+        expected = [record_to_text(record) for record in records]
+        scalar_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = frame_to_texts(chunk)
+        vector_seconds += time.perf_counter() - start
+
+        if actual != expected:
+            mismatch = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b)
+            raise SystemExit(f"Parity check FAILED at row {mismatch}:\n  {actual[mismatch]!r}\n  {expected[mismatch]!r}")
+
+    print(f"Parity check passed for {args.rows:,} rows.")
+    print(f"record_to_text : {scalar_seconds:.2f}s ({args.rows / scalar_seconds:,.0f} rows/s)")
+    print(f"frame_to_texts : {vector_seconds:.2f}s ({args.rows / vector_seconds:,.0f} rows/s)")
+    print(f"Speedup        : {scalar_seconds / vector_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# ==============================================================================
+# BENCHMARK: PER-QUERY LATENCY PROFILE OF THE VECTOR INDEX CLIENT
+# ==============================================================================
+# What it does:
+# Runs `VectorIndexClient` end to end (create index, wait until ready, then
+# embed + search per query) against `LocalVectorBackend`, with the fake
+# embedding backend standing in for Gemini. Reports p50/p95/p99 latency of
+# the embedding call, the search and the whole query, for exact search and
+# for the IVF index.
+#
+# How to run:
+# > python benchmarks/benchmark_vector_index_client.py --size 100000 --embed-latency 0.05
+# ==============================================================================
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex
+from fake_backend import FakeEmbeddingBackend
+from synthetic_data import clustered_unit_vectors
+from vector_index_client import LocalVectorBackend, VectorIndexClient, index_definition
+from vector_search import VectorSearchEngine
+
+
+def percentiles_ms(values):
+    return [np.percentile(values, p) * 1000 for p in (50, 95, 99)]
+
+
+def profile(name, engine, embed_fn, questions, limit):
+    """Runs every question through a fresh client; prints the latency profile."""
+    client = VectorIndexClient(LocalVectorBackend(engine), embed_fn)
+    client.create_or_update_index(index_definition(dimensions=engine.dimensions))
+    client.wait_until_ready()
+    for question in questions:
+        client.query(question, limit)
+    timings = np.array(client.timings)
+    rows = [("embed", timings[:, 0]), ("search", timings[:, 1]), ("total", timings.sum(axis=1))]
+    for part, values in rows:
+        p50, p95, p99 = percentiles_ms(values)
+        print(f"{name:>8} | {part:>6} | {p50:>8.2f} | {p95:>8.2f} | {p99:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--embed-latency", type=float, default=0.05,
+                        help="simulated seconds per embedding call")
+    args = parser.parse_args()
+
+    vectors = clustered_unit_vectors(args.size, args.dimensions, clusters=max(1, args.size // 100))
+    ids = [f"rec-{i}" for i in range(args.size)]
+    texts = [f"record {i}" for i in range(args.size)]
+    metadata = [{"year": 1990 + i % 35} for i in range(args.size)]
+    exact = VectorSearchEngine(vectors, ids, texts, metadata, normalized=True)
+    ivf = IVFIndex.from_engine(exact)
+
+    backend = FakeEmbeddingBackend(dimensions=args.dimensions, latency=args.embed_latency)
+    questions = [f"oil production in town {i}" for i in range(args.queries)]
+
+    print(f"{args.size:,} vectors, {args.queries} queries, "
+          f"{args.embed_latency * 1000:.0f} ms simulated embedding call\n")
+    print(f"{'engine':>8} | {'part':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    profile("exact", exact, lambda text: backend([text])[0], questions, args.limit)
+    profile("ivf", ivf, lambda text: backend([text])[0], questions, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# ==============================================================================
+# BENCHMARK: LOCAL EXACT VECTOR SEARCH THROUGHPUT
+# ==============================================================================
+# What it does:
+# Builds `VectorSearchEngine` instances over random 768-dimension unit vectors
+# at several corpus sizes and reports queries per second for one-at-a-time
+# `search` calls and for `search_batch`.
+#
+# How to run (1M vectors needs about 3 GB of RAM):
+# > python benchmarks/benchmark_vector_search.py --sizes 10000,100000,1000000
+# ==============================================================================
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import random_unit_vectors
+from vector_search import VectorSearchEngine
+
+
+def build_engine(size, dimensions, seed=0):
+    """An engine over `size` random vectors with lightweight ids/text/metadata."""
+    vectors = random_unit_vectors(size, dimensions, seed)
+    ids = [f"rec-{i}" for i in range(size)]
+    texts = [f"record {i}" for i in range(size)]
+    metadata = [{"year": 1990 + i % 35} for i in range(size)]
+    return VectorSearchEngine(vectors, ids, texts, metadata, normalized=True)
+
+
+def measure_qps(function, queries, batch):
+    """Runs all queries through `function`; returns queries per second."""
+    start = time.perf_counter()
+    if batch:
+        function(queries)
+    else:
+        for query in queries:
+            function(query)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = random_unit_vectors(args.queries, args.dimensions, seed=1)
+    print(f"{'vectors':>10} | {'single QPS':>10} | {'batched QPS':>11}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        engine = build_engine(size, args.dimensions)
+        single = measure_qps(lambda q: engine.search(q, args.limit), queries, batch=False)
+        batched = measure_qps(lambda q: engine.search_batch(q, args.limit), queries, batch=True)
+        print(f"{size:>10,} | {single:>10,.0f} | {batched:>11,.0f}")
+        del engine
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# ==============================================================================
+# BENCHMARK: JSON EMBEDDINGS FILE vs MEMORY-MAPPED VECTOR STORE
+# ==============================================================================
+# What it does:
+# Writes synthetic embeddings as the legacy pretty-printed `embeddings.json`
+# and as JSON Lines, converts them to float32 and float16 vector stores, and
+# prints the size on disk of each. Then, each in its own process, it loads the
+# data and answers one query, reporting wall time and peak RSS.
+#
+# How to run:
+# > python benchmarks/benchmark_vector_store.py --records 1000000 --skip-json
+# ==============================================================================
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import measure, megabytes
+from synthetic_data import random_unit_vectors
+from vector_search import VectorSearchEngine
+from vector_store import VectorStore, VectorStoreWriter, convert_embeddings_file
+
+_BATCH = 10_000
+
+
+def synthetic_results(vectors):
+    """Yields embedding records shaped like the output of the embeddings step."""
+    for i, vector in enumerate(vectors):
+        yield {
+            "id": f"{i:016x}",
+            "text": f"Production Year: {1990 + i % 35} | Operator: Operator {i % 500} | Town: Alma",
+            "vector": vector.tolist(),
+            "metadata": {"year": 1990 + i % 35, "operator": f"Operator {i % 500}", "county": "Allegany"},
+        }
+
+
+def write_json(path, vectors):
+    """The legacy format: one pretty-printed JSON array."""
+    with open(path, "w") as f:
+        json.dump(list(synthetic_results(vectors)), f, indent=2)
+
+
+def write_jsonl(path, vectors):
+    with open(path, "w") as f:
+        for result in synthetic_results(vectors):
+            f.write(json.dumps(result) + "\n")
+
+
+def write_store(directory, vectors, dtype):
+    """Writes the store straight from the vectors, in batches."""
+    with VectorStoreWriter(directory, dtype) as writer:
+        for start in range(0, len(vectors), _BATCH):
+            writer.write_batch(list(synthetic_results(vectors[start:start + _BATCH])))
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def load_file_and_search(filename):
+    """Child-process task: load an embeddings file and run one query."""
+    engine = VectorSearchEngine.from_file(filename)
+    engine.search(np.ones(engine.dimensions, dtype=np.float32), limit=3)
+
+
+def open_store_and_search(directory):
+    """Child-process task: open a vector store and run one query."""
+    engine = VectorStore.open(directory).search_engine()
+    engine.search(np.ones(engine.dimensions, dtype=np.float32), limit=3)
+
+
+def open_store_and_read(directory):
+    """Child-process task: open a vector store and read one vector and record.
+
+    Searching a float16 store first converts it to float32 in memory, so only
+    opening it is timed here.
+    """
+    store = VectorStore.open(directory)
+    store.vectors[len(store) // 2].astype(np.float32)
+    store.record(len(store) // 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--skip-json", action="store_true",
+                        help="skip the text formats (they need ~15 KB per record on disk)")
+    args = parser.parse_args()
+
+    vectors = random_unit_vectors(args.records, args.dimensions)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            "embeddings.json": os.path.join(tmp, "embeddings.json"),
+            "embeddings.jsonl": os.path.join(tmp, "embeddings.jsonl"),
+            "store (float32)": os.path.join(tmp, "store32"),
+            "store (float16)": os.path.join(tmp, "store16"),
+        }
+        if args.skip_json:
+            del paths["embeddings.json"], paths["embeddings.jsonl"]
+            write_store(paths["store (float32)"], vectors, "float32")
+            write_store(paths["store (float16)"], vectors, "float16")
+        else:
+            write_json(paths["embeddings.json"], vectors)
+            write_jsonl(paths["embeddings.jsonl"], vectors)
+            convert_embeddings_file(paths["embeddings.json"], paths["store (float32)"], "float32")
+            convert_embeddings_file(paths["embeddings.jsonl"], paths["store (float16)"], "float16")
+        del vectors
+
+        print(f"{args.records:,} records of {args.dimensions} dimensions\n")
+        print(f"{'format':>18} | {'on disk':>10} | {'task':>15} | {'time':>8} | {'peak RSS':>10}")
+        for label, path in paths.items():
+            if label == "store (float16)":
+                task, description = "open_store_and_read", "open + 1 read"
+            elif label.startswith("store"):
+                task, description = "open_store_and_search", "open + 1 query"
+            else:
+                task, description = "load_file_and_search", "load + 1 query"
+            result = measure("benchmark_vector_store", task, path)
+            print(f"{label:>18} | {megabytes(directory_size(path)):>10} | {description:>15} | "
+                  f"{result['seconds']:>6.2f} s | {megabytes(result['peak_rss']):>10}")
+
+
+if __name__ == "__main__":
+    main()
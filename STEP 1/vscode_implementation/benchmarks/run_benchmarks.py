@@ -0,0 +1,228 @@
+# ==============================================================================
+# END-TO-END BENCHMARK SUITE
+# ==============================================================================
+# What it does:
+# For each dataset size, writes a synthetic `original.csv` and times every
+# step of the pipeline on it, each in its own process (wall time and peak RSS):
+#   convert    CSV -> JSON Lines (`1_convert_csv.py`, streaming)
+#   clean      NaN -> null (`2_clean_json.py`)
+#   serialize  records -> `record_to_text` strings
+#   embed      `EmbeddingEngine` + the local embedding backend, written to
+#              `embeddings.jsonl` (simulated latency, errors and 429s)
+#   store      `embeddings.jsonl` -> binary vector store
+#   load       open the vector store and build its search engine
+#   search     one query at a time (QPS, p50/p99) and in batches of 100
+# No API key or network is needed, and the embeddings are deterministic.
+#
+# The results are written as JSON to `benchmarks/results/<time>.json` (with
+# the git commit, Python and library versions and the machine), so runs can
+# be compared over time. `--compare` prints the change against an older run.
+#
+# How to run:
+# > python benchmarks/run_benchmarks.py --sizes 1000,10000,100000
+# > python benchmarks/run_benchmarks.py --compare benchmarks/results/<older>.json
+# ==============================================================================
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import IMPLEMENTATION_DIR, measure, megabytes
+from embedders import create_embedder
+from embedding_engine import EmbeddingEngine
+from embedding_output import CheckpointedJsonlWriter, embedding_result, iter_jsonl
+from enrichment import record_metadata
+from record_ids import assign_record_ids
+from synthetic_data import random_unit_vectors, write_synthetic_csv
+from text_serializer import record_to_text
+from vector_store import VectorStore
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _save_extras(extras_file, **extras):
+    with open(extras_file, "w") as f:
+        json.dump(extras, f)
+
+
+def serialize_records(input_file):
+    """Turns every record of a JSON Lines file into its embedding text."""
+    for record in iter_jsonl(input_file):
+        record_to_text(record)
+
+
+def embed_records(input_file, output_file, latency, error_rate, rate_limit_rate, extras_file):
+    """Embeds every record with the local backend and writes `embeddings.jsonl`."""
+    records = list(iter_jsonl(input_file))
+    items = [((record_id, record), record_to_text(record))
+             for record_id, record in zip(assign_record_ids(records), records)]
+    backend = create_embedder("local", latency=latency, error_probability=error_rate,
+                              rate_limit_probability=rate_limit_rate)
+    engine = EmbeddingEngine(backend, requests_per_minute=None, backoff_base=0.01)
+    failed = 0
+    with CheckpointedJsonlWriter(output_file) as writer:
+        for batch in engine.embed(items):
+            if not batch.ok:
+                failed += len(batch.items)
+                continue
+            writer.write_batch([
+                embedding_result(record_id, text, vector, record_metadata(record))
+                for ((record_id, record), text), vector in zip(batch.items, batch.vectors)
+            ])
+    _save_extras(extras_file, api_calls=engine.calls, retries=engine.retries, failed=failed,
+                 simulated_errors=backend.errors, simulated_429s=backend.rate_limited)
+
+
+def load_store(directory):
+    """Opens the vector store and touches every vector once."""
+    store = VectorStore.open(directory)
+    store.search_engine().search(np.ones(store.dimensions, dtype=np.float32), 1)
+
+
+def search_queries(directory, queries, extras_file):
+    """Single-query latencies and batched throughput against the vector store."""
+    store = VectorStore.open(directory)
+    engine = store.search_engine()
+    vectors = random_unit_vectors(queries, store.dimensions, seed=1)
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        engine.search(vector, 10)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for first in range(0, queries, 100):
+        engine.search_batch(vectors[first:first + 100], 10)
+    batch_seconds = time.perf_counter() - start
+    latencies = np.array(latencies)
+    _save_extras(extras_file, qps=queries / latencies.sum(),
+                 p50_ms=float(np.percentile(latencies, 50) * 1000),
+                 p99_ms=float(np.percentile(latencies, 99) * 1000),
+                 batch_qps=queries / batch_seconds)
+
+
+def run_size(size, args, directory):
+    """Runs every stage for one dataset size; returns a list of result dicts."""
+    files = {name: os.path.join(directory, name) for name in (
+        "original.csv", "output.jsonl", "output_cleaned.jsonl", "embeddings.jsonl",
+        "embeddings_store", "extras.json")}
+    write_synthetic_csv(files["original.csv"], size)
+    stages = [
+        ("convert", "1_convert_csv", "convert_csv_to_jsonl",
+         (files["original.csv"], files["output.jsonl"])),
+        ("clean", "2_clean_json", "clean_jsonl_nan_values",
+         (files["output.jsonl"], files["output_cleaned.jsonl"])),
+        ("serialize", "run_benchmarks", "serialize_records", (files["output_cleaned.jsonl"],)),
+        ("embed", "run_benchmarks", "embed_records",
+         (files["output_cleaned.jsonl"], files["embeddings.jsonl"], args.latency,
+          args.error_rate, args.rate_limit_rate, files["extras.json"])),
+        ("store", "vector_store", "convert_embeddings_file",
+         (files["embeddings.jsonl"], files["embeddings_store"])),
+        ("load", "run_benchmarks", "load_store", (files["embeddings_store"],)),
+        ("search", "run_benchmarks", "search_queries",
+         (files["embeddings_store"], args.queries, files["extras.json"])),
+    ]
+    results = []
+    for stage, module, function, function_args in stages:
+        if os.path.exists(files["extras.json"]):
+            os.remove(files["extras.json"])
+        measured = measure(module, function, *function_args)
+        items = args.queries if stage == "search" else size
+        result = {"size": size, "stage": stage, "items": items,
+                  "seconds": measured["seconds"], "per_second": items / measured["seconds"],
+                  "peak_rss": measured["peak_rss"], "baseline_rss": measured["baseline_rss"]}
+        if os.path.exists(files["extras.json"]):
+            with open(files["extras.json"]) as f:
+                result.update(json.load(f))
+        results.append(result)
+        print(f"{size:>9,} | {stage:>9} | {result['seconds']:>8.2f} | {result['per_second']:>10,.0f} | "
+              f"{megabytes(result['peak_rss']):>9} | {_details(result)}")
+    return results
+
+
+def _details(result):
+    if result["stage"] == "embed":
+        return (f"{result['api_calls']:,} calls, {result['retries']:,} retries, "
+                f"{result['failed']:,} failed")
+    if result["stage"] == "search":
+        return (f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+                f"batched {result['batch_qps']:,.0f} q/s")
+    return ""
+
+
+def environment():
+    """Where and on what code the suite ran."""
+    import pandas
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=IMPLEMENTATION_DIR, check=True,
+                                capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, previous_file):
+    """Prints the throughput change of every stage against an older results file."""
+    with open(previous_file) as f:
+        previous = {(r["size"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {previous_file}:")
+    for result in results:
+        before = previous.get((result["size"], result["stage"]))
+        if before is None:
+            continue
+        change = result["per_second"] / before["per_second"] - 1
+        print(f"{result['size']:>9,} | {result['stage']:>9} | {before['per_second']:>10,.0f} -> "
+              f"{result['per_second']:>10,.0f} /s ({change:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated record counts")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per embedding call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls failing with 429")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="an older results file to compare against")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    report = {"environment": environment(), "arguments": vars(args), "results": []}
+    print(f"{'records':>9} | {'stage':>9} | {'seconds':>8} | {'per second':>10} | "
+          f"{'peak RSS':>9} | details")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            report["results"].extend(run_size(size, args, directory))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = report["environment"]["time"].replace(":", "").replace("+0000", "Z")
+        output = os.path.join(RESULTS_DIR, f"{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to '{output}'.")
+    if args.compare:
+        compare(report["results"], args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# ==============================================================================
+# SYNTHETIC WELL-PRODUCTION DATA FOR BENCHMARKS
+# ==============================================================================
+# What it does:
+# Generates CSV rows with the same columns as the state's well-production
+# file, with a realistic share of blank cells and town/operator names that
+# contain tricky substrings such as "NaN". Output is deterministic per seed.
+# ==============================================================================
+
+import csv
+import random
+
+COLUMNS = [
+    "Production Year", "Production Date Entered", "Operator", "County", "Town",
+    "Field", "Producing Formation", "Active Oil Wells", "Inactive Oil Wells",
+    "Active Gas Wells", "Inactive Gas Wells", "Injection Wells", "Disposal Wells",
+    "Self-use Well", "Oil Produced, bbl", "Gas Produced, Mcf", "Water produced, bbl",
+    "Taxable Gas, Mcf", "Purchaser Codes", "Location",
+]
+
+COUNTIES = ["Allegany", "Cattaraugus", "Chautauqua", "Erie", "Steuben", "Chemung",
+            "Genesee", "Livingston", "Wyoming", "Seneca", "Tioga", "Cayuga"]
+TOWNS = ["Alma", "Bolivar", "Wirt", "Clarksville", "Nanticoke", "Ripley", "Busti",
+         "Hanover", "Collins", "Sheridan", "Nansen", "Genesee"]
+FORMATIONS = ["Medina", "Onondaga", "Oriskany", "Queenston", "Trenton-Black River",
+              "Marcellus", "Herkimer", "Theresa"]
+
+
+def synthetic_row(i, rng):
+    """Returns one CSV row (a list of strings) for row number `i`."""
+    def blank_or(value, probability=0.15):
+        return "" if rng.random() < probability else value
+
+    county = COUNTIES[i % len(COUNTIES)]
+    return [
+        str(1990 + rng.randrange(35)),
+        blank_or(f"{rng.randrange(1, 13):02d}/{rng.randrange(1, 28):02d}/20{rng.randrange(10, 24)}", 0.3),
+        f"Operator {rng.randrange(2000)} {'NaN Energy' if i % 50 == 0 else 'Resources'}, Inc.",
+        county,
+        rng.choice(TOWNS),
+        blank_or(f"{county} Field {rng.randrange(40)}"),
+        blank_or(rng.choice(FORMATIONS)),
+        blank_or(str(rng.randrange(30))),
+        blank_or(str(rng.randrange(10))),
+        blank_or(str(rng.randrange(60))),
+        blank_or(str(rng.randrange(10))),
+        blank_or(str(rng.randrange(3)), 0.6),
+        blank_or(str(rng.randrange(3)), 0.6),
+        blank_or(str(rng.randrange(2)), 0.6),
+        blank_or(str(rng.randrange(5000))),
+        blank_or(str(rng.randrange(200000))),
+        blank_or(str(rng.randrange(8000))),
+        blank_or(str(rng.randrange(150000))),
+        blank_or(" ".join(str(rng.randrange(100, 999)) for _ in range(rng.randrange(1, 4))), 0.4),
+        blank_or(f"({42 + rng.random():.5f}, {-79 + rng.random():.5f})", 0.2),
+    ]
+
+
+def iter_rows(count, seed=0):
+    """Yields `count` synthetic rows."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield synthetic_row(i, rng)
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    """Writes a synthetic well-production CSV with `rows` data rows."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(iter_rows(rows, seed))
+
+
+def random_unit_vectors(count, dimensions=768, seed=0, chunk_size=100_000):
+    """Returns a (count, dimensions) float32 matrix of random unit vectors.
+
+    Rows are generated in chunks so a 1M x 768 matrix never needs a float64 copy.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((count, dimensions), dtype=np.float32)
+    for start in range(0, count, chunk_size):
+        block = rng.standard_normal((min(chunk_size, count - start), dimensions), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + len(block)] = block
+    return matrix
+
+
+def clustered_unit_vectors(count, dimensions=768, clusters=1000, spread=1.5, seed=0,
+                           chunk_size=100_000):
+    """Returns `count` unit vectors drawn around `clusters` random topic directions.
+
+    Real embeddings are clumped by topic, unlike `random_unit_vectors`; `spread`
+    is the length of the noise added to each (unit) topic direction.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = random_unit_vectors(clusters, dimensions, seed=seed + 1)
+    matrix = np.empty((count, dimensions), dtype=np.float32)
+    scale = np.float32(spread / np.sqrt(dimensions))
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        block = rng.standard_normal((size, dimensions), dtype=np.float32) * scale
+        block += centers[rng.integers(0, clusters, size)]
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + size] = block
+    return matrix
@@ -0,0 +1,292 @@
+# ==============================================================================
+# BM25 KEYWORD INDEX
+# ==============================================================================
+# What it does:
+# Keeps an inverted index over the `text` field of the embedding records:
+# for every token, the rows that contain it and how often. Queries are ranked
+# with Okapi BM25, so rare exact tokens (an operator's name, a town, a
+# formation) weigh much more than tokens every record has ("production",
+# "year"). Hits use the same record ids as the embeddings output.
+#
+# The index is built incrementally: `add` skips ids that are already
+# indexed with the same text and re-indexes those whose text changed, so it
+# can be brought up to date with a growing or updated embeddings file
+# (`update_from_file`) and saved to / loaded from one `.npz` file. `remove`
+# drops records; `incremental_update.py` applies both to a saved index.
+#
+# Why it's here:
+# Dense cosine search ranks exact names poorly: "Operator 123" and
+# "Operator 124" embed almost identically. See `hybrid_search.py` for
+# combining the two.
+#
+# How to run (indexes embeddings.jsonl, then searches it):
+# > python bm25_index.py "Medina formation Allegany"
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import re
+import sys
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from vector_search import iter_embeddings, top_k
+
+# --- CONFIGURATION ---
+EMBEDDINGS_FILE = "embeddings.jsonl"
+INDEX_FILE = "bm25_index.npz"
+# Standard BM25 parameters: term-frequency saturation and length normalization.
+K1 = 1.2
+B = 0.75
+# ---------------------
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens; `Oil Produced, bbl: 1,204` -> oil produced bbl 1 204."""
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def text_digest(text):
+    """A 64-bit hash of a record's text, to notice when it changed."""
+    digest = hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class BM25Index:
+    """Incremental inverted index with Okapi BM25 ranking."""
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self._rows = {}
+        # token -> (rows containing it, term frequency in each of those rows)
+        self._postings = {}
+        self._lengths = array("i")
+        self._digests = array("q")
+        self._total_length = 0
+
+    @classmethod
+    def build(cls, ids, texts, k1=K1, b=B):
+        """Indexes `texts` under `ids`."""
+        index = cls(k1, b)
+        index.add(ids, texts)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, record_id):
+        return record_id in self._rows
+
+    @property
+    def vocabulary_size(self):
+        return len(self._postings)
+
+    def add(self, ids, texts):
+        """Indexes records; returns how many were new or changed.
+
+        An id that is already indexed keeps its row: it is skipped if its text
+        is the same, and otherwise its old tokens are removed and the new
+        text is indexed in their place.
+        """
+        added = 0
+        replaced = {}
+        for record_id, text in zip(ids, texts):
+            digest = text_digest(text)
+            row = self._rows.get(record_id)
+            if row is not None:
+                if self._digests[row] != digest:
+                    replaced[row] = (text, digest)
+                continue
+            row = len(self.ids)
+            self._rows[record_id] = row
+            self.ids.append(record_id)
+            self._lengths.append(0)
+            self._digests.append(digest)
+            self._index_row(row, text)
+            added += 1
+        if replaced:
+            self._remove_rows(replaced)
+            for row, (text, digest) in replaced.items():
+                self._digests[row] = digest
+                self._index_row(row, text)
+        return added + len(replaced)
+
+    def remove(self, ids):
+        """Drops records from the index; returns how many were in it."""
+        rows = {self._rows[record_id] for record_id in ids if record_id in self._rows}
+        if not rows:
+            return 0
+        self._remove_rows(rows)
+        # Close the gaps: every later row moves up by the number of removed rows before it.
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[list(rows)] = False
+        new_rows = (np.cumsum(keep) - 1).astype(np.int32)
+        for token, (posting_rows, frequencies) in self._postings.items():
+            moved = new_rows[np.frombuffer(posting_rows, dtype=np.int32)]
+            self._postings[token] = (array("i", moved.tobytes()), frequencies)
+        self.ids = [record_id for record_id, kept in zip(self.ids, keep) if kept]
+        self._rows = {record_id: row for row, record_id in enumerate(self.ids)}
+        self._lengths = array("i", np.frombuffer(self._lengths, dtype=np.int32)[keep].tobytes())
+        self._digests = array("q", np.frombuffer(self._digests, dtype=np.int64)[keep].tobytes())
+        return len(rows)
+
+    def _index_row(self, row, text):
+        tokens = tokenize(text)
+        self._lengths[row] = len(tokens)
+        self._total_length += len(tokens)
+        for token, count in Counter(tokens).items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = (array("i"), array("i"))
+            posting[0].append(row)
+            posting[1].append(count)
+
+    def _remove_rows(self, rows):
+        """Drops every posting of `rows`, with one pass over all postings for the whole batch."""
+        removed = np.zeros(len(self.ids), dtype=bool)
+        for row in rows:
+            removed[row] = True
+            self._total_length -= self._lengths[row]
+            self._lengths[row] = 0
+        tokens = list(self._postings)
+        sizes = np.fromiter((len(self._postings[token][0]) for token in tokens), dtype=np.int64,
+                            count=len(tokens))
+        all_rows = np.frombuffer(b"".join(self._postings[token][0] for token in tokens), dtype=np.int32)
+        # Only the tokens whose postings hold a removed row are rewritten.
+        ends = np.cumsum(sizes)
+        touched = np.unique(np.searchsorted(ends, np.flatnonzero(removed[all_rows]), side="right"))
+        for i in touched:
+            token = tokens[i]
+            posting_rows, frequencies = self._postings[token]
+            posting_rows = np.frombuffer(posting_rows, dtype=np.int32)
+            keep = ~removed[posting_rows]
+            if not keep.any():
+                del self._postings[token]
+                continue
+            self._postings[token] = (
+                array("i", posting_rows[keep].tobytes()),
+                array("i", np.frombuffer(frequencies, dtype=np.int32)[keep].tobytes()),
+            )
+
+    def update_from_file(self, filename, batch_size=10_000):
+        """Indexes the records of an embeddings file that are new or changed; returns how many."""
+        added, ids, texts = 0, [], []
+        for record in iter_embeddings(filename):
+            ids.append(record["id"])
+            texts.append(record.get("text"))
+            if len(ids) >= batch_size:
+                added += self.add(ids, texts)
+                ids, texts = [], []
+        return added + self.add(ids, texts)
+
+    def _term_weights(self, query):
+        """(rows, BM25 contribution) pairs for every query token found in the index."""
+        count = len(self.ids)
+        if count == 0:
+            return []
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        average = self._total_length / count or 1.0
+        weights = []
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.int32)
+            frequencies = np.frombuffer(posting[1], dtype=np.int32).astype(np.float32)
+            idf = np.log(1.0 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[rows] / average)
+            weights.append((rows, idf * frequencies * (self.k1 + 1.0) / (frequencies + norm)))
+        return weights
+
+    def search_rows(self, query, limit=10):
+        """Returns (rows, scores) of the `limit` best-scoring records, best first."""
+        weights = self._term_weights(query)
+        if not weights:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([rows for rows, _ in weights])
+        contributions = np.concatenate([values for _, values in weights])
+        if len(rows) > len(self.ids) // 8:
+            # Common tokens: a dense accumulator is cheaper than sorting the rows.
+            scores = np.bincount(rows, contributions, minlength=len(self.ids))
+            candidates = np.flatnonzero(scores)
+            scores = scores[candidates]
+        else:
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, contributions)
+        best = top_k(scores, limit)
+        return candidates[best], scores[best]
+
+    def search(self, query, limit=10):
+        """Returns the `limit` best matches for a keyword query as `{"id", "score"}` dicts."""
+        rows, scores = self.search_rows(query, limit)
+        return [{"id": self.ids[row], "score": float(score)} for row, score in zip(rows, scores)]
+
+    def save(self, filename):
+        """Saves the whole index to one `.npz` file."""
+        tokens = list(self._postings)
+        sizes = np.fromiter((len(self._postings[token][0]) for token in tokens), dtype=np.int64,
+                            count=len(tokens))
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        rows = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.int32)
+        for i, token in enumerate(tokens):
+            rows[offsets[i]:offsets[i + 1]] = self._postings[token][0]
+            frequencies[offsets[i]:offsets[i + 1]] = self._postings[token][1]
+        header = json.dumps({"k1": self.k1, "b": self.b, "ids": self.ids, "tokens": tokens})
+        with open(filename, "wb") as f:
+            np.savez(
+                f,
+                header=np.frombuffer(header.encode("utf-8"), dtype=np.uint8),
+                lengths=np.frombuffer(self._lengths, dtype=np.int32),
+                digests=np.frombuffer(self._digests, dtype=np.int64),
+                offsets=offsets,
+                rows=rows,
+                frequencies=frequencies,
+            )
+
+    @classmethod
+    def load(cls, filename):
+        """Loads an index written by `save`; more records can then be added to it."""
+        with np.load(filename) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            offsets, rows, frequencies = data["offsets"], data["rows"], data["frequencies"]
+            index = cls(header["k1"], header["b"])
+            index.ids = header["ids"]
+            index._rows = {record_id: row for row, record_id in enumerate(index.ids)}
+            index._lengths = array("i", data["lengths"].tobytes())
+            index._total_length = int(data["lengths"].sum())
+            # Indexes saved before digests were kept re-index each record once.
+            digests = data["digests"] if "digests" in data else np.zeros(len(index.ids), dtype=np.int64)
+            index._digests = array("q", digests.astype(np.int64).tobytes())
+            for i, token in enumerate(header["tokens"]):
+                start, end = offsets[i], offsets[i + 1]
+                index._postings[token] = (
+                    array("i", rows[start:end].tobytes()),
+                    array("i", frequencies[start:end].tobytes()),
+                )
+        return index
+
+
+if __name__ == "__main__":
+    query = " ".join(sys.argv[1:])
+    index = BM25Index.load(INDEX_FILE) if os.path.exists(INDEX_FILE) else BM25Index()
+    try:
+        added = index.update_from_file(EMBEDDINGS_FILE)
+    except FileNotFoundError:
+        print(f"ERROR: {EMBEDDINGS_FILE} was not found. Run 3_generate_embeddings.py first.")
+        sys.exit(1)
+    if added:
+        index.save(INDEX_FILE)
+    print(f"'{INDEX_FILE}': {len(index):,} records ({added:,} new or changed), "
+          f"{index.vocabulary_size:,} distinct tokens.")
+    if query:
+        for hit in index.search(query, limit=5):
+            print(f"[{hit['score']:.3f}] {hit['id']}")
@@ -0,0 +1,145 @@
+# ==============================================================================
+# CHANGE DETECTION: WHICH CSV ROWS ARE NEW, CHANGED OR GONE
+# ==============================================================================
+# What it does:
+# Reads `original.csv` in chunks and gives every row its stable record id
+# (a hash of Operator, Production Year, Field, Town and Location, see
+# `record_ids.py`) and a fingerprint (a hash of all of its columns). Compared
+# with the manifest of the previous run, every row is then one of:
+# - added:     its id is not in the manifest;
+# - updated:   its id is in the manifest with a different fingerprint;
+# - unchanged: same id, same fingerprint;
+# and every id of the manifest that is no longer in the CSV is deleted.
+#
+# The manifest (`records_manifest.json`) maps every record id to its
+# fingerprint and names the embedding model the outputs were built with.
+# `incremental_update.py` writes it once the changes have been applied.
+#
+# Why it's here:
+# When a revised CSV is published, only the rows that changed need to be
+# embedded and loaded again; this finds them without touching anything else.
+#
+# How to run (reports the changes, nothing is written):
+# > python change_detection.py
+# ==============================================================================
+
+import importlib
+import json
+import os
+
+import pandas as pd
+
+from record_ids import RecordIdAssigner, record_fingerprint
+
+_convert = importlib.import_module("1_convert_csv")
+
+# --- CONFIGURATION ---
+CSV_FILE = "original.csv"
+MANIFEST_FILE = "records_manifest.json"
+# Keep this equal to the limit the outputs were built with: rows past it would
+# otherwise count as deleted. Set to None to use every row.
+RECORD_LIMIT = 10000
+# Rows read into memory at a time.
+CHUNK_SIZE = 5_000
+# ---------------------
+
+MANIFEST_VERSION = 1
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Returns the saved manifest, or None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"'{path}' has manifest version {manifest.get('version')}, "
+                         f"expected {MANIFEST_VERSION}")
+    return manifest
+
+
+def save_manifest(fingerprints, path=MANIFEST_FILE, model=None):
+    """Atomically replaces the manifest with `{record id: fingerprint}`."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "model": model, "records": fingerprints}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def iter_csv_records(csv_file=CSV_FILE, record_limit=RECORD_LIMIT, chunk_size=CHUNK_SIZE):
+    """Yields (record id, record) for every CSV row in file order, with blanks as None."""
+    header = pd.read_csv(csv_file, nrows=0).columns
+    dtypes = {column: dtype for column, dtype in _convert.COLUMN_DTYPES.items() if column in header}
+    assign = RecordIdAssigner()
+    remaining = record_limit
+    for chunk in pd.read_csv(csv_file, dtype=dtypes, chunksize=chunk_size):
+        if remaining is not None:
+            chunk = chunk.iloc[:remaining]
+            remaining -= len(chunk)
+        for record in _convert.chunk_to_records(chunk):
+            yield assign(record), record
+        if remaining is not None and remaining <= 0:
+            break
+
+
+class ChangeSet:
+    """Sorts rows into added / updated / unchanged as they are checked.
+
+    `finish()` then lists the deleted ids: those of `previous` that were never checked.
+    """
+
+    def __init__(self, previous=None):
+        self.previous = previous or {}
+        self.fingerprints = {}
+        self.added = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+
+    def check(self, record_id, record):
+        """Fingerprints one row; returns "added", "updated", or None if it is unchanged."""
+        fingerprint = record_fingerprint(record)
+        self.fingerprints[record_id] = fingerprint
+        previous = self.previous.get(record_id)
+        if previous is None:
+            self.added.append(record_id)
+            return "added"
+        if previous != fingerprint:
+            self.updated.append(record_id)
+            return "updated"
+        self.unchanged += 1
+        return None
+
+    def finish(self):
+        self.deleted = [record_id for record_id in self.previous if record_id not in self.fingerprints]
+        return self
+
+    @property
+    def changed_ids(self):
+        """Every id whose earlier outputs have to be replaced or removed."""
+        return set(self.added) | set(self.updated) | set(self.deleted)
+
+    def summary(self):
+        return (f"{len(self.added):,} added, {len(self.updated):,} updated, "
+                f"{len(self.deleted):,} deleted, {self.unchanged:,} unchanged")
+
+
+def detect_changes(csv_file=CSV_FILE, previous=None, record_limit=RECORD_LIMIT, chunk_size=CHUNK_SIZE):
+    """Diffs the CSV against `{record id: fingerprint}`; returns the finished `ChangeSet`."""
+    changes = ChangeSet(previous)
+    for record_id, record in iter_csv_records(csv_file, record_limit, chunk_size):
+        changes.check(record_id, record)
+    return changes.finish()
+
+
+if __name__ == "__main__":
+    try:
+        manifest = load_manifest()
+        if manifest is None:
+            print(f"No '{MANIFEST_FILE}' yet: every row counts as added.")
+        changes = detect_changes(previous=manifest["records"] if manifest else None)
+        print(f"'{CSV_FILE}' against '{MANIFEST_FILE}': {changes.summary()}.")
+    except FileNotFoundError as e:
+        print(f"ERROR: The file '{e.filename}' was not found.")
@@ -0,0 +1,141 @@
+# ==============================================================================
+# TOKEN-AWARE CHUNKING OF LONG RECORD TEXTS
+# ==============================================================================
+# What it does:
+# Splits record texts that are too long for one embedding request into
+# overlapping chunks, so every part of a record is embedded instead of only
+# the first 20,000 characters.
+# - `count_tokens` estimates the model's token count. It is deliberately
+#   pessimistic (every digit and punctuation mark is a token, words count one
+#   token per 8 letters), so a chunk never exceeds the model's input limit.
+# - `split_record` cuts a text into chunks of at most `MAX_CHUNK_TOKENS`
+#   tokens that overlap by `CHUNK_OVERLAP` tokens, preferring to cut at a
+#   " | " field separator. A text that fits is returned unchanged under its
+#   record id. Chunks get the ids `<record id>#0`, `<record id>#1`, ... and
+#   remember the character offset where they start.
+# - `collapse_hits` / `ParentSearch` turn chunk search results back into one
+#   result per record, scored by its best chunk ("max") or by the mean of
+#   its chunks among the hits ("mean").
+#
+# Why it's here:
+# Text past the cut was silently dropped and could never be found.
+# ==============================================================================
+
+import re
+
+# --- CONFIGURATION ---
+# text-embedding-004 accepts up to 2,048 input tokens; leave a little headroom.
+MAX_CHUNK_TOKENS = 2000
+# Tokens repeated at the start of the next chunk, so a field cut in half is
+# still whole in one of the two chunks.
+CHUNK_OVERLAP = 200
+# How far back (share of a chunk) to look for a " | " to cut at.
+BOUNDARY_WINDOW = 0.25
+# Chunk hits fetched per requested record when collapsing search results.
+OVERSAMPLE = 4
+# ---------------------
+
+CHUNK_SEPARATOR = "#"
+
+_TOKEN = re.compile(r"[^\W\d_]{1,8}|\d|[^\w\s]|_")
+
+
+def count_tokens(text):
+    """A pessimistic estimate of the number of model tokens in `text`."""
+    return len(_TOKEN.findall(text)) if text else 0
+
+
+def chunk_text(text, max_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Returns [(character offset, chunk text)]; a text that fits is one chunk."""
+    if not 0 <= overlap < max_tokens // 2:
+        raise ValueError("overlap must be less than half of max_tokens")
+    if len(text) <= max_tokens:
+        # Every token is at least one character long.
+        return [(0, text)]
+    spans = [match.span() for match in _TOKEN.finditer(text)]
+    if len(spans) <= max_tokens:
+        return [(0, text)]
+    chunks = []
+    first = 0
+    while True:
+        last = min(first + max_tokens, len(spans))
+        if last < len(spans):
+            # Cut just before the last field separator near the end, if there is one.
+            for token in range(last - 1, last - int(max_tokens * BOUNDARY_WINDOW), -1):
+                if text[spans[token][0]] == "|":
+                    last = token
+                    break
+        start = 0 if first == 0 else spans[first][0]
+        end = len(text) if last == len(spans) else spans[last][0]
+        chunks.append((start, text[start:end].rstrip(" |")))
+        if last == len(spans):
+            return chunks
+        first = last - overlap
+
+
+def chunk_id(record_id, number):
+    return f"{record_id}{CHUNK_SEPARATOR}{number}"
+
+
+def parent_id(record_id):
+    """`<record id>#3` -> `<record id>`; ids of unchunked records are returned as they are.
+
+    Outputs written before ids were strings have integer ids (`"id": 5`); they come back as "5".
+    """
+    return str(record_id).split(CHUNK_SEPARATOR, 1)[0]
+
+
+def label_chunks(record_id, chunks):
+    """[(offset, text)] from `chunk_text` -> [(id, offset, text)]."""
+    if len(chunks) == 1:
+        return [(record_id, 0, chunks[0][1])]
+    return [(chunk_id(record_id, number), offset, chunk)
+            for number, (offset, chunk) in enumerate(chunks)]
+
+
+def split_record(record_id, text, max_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Returns [(id, character offset, text)] for one record text."""
+    return label_chunks(record_id, chunk_text(text, max_tokens, overlap))
+
+
+def collapse_hits(hits, limit, mode="max"):
+    """Merges chunk hits into one hit per record, best first.
+
+    The record's hit is its best chunk's, with `id` set to the record id,
+    `score` set to the max or mean chunk score, and `chunks` set to how many
+    of its chunks were among the hits.
+    """
+    if mode not in ("max", "mean"):
+        raise ValueError("mode must be 'max' or 'mean'")
+    groups = {}
+    for hit in hits:
+        groups.setdefault(parent_id(hit["id"]), []).append(hit)
+    results = []
+    for record_id, group in groups.items():
+        best = max(group, key=lambda hit: hit["score"])
+        scores = [hit["score"] for hit in group]
+        score = best["score"] if mode == "max" else sum(scores) / len(scores)
+        results.append(dict(best, id=record_id, score=score, chunks=len(group)))
+    results.sort(key=lambda hit: hit["score"], reverse=True)
+    return results[:limit]
+
+
+class ParentSearch:
+    """Wraps a search engine whose rows may be chunks; results are whole records."""
+
+    def __init__(self, engine, mode="max", oversample=OVERSAMPLE):
+        self.engine = engine
+        self.mode = mode
+        self.oversample = oversample
+
+    def search(self, query_vector, limit=3, **options):
+        hits = self.engine.search(query_vector, limit * self.oversample, **options)
+        return collapse_hits(hits, limit, self.mode)
+
+    def __len__(self):
+        """The number of rows (records and chunks) in the wrapped engine."""
+        return len(self.engine)
+
+    def close(self):
+        if hasattr(self.engine, "close"):
+            self.engine.close()
@@ -0,0 +1,114 @@
+# ==============================================================================
+# EMBEDDING BACKENDS
+# ==============================================================================
+# What it does:
+# One interface for every embedding backend: an embedder is a callable
+# `embedder(texts) -> vectors` (one list of numbers per text) with a `model`
+# name, which is also what the embedding cache is keyed by.
+# - "gemini": the Gemini batch embedding API (needs GEMINI_API_KEY);
+# - "local":  `fake_backend.FakeEmbeddingBackend`, deterministic hash-seeded
+#             768-number vectors computed offline, with optional simulated
+#             latency, errors and rate limits.
+#
+# The backend is picked with the EMBEDDING_BACKEND environment variable (or
+# in the .env file), so the scripts run unchanged without a key or network:
+# > EMBEDDING_BACKEND=local python 3_generate_embeddings.py
+#
+# The local backend's simulation is set the same way:
+#   LOCAL_EMBEDDING_LATENCY      seconds per call (default 0)
+#   LOCAL_EMBEDDING_ERROR_RATE   share of calls failing with a 503 (default 0)
+#   LOCAL_EMBEDDING_429_RATE     share of calls failing with a 429 (default 0)
+#   LOCAL_EMBEDDING_QUOTA        requests per minute before 429s (default: none)
+#
+# These settings are read when an embedder is created, and the Gemini library
+# (about 0.7 s to import) only on the first call, so importing this module
+# costs nothing.
+# ==============================================================================
+
+from embedding_engine import PermanentError, RateLimitError
+from settings import setting
+
+# --- DEFAULTS ---
+# Used when EMBEDDING_BACKEND is not set.
+DEFAULT_BACKEND = "gemini"
+EMBEDDING_MODEL = "models/text-embedding-004"
+# ----------------
+
+BACKENDS = ("gemini", "local")
+
+
+class GeminiEmbedder:
+    """Embeds batches of texts with the Gemini API."""
+
+    def __init__(self, model=EMBEDDING_MODEL, task_type="retrieval_document", api_key=None):
+        self._api_key = api_key or setting("GEMINI_API_KEY")
+        if not self._api_key:
+            raise RuntimeError("GEMINI_API_KEY not found in environment variables")
+        self._genai = None
+        self.model = model
+        self.task_type = task_type
+
+    def _client(self):
+        if self._genai is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=self._api_key)
+            self._genai = genai
+        return self._genai
+
+    def __call__(self, texts):
+        # Errors are raised rather than swallowed so the embedding engine can
+        # retry the batch with backoff. They are translated into the engine's
+        # types: a 429 goes through its rate-limit handling, and a request the
+        # API rejects (bad input, key or model) is not retried.
+        genai = self._client()
+        from google.api_core import exceptions
+
+        try:
+            result = genai.embed_content(model=self.model, content=texts, task_type=self.task_type)
+        except exceptions.TooManyRequests as e:
+            raise RateLimitError(str(e)) from e
+        except (exceptions.BadRequest, exceptions.Unauthorized, exceptions.Forbidden,
+                exceptions.NotFound) as e:
+            raise PermanentError(f"{type(e).__name__}: {e}") from e
+        return result["embedding"]
+
+
+class QueryEmbedder:
+    """Embeds one question at a time: `embedder(text) -> vector`."""
+
+    def __init__(self, embedder):
+        self._embedder = embedder
+        self.model = embedder.model
+
+    def __call__(self, text):
+        return self._embedder([text])[0]
+
+
+def create_embedder(backend=None, task_type="retrieval_document", model=None, **options):
+    """Returns the embedder for `backend` (default: the EMBEDDING_BACKEND setting).
+
+    `options` go to the backend's constructor; for "local" they override the
+    LOCAL_EMBEDDING_* settings (e.g. `latency=0.2`). `model` only applies to
+    "gemini".
+    """
+    backend = backend or setting("EMBEDDING_BACKEND", DEFAULT_BACKEND)
+    if backend == "gemini":
+        return GeminiEmbedder(model or EMBEDDING_MODEL, task_type, **options)
+    if backend == "local":
+        from fake_backend import FakeEmbeddingBackend
+
+        settings = {
+            "latency": float(setting("LOCAL_EMBEDDING_LATENCY", "0")),
+            "error_probability": float(setting("LOCAL_EMBEDDING_ERROR_RATE", "0")),
+            "rate_limit_probability": float(setting("LOCAL_EMBEDDING_429_RATE", "0")),
+            "requests_per_minute": int(setting("LOCAL_EMBEDDING_QUOTA", "0")) or None,
+        }
+        settings.update(options)
+        return FakeEmbeddingBackend(**settings)
+    raise ValueError(f"unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def create_query_embedder(backend=None, model=None, **options):
+    """A `QueryEmbedder` for questions (task type `retrieval_query`) on `backend`."""
+    return QueryEmbedder(create_embedder(backend, "retrieval_query", model, **options))
@@ -0,0 +1,147 @@
+# ==============================================================================
+# CONTENT-ADDRESSED EMBEDDING CACHE
+# ==============================================================================
+# What it does:
+# Stores every embedding the pipeline has ever generated in a small SQLite file,
+# keyed by a SHA-256 hash of the model name, the task type and the exact text
+# that was embedded. Before calling the API, the pipeline asks the cache first;
+# only texts it has never seen are sent to Gemini.
+#
+# Why it's here:
+# When `original.csv` only gains a few new rows, re-running the pipeline should
+# not pay to re-embed thousands of records whose text has not changed.
+#
+# Size bound:
+# The cache keeps at most `max_entries` vectors. When it grows past that, the
+# least recently used entries are evicted.
+# ==============================================================================
+
+import hashlib
+import sqlite3
+import time
+from array import array
+
+# --- DEFAULTS ---
+DEFAULT_CACHE_FILE = "embedding_cache.sqlite"
+# Roughly 6 KB per 768-dimension vector, so 200k entries is about 1.2 GB.
+DEFAULT_MAX_ENTRIES = 200_000
+# ----------------
+
+# SQLite limits the number of parameters in a single query.
+_LOOKUP_CHUNK = 500
+
+
+def cache_key(text, model, task_type):
+    """Returns the hex digest that identifies `text` embedded by `model` for `task_type`."""
+    digest = hashlib.sha256()
+    for part in (model, task_type, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """A persistent, size-bounded LRU cache of text -> embedding vector."""
+
+    def __init__(self, path, model, task_type, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.model = model
+        self.task_type = task_type
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Opened in one thread and used by another (e.g. the pipeline's embed
+        # stage) is fine: the engine only touches the cache from one thread at a time.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    def key(self, text):
+        return cache_key(text, self.model, self.task_type)
+
+    def get_many(self, texts):
+        """Returns `{text: vector}` for every text that is already cached."""
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), _LOOKUP_CHUNK):
+            chunk = key_list[start:start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[keys[key]] = array("d", blob).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, self.key(text)) for text in found],
+            )
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, text):
+        """Returns the cached vector for `text`, or None."""
+        return self.get_many([text]).get(text)
+
+    def put_many(self, pairs):
+        """Stores `(text, vector)` pairs and evicts old entries if the cache is full."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(self.key(text), array("d", vector).tobytes(), now) for text, vector in pairs],
+        )
+        self._conn.commit()
+        self._evict()
+
+    def put(self, text, vector):
+        self.put_many([(text, vector)])
+
+    def _evict(self):
+        """Deletes the least recently used entries beyond `max_entries`."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def summary(self):
+        """A one-line, human-readable hit-rate report."""
+        return (
+            f"Cache: {self.hits:,} hits, {self.misses:,} misses "
+            f"({self.hit_rate:.1%} hit rate), {len(self):,} entries in '{self.path}'"
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,252 @@
+# ==============================================================================
+# EMBEDDING ENGINE: BATCHED, CONCURRENT, RATE-LIMITED
+# ==============================================================================
+# What it does:
+# Packs many record texts into each embedding request, keeps a configurable
+# number of those batch requests in flight on a thread pool, and paces them
+# with a token-bucket rate limiter. Each batch is retried on its own with
+# exponential backoff, and a batch that still fails is reported back to the
+# caller instead of silently disappearing. When an `EmbeddingCache` is given,
+# texts that were embedded before are served from it and never sent to the API.
+# When a `metrics.Metrics` is given, every call's latency, the time spent
+# waiting for the rate limiter and in backoff, and retries and failures by
+# reason are recorded in it.
+#
+# Why it's here:
+# Calling the API once per record and sleeping for a second every 10 records
+# leaves the pipeline idle most of the time. Batching and overlapping the
+# requests turns hours of waiting into minutes.
+#
+# How to use:
+# >>> engine = EmbeddingEngine(embed_fn, batch_size=100, max_in_flight=4)
+# >>> for batch in engine.embed(items):   # items = [(key, text), ...]
+# ...     batch.items, batch.vectors, batch.error
+# ==============================================================================
+
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- DEFAULTS ---
+# Gemini's batch endpoint accepts up to 100 texts per request.
+DEFAULT_BATCH_SIZE = 100
+# Number of batch requests allowed to run at the same time.
+DEFAULT_MAX_IN_FLIGHT = 4
+# Request budget for the embedding API (one batch = one request).
+DEFAULT_REQUESTS_PER_MINUTE = 150
+# How many times a failed batch is retried before it is reported as failed.
+DEFAULT_MAX_RETRIES = 5
+# ----------------
+
+
+class RateLimitError(Exception):
+    """Raised by an embedding backend when the API answers with HTTP 429."""
+
+
+class PermanentError(Exception):
+    """Raised by an embedding backend for errors that retrying cannot fix (bad request, bad key)."""
+
+
+def error_reason(error):
+    """Short label for why a call failed: "rate_limited" or the exception's type name."""
+    if isinstance(error, RateLimitError):
+        return "rate_limited"
+    if isinstance(error, PermanentError) and error.__cause__ is not None:
+        return type(error.__cause__).__name__
+    return type(error).__name__
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available, then consumes them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_for = (tokens - self._tokens) / self.rate
+            self._sleep(wait_for)
+
+
+class BatchResult:
+    """The outcome of one batch: the input items plus vectors, or the final error."""
+
+    __slots__ = ("items", "vectors", "error", "attempts", "cached")
+
+    def __init__(self, items, vectors=None, error=None, attempts=1, cached=False):
+        self.items = items
+        self.vectors = vectors
+        self.error = error
+        self.attempts = attempts
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def iter_batches(items, batch_size):
+    """Groups an iterable of items into lists of at most `batch_size`."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class EmbeddingEngine:
+    """Embeds `(key, text)` items in batches with bounded concurrency and retries.
+
+    `embed_fn(texts)` must return one vector per input text, in order, and
+    should raise (ideally `RateLimitError` for 429s) when the call fails.
+    A `PermanentError` fails the batch at once, without retries.
+    """
+
+    def __init__(
+        self,
+        embed_fn,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_base=1.0,
+        backoff_max=60.0,
+        cache=None,
+        sleep=time.sleep,
+        metrics=None,
+    ):
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be at least 1")
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.metrics = metrics
+        self._sleep = sleep
+        self.limiter = None
+        if requests_per_minute:
+            # Allow a short burst so every worker can start immediately.
+            self.limiter = TokenBucket(
+                requests_per_minute / 60.0, capacity=max_in_flight, sleep=sleep
+            )
+        self.calls = 0
+        self.retries = 0
+        self._stats_lock = threading.Lock()
+
+    def _backoff(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt."""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _run_batch(self, batch):
+        """Embeds one batch, retrying it on its own until it succeeds or gives up."""
+        texts = [text for _, text in batch]
+        attempt = 0
+        metrics = self.metrics
+        while True:
+            if self.limiter is not None:
+                start = time.perf_counter()
+                self.limiter.acquire()
+                if metrics is not None:
+                    metrics.count("embedding_wait_seconds_total", time.perf_counter() - start,
+                                  reason="rate_limiter")
+            with self._stats_lock:
+                self.calls += 1
+            start = time.perf_counter()
+            try:
+                vectors = self.embed_fn(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(
+                        f"backend returned {len(vectors)} vectors for {len(texts)} texts"
+                    )
+                if metrics is not None:
+                    metrics.observe("embedding_call_seconds", time.perf_counter() - start, outcome="ok")
+                    metrics.count("embedding_texts_total", len(texts), source="api")
+                return BatchResult(batch, vectors=vectors, attempts=attempt + 1)
+            except Exception as e:
+                reason = error_reason(e)
+                if metrics is not None:
+                    metrics.observe("embedding_call_seconds", time.perf_counter() - start, outcome="error")
+                if attempt >= self.max_retries or isinstance(e, PermanentError):
+                    if metrics is not None:
+                        metrics.count("embedding_batches_failed_total", reason=reason)
+                    return BatchResult(batch, error=e, attempts=attempt + 1)
+                with self._stats_lock:
+                    self.retries += 1
+                delay = self._backoff(attempt)
+                if metrics is not None:
+                    metrics.count("embedding_retries_total", reason=reason)
+                    metrics.count("embedding_wait_seconds_total", delay, reason="backoff")
+                self._sleep(delay)
+                attempt += 1
+
+    def _split_cached(self, chunk):
+        """Splits a chunk of items into a cached `BatchResult` (or None) and the misses."""
+        found = self.cache.get_many([text for _, text in chunk])
+        if not found:
+            return None, chunk
+        hits = [item for item in chunk if item[1] in found]
+        misses = [item for item in chunk if item[1] not in found]
+        result = BatchResult(hits, vectors=[found[text] for _, text in hits], attempts=0, cached=True)
+        if self.metrics is not None:
+            self.metrics.count("embedding_texts_total", len(hits), source="cache")
+        return result, misses
+
+    def _collect(self, done):
+        """Yields finished batch results, storing fresh vectors in the cache."""
+        for future in done:
+            result = future.result()
+            if result.ok and self.cache is not None:
+                self.cache.put_many(
+                    (text, vector) for (_, text), vector in zip(result.items, result.vectors)
+                )
+            yield result
+
+    def embed(self, items):
+        """Yields a `BatchResult` for every batch, in completion order."""
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            pending = set()
+            buffer = []
+            for chunk in iter_batches(items, self.batch_size):
+                if self.cache is not None:
+                    hits, chunk = self._split_cached(chunk)
+                    if hits is not None:
+                        yield hits
+                buffer.extend(chunk)
+                while len(buffer) >= self.batch_size:
+                    batch, buffer = buffer[:self.batch_size], buffer[self.batch_size:]
+                    pending.add(pool.submit(self._run_batch, batch))
+                    if len(pending) >= self.max_in_flight:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from self._collect(done)
+            if buffer:
+                pending.add(pool.submit(self._run_batch, buffer))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._collect(done)
@@ -0,0 +1,206 @@
+# ==============================================================================
+# CHECKPOINTED, APPEND-ONLY EMBEDDINGS OUTPUT (JSON LINES)
+# ==============================================================================
+# What it does:
+# Appends each finished batch of embeddings to a JSON Lines file (one record
+# per line) and, once the batch is safely on disk, records a checkpoint with
+# the byte offset of the last complete batch. On restart, anything written
+# after that offset is discarded. The writer also remembers a hash of every
+# line's text, so a resumed run skips only the records whose text is still
+# the same (`stale_records` lists the ones that changed or are gone).
+#
+# Why it's here:
+# Keeping every result in memory until the very end means a crash or quota
+# error late in the run loses everything. With this writer a run can be
+# stopped at any point and resumed where it left off, and memory use is
+# bounded by one batch instead of the whole output.
+#
+# `replace_records` swaps the embeddings of some records for new ones (used
+# by `incremental_update.py`) without parsing any vectors.
+# ==============================================================================
+
+import hashlib
+import json
+import os
+
+from chunking import parent_id
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+_decoder = json.JSONDecoder()
+_ID_PREFIX = '{"id": '
+_TEXT_PREFIX = ', "text": '
+
+
+def read_line_id(line):
+    """Extracts the `id` from an output line without parsing its vector."""
+    if line.startswith(_ID_PREFIX):
+        value, _ = _decoder.raw_decode(line, len(_ID_PREFIX))
+        return value
+    return json.loads(line)["id"]
+
+
+def read_line_id_and_text(line):
+    """(`id`, `text`) of an output line, without parsing its vector."""
+    if line.startswith(_ID_PREFIX):
+        record_id, end = _decoder.raw_decode(line, len(_ID_PREFIX))
+        if line.startswith(_TEXT_PREFIX, end):
+            text, _ = _decoder.raw_decode(line, end + len(_TEXT_PREFIX))
+            return record_id, text
+    result = json.loads(line)
+    return result["id"], result.get("text")
+
+
+def text_digest(text):
+    """A 64-bit hash of an embedded text, to notice when a record's text changed."""
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).hexdigest()
+
+
+def stale_records(done_digests, expected):
+    """Record ids whose embeddings in the output no longer match the input.
+
+    `done_digests` is {output id: text digest} of the output (see
+    `CheckpointedJsonlWriter`), `expected` is {record id: [(output id, text)]}
+    of the input. A record is stale if its texts or chunks differ, or if it is
+    no longer in the input at all.
+    """
+    stored = {}
+    for result_id, digest in done_digests.items():
+        stored.setdefault(parent_id(result_id), {})[result_id] = digest
+    stale = {record_id for record_id in stored if record_id not in expected}
+    for record_id, chunks in expected.items():
+        have = stored.get(record_id)
+        if have is not None and have != {result_id: text_digest(text) for result_id, text in chunks}:
+            stale.add(record_id)
+    return stale
+
+
+def line_record_id(line):
+    """The record id of an output line: its `id`, without the chunk number."""
+    return parent_id(read_line_id(line))
+
+
+def embedding_result(result_id, text, vector, metadata, record_id=None, offset=0):
+    """One output record. Chunks of a long record also get `parent_id` and `offset`."""
+    result = {"id": result_id, "text": text, "vector": vector, "metadata": metadata}
+    if record_id is not None and result_id != record_id:
+        result["parent_id"] = record_id
+        result["offset"] = offset
+    return result
+
+
+def iter_jsonl(filename):
+    """Yields one parsed record per non-empty line of a JSON Lines file."""
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CheckpointedJsonlWriter:
+    """Append-only JSON Lines writer that can resume after a crash."""
+
+    def __init__(self, path, checkpoint_path=None):
+        self.path = path
+        self.checkpoint_path = checkpoint_path or path + CHECKPOINT_SUFFIX
+        self.done_ids = set()
+        # {output id: text digest} of every line in the file.
+        self.done_digests = {}
+        offset = self._recover()
+        self._file = open(path, "a+b")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.written = 0
+
+    def _recover(self):
+        """Finds the last durable offset and loads the ids written before it."""
+        if not os.path.exists(self.path):
+            return 0
+        offset = None
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                offset = json.load(f)["offset"]
+        position = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                # Without a checkpoint, trust every complete (newline-terminated) line.
+                if offset is not None and position + len(raw) > offset:
+                    break
+                if not raw.endswith(b"\n"):
+                    break
+                position += len(raw)
+                line = raw.decode("utf-8").strip()
+                if line:
+                    result_id, text = read_line_id_and_text(line)
+                    self.done_ids.add(result_id)
+                    self.done_digests[result_id] = text_digest(text)
+        return position
+
+    def write_batch(self, results):
+        """Appends `results`, syncs them to disk, then advances the checkpoint."""
+        if not results:
+            return
+        lines = "".join(
+            json.dumps(result, ensure_ascii=False) + "\n" for result in results
+        )
+        self._file.write(lines.encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for result in results:
+            self.done_ids.add(result["id"])
+            self.done_digests[result["id"]] = text_digest(result.get("text"))
+        self.written += len(results)
+        self._save_checkpoint(self._file.tell())
+
+    def _save_checkpoint(self, offset):
+        """Atomically replaces the checkpoint file with the new offset."""
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"offset": offset, "records": len(self.done_ids)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replace_records(path, new_file, record_ids):
+    """Rewrites `path` without the embeddings of `record_ids`, then appends theirs from `new_file`.
+
+    Lines of `new_file` for other records are ignored; with `new_file` None,
+    the records are only removed. Returns the (removed,
+    added) output ids. The old checkpoint is dropped, so a writer that opens
+    the file later trusts every complete line of it.
+    """
+    removed, added = [], []
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if line_record_id(line) in record_ids:
+                        removed.append(read_line_id(line))
+                    else:
+                        out.write(line)
+        if new_file is not None and os.path.exists(new_file):
+            with open(new_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() and line_record_id(line) in record_ids:
+                        out.write(line)
+                        added.append(read_line_id(line))
+        out.flush()
+        os.fsync(out.fileno())
+    checkpoint = path + CHECKPOINT_SUFFIX
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    os.replace(tmp, path)
+    return removed, added
@@ -0,0 +1,154 @@
+# ==============================================================================
+# METADATA ENRICHMENT (LOCAL HASH JOIN)
+# ==============================================================================
+# What it does:
+# Attaches the full metadata field set from the STEP 3 guide (year, town,
+# field, producing formation, well counts, produced volumes, ...) to every
+# embedding, taken from the exact source record the embedding came from.
+# - `record_metadata` builds that metadata for one source record; step 2 uses
+#   it while the embeddings are written, so new outputs are already enriched.
+# - `RecordIndex` is an in-memory hash index of the source records keyed by
+#   their stable record id (see `record_ids.py`), for joining files that were
+#   written separately.
+# - `enrich_embeddings` uses the index to enrich an existing embeddings file.
+#
+# Why it's here:
+# The `$lookup` on `metadata.operator` in the STEP 3 guide scans the whole
+# `documents` collection for every embedding, and then attaches the *first*
+# row for that operator, which is usually a different year, town or well
+# than the row that was embedded. Joining on the record id is one dictionary
+# lookup per embedding and always picks the right row.
+#
+# How to run (enriches an existing embeddings file):
+# > python enrichment.py
+# ==============================================================================
+
+import json
+import math
+
+from record_ids import RecordIdAssigner
+
+# --- CONFIGURATION ---
+# The source records (output of step 1/2) and the embeddings to enrich.
+SOURCE_FILE = "output_cleaned.json"
+EMBEDDINGS_FILE = "embeddings.jsonl"
+# Enriched embeddings are written here as JSON Lines.
+ENRICHED_FILE = "embeddings_enriched.jsonl"
+# ---------------------
+
+# Metadata field name -> source column, as in the STEP 3 enrichment pipeline.
+METADATA_FIELDS = {
+    "year": "Production Year",
+    "production_date_entered": "Production Date Entered",
+    "operator": "Operator",
+    "county": "County",
+    "town": "Town",
+    "field": "Field",
+    "producing_formation": "Producing Formation",
+    "active_oil_wells": "Active Oil Wells",
+    "inactive_oil_wells": "Inactive Oil Wells",
+    "active_gas_wells": "Active Gas Wells",
+    "inactive_gas_wells": "Inactive Gas Wells",
+    "injection_wells": "Injection Wells",
+    "disposal_wells": "Disposal Wells",
+    "self_use_well": "Self-use Well",
+    "oil_produced_bbl": "Oil Produced, bbl",
+    "gas_produced_mcf": "Gas Produced, Mcf",
+    "water_produced_bbl": "Water produced, bbl",
+    "taxable_gas_mcf": "Taxable Gas, Mcf",
+    "purchaser_codes": "Purchaser Codes",
+    "location": "Location",
+}
+
+_FIELD_NAMES = tuple(METADATA_FIELDS)
+_COLUMNS = tuple(METADATA_FIELDS.values())
+
+
+def _clean(value):
+    """NaN (from older, uncleaned files) becomes None so the output stays valid JSON."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _metadata_values(record):
+    return tuple(_clean(record.get(column)) for column in _COLUMNS)
+
+
+def record_metadata(record):
+    """Returns the full enriched `metadata` object for one source record."""
+    return dict(zip(_FIELD_NAMES, _metadata_values(record)))
+
+
+class RecordIndex:
+    """Hash index: stable record id -> metadata values of that record."""
+
+    def __init__(self):
+        # Only the metadata values are kept, as one tuple per record.
+        self._rows = {}
+        self._assign = RecordIdAssigner()
+
+    @classmethod
+    def build(cls, records):
+        """Indexes `records` in order, giving them the same ids as step 2 does."""
+        index = cls()
+        for record in records:
+            index.add(record)
+        return index
+
+    @classmethod
+    def from_file(cls, filename):
+        """Indexes a JSON array or JSON Lines file of source records, streaming it."""
+        # Imported here: the vector store needs NumPy, `record_metadata` doesn't.
+        from vector_store import iter_embeddings_file
+
+        return cls.build(iter_embeddings_file(filename))
+
+    def add(self, record):
+        """Indexes one record; returns its id."""
+        record_id = self._assign(record)
+        self._rows[record_id] = _metadata_values(record)
+        return record_id
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, record_id):
+        return record_id in self._rows
+
+    def metadata(self, record_id):
+        """The enriched metadata for `record_id`, or None if it is not indexed."""
+        values = self._rows.get(record_id)
+        return None if values is None else dict(zip(_FIELD_NAMES, values))
+
+
+def enrich_embeddings(embeddings_file=EMBEDDINGS_FILE, source_file=SOURCE_FILE,
+                      output_file=ENRICHED_FILE):
+    """Enriches an embeddings file from its source records; returns (written, not found)."""
+    from vector_store import iter_embeddings_file
+
+    index = RecordIndex.from_file(source_file)
+    written = missing = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for record in iter_embeddings_file(embeddings_file):
+            # Chunks of a long record carry the record's id in `parent_id`.
+            metadata = index.metadata(record.get("parent_id", record["id"]))
+            if metadata is None:
+                missing += 1
+            else:
+                record["metadata"] = metadata
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            written += 1
+    return written, missing
+
+
+if __name__ == "__main__":
+    print(f"Enriching '{EMBEDDINGS_FILE}' with the source records in '{SOURCE_FILE}'...")
+    try:
+        written, missing = enrich_embeddings()
+        print(f"Success! {written:,} embeddings saved to '{ENRICHED_FILE}'.")
+        if missing:
+            print(f"WARNING: {missing:,} embeddings had no matching source record (ids from an "
+                  f"older run or a different RECORD_LIMIT?) and were left unchanged.")
+    except FileNotFoundError as e:
+        print(f"ERROR: {e.filename} was not found.")
@@ -0,0 +1,105 @@
+# ==============================================================================
+# FAKE EMBEDDING BACKEND (OFFLINE TESTING)
+# ==============================================================================
+# What it does:
+# Stands in for the Gemini embedding API. Every text gets a deterministic
+# 768-number unit vector seeded by its hash, so the same text always gets the
+# same vector on every machine and run. Each call can also simulate what the
+# real API does under load:
+# - `latency` (+ `per_text_latency` per text): seconds every call sleeps;
+# - `error_probability`: share of calls that fail with a transient 503;
+# - `rate_limit_probability`: share of calls that fail with a 429;
+# - `requests_per_minute`: a quota; calls beyond it within any 60 seconds
+#   fail with a 429, like the real per-minute limit.
+#
+# Why it's here:
+# It lets the embedding engine and the whole pipeline be exercised and
+# measured without an API key, network access, or spending any quota. It is
+# the "local" backend of `embedders.py`.
+# ==============================================================================
+
+import hashlib
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from embedding_engine import RateLimitError
+
+EMBEDDING_DIMENSIONS = 768
+
+
+def hash_vector(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Returns a deterministic, L2-normalized pseudo-embedding for `text`."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    norm = np.linalg.norm(vector) or 1.0
+    return (vector / norm).tolist()
+
+
+class FakeEmbeddingBackend:
+    """Callable `backend(texts) -> vectors` with simulated latency, errors and 429s."""
+
+    def __init__(
+        self,
+        dimensions=EMBEDDING_DIMENSIONS,
+        latency=0.05,
+        per_text_latency=0.0,
+        rate_limit_probability=0.0,
+        error_probability=0.0,
+        requests_per_minute=None,
+        max_batch_size=100,
+        seed=0,
+    ):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.rate_limit_probability = rate_limit_probability
+        self.error_probability = error_probability
+        self.requests_per_minute = requests_per_minute
+        self.max_batch_size = max_batch_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent_calls = deque()
+        self.calls = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.texts_embedded = 0
+
+    @property
+    def model(self):
+        """Name under which cached vectors of this backend are stored."""
+        return f"local-hash-{self.dimensions}"
+
+    def _over_quota(self, now):
+        if not self.requests_per_minute:
+            return False
+        while self._recent_calls and self._recent_calls[0] <= now - 60.0:
+            self._recent_calls.popleft()
+        if len(self._recent_calls) >= self.requests_per_minute:
+            return True
+        self._recent_calls.append(now)
+        return False
+
+    def __call__(self, texts):
+        if len(texts) > self.max_batch_size:
+            raise ValueError(f"batch of {len(texts)} exceeds limit of {self.max_batch_size}")
+        with self._lock:
+            self.calls += 1
+            throttled = (self._over_quota(time.monotonic())
+                         or self._rng.random() < self.rate_limit_probability)
+            failed = not throttled and self._rng.random() < self.error_probability
+            if throttled:
+                self.rate_limited += 1
+            if failed:
+                self.errors += 1
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        if throttled:
+            raise RateLimitError("429 Resource has been exhausted (simulated)")
+        if failed:
+            raise ConnectionError("503 The service is currently unavailable (simulated)")
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [hash_vector(text, self.dimensions) for text in texts]
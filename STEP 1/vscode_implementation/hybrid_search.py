@@ -0,0 +1,82 @@
+# ==============================================================================
+# HYBRID SEARCH (BM25 + VECTOR, RECIPROCAL RANK FUSION)
+# ==============================================================================
+# What it does:
+# Runs a keyword search (`BM25Index`) and a vector search (`VectorSearchEngine`
+# or `IVFIndex`) for the same question and merges the two rankings with
+# reciprocal rank fusion (RRF): every record scores `1 / (RRF_K + rank)` in
+# each list it appears in, and the sums are sorted.
+#
+# RRF only looks at ranks, so BM25 scores (unbounded) and cosine scores
+# (0 to 1) never have to be put on the same scale. A record that is near the
+# top of both lists beats one that is first in only one of them.
+#
+# Why it's here:
+# The vector search understands paraphrases but ranks exact names poorly; the
+# keyword search is the other way round. Fusing them keeps the strengths of both.
+#
+# How to use:
+# >>> retriever = HybridRetriever(engine, BM25Index.build(engine.ids, engine.texts))
+# >>> retriever.search("Medina wells in Allegany", query_vector, limit=3)
+# ==============================================================================
+
+# --- DEFAULTS ---
+# The constant from the original RRF paper; larger values flatten the rank weights.
+RRF_K = 60
+# How many hits to take from each ranking before fusing them.
+DEPTH = 50
+# ---------------------
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, weights=None):
+    """Fuses ranked id lists; returns (id, score) pairs, best first."""
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, record_id in enumerate(ranking, start=1):
+            scores[record_id] = scores.get(record_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """Keyword + vector retrieval over the same records, fused with RRF."""
+
+    def __init__(self, engine, keyword_index, k=RRF_K, depth=DEPTH):
+        self.engine = engine
+        self.keyword_index = keyword_index
+        self.k = k
+        self.depth = depth
+        self._rows = None
+        self._rows_size = 0
+
+    def _row(self, record_id):
+        """The engine row of a record, or None if the engine doesn't have it."""
+        if self._rows is None or self._rows_size != len(self.engine):
+            # Rebuilt when the engine has grown (or shrunk) since the last lookup.
+            self._rows = {record_id: row for row, record_id in enumerate(self.engine.ids)}
+            self._rows_size = len(self.engine)
+        return self._rows.get(record_id)
+
+    def _record(self, record_id):
+        """`text` and `metadata` of a record that only the keyword search found."""
+        row = self._row(record_id)
+        return {"id": record_id, "text": self.engine.texts[row], "metadata": self.engine.metadata[row]}
+
+    def search(self, text, query_vector, limit=3, depth=None, weights=None):
+        """Returns the `limit` best records for a question and its embedding.
+
+        `score` is the fused RRF score; `weights` (keyword, vector) can favour one side.
+        """
+        depth = max(depth or self.depth, limit)
+        vector_hits = {hit["id"]: hit for hit in self.engine.search(query_vector, depth)}
+        # A keyword index saved before the engine's records changed may still
+        # hold ids the engine no longer has; those are left out.
+        keyword_ids = [hit["id"] for hit in self.keyword_index.search(text, depth)
+                       if self._row(hit["id"]) is not None]
+        fused = reciprocal_rank_fusion([keyword_ids, list(vector_hits)], self.k, weights)
+        results = []
+        for record_id, score in fused[:limit]:
+            hit = vector_hits.get(record_id) or self._record(record_id)
+            results.append({"id": record_id, "text": hit["text"], "metadata": hit["metadata"],
+                            "score": score})
+        return results
@@ -0,0 +1,376 @@
+# ==============================================================================
+# INCREMENTAL RE-INDEXING: UPDATE ONLY THE ROWS THAT CHANGED
+# ==============================================================================
+# What it does:
+# Brings the outputs of an earlier run up to date with a revised
+# `original.csv`, touching only the rows that were added, changed or deleted
+# since the last run (see `change_detection.py`):
+# 1. scan:   reads the CSV in chunks and diffs every row against
+#            `records_manifest.json`; new and changed records go straight on
+#            to the next stage, everything else is passed over;
+# 2. embed:  `EmbeddingEngine` (batching, rate limit, retries, cache) embeds
+#            them into `embeddings_delta.jsonl`, checkpointed, so an
+#            interrupted run resumes where it stopped;
+# 3. merge:  `embeddings.jsonl` is rewritten without the old embeddings of the
+#            changed and deleted records, and with the new ones;
+# 4. store:  the same for the binary vector store (`embeddings_store`);
+# 5. bm25:   the same for the keyword index (`bm25_index.npz`), if there is one;
+# 6. mongo:  with --mongodb, the same records are deleted and upserted in
+#            MongoDB (`mongo_loader.apply_changes`);
+# 7. the new manifest is saved. Until then, running again redoes the update.
+#
+# Records that could not be embedded keep their old embeddings and their old
+# manifest entry, so the next run tries them again.
+#
+# Why it's here:
+# Re-running every step for a revised CSV embeds every row again. Embedding
+# is by far the slowest (and the only paid) part, so with this a 1% change
+# costs 1% of the API calls; the rest is one sequential pass over the CSV
+# and the output files.
+#
+# How to run:
+# > python change_detection.py            # see what changed, nothing is written
+# > python incremental_update.py          # apply the changes
+# > python incremental_update.py --init   # the outputs are already up to date
+#                                         # (e.g. built by pipeline.py): only
+#                                         # write the manifest
+# ==============================================================================
+
+import argparse
+import json
+import os
+import time
+
+from change_detection import ChangeSet, detect_changes, iter_csv_records, load_manifest, save_manifest
+from chunking import CHUNK_OVERLAP, MAX_CHUNK_TOKENS, parent_id, split_record
+from embedders import create_embedder
+from embedding_engine import EmbeddingEngine, error_reason
+from embedding_output import (CHECKPOINT_SUFFIX, CheckpointedJsonlWriter, embedding_result, iter_jsonl,
+                              replace_records)
+from enrichment import record_metadata
+from metrics import Metrics
+from text_serializer import record_to_text
+from vector_store import META_FILE, convert_embeddings_file, update_store
+
+# --- CONFIGURATION ---
+CSV_FILE = "original.csv"
+MANIFEST_FILE = "records_manifest.json"
+EMBEDDINGS_JSONL_FILE = "embeddings.jsonl"
+# Embeddings of the changed records, merged into the outputs at the end.
+DELTA_EMBEDDINGS_FILE = "embeddings_delta.jsonl"
+# The changed source records, for MongoDB.
+DELTA_RECORDS_FILE = "records_delta.jsonl"
+# Every clean source record is written here, as `pipeline.py` does. None to skip.
+RECORDS_FILE = "output_cleaned.jsonl"
+# The binary vector store to update; None to skip.
+VECTOR_STORE_DIR = "embeddings_store"
+# The BM25 keyword index to update if it exists (see `bm25_index.py`); None to skip.
+BM25_INDEX_FILE = "bm25_index.npz"
+# "gemini", or "local" for offline hash vectors (see `embedders.py`); None
+# reads EMBEDDING_BACKEND from the environment or the .env file.
+EMBEDDING_BACKEND = None
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+# Must match the limit the outputs were built with (see `change_detection.py`).
+RECORD_LIMIT = 10000
+CHUNK_SIZE = 5_000
+# Embedding requests: texts per request, requests in flight, budget, retries.
+BATCH_SIZE = 100
+MAX_IN_FLIGHT = 4
+REQUESTS_PER_MINUTE = 150
+MAX_RETRIES = 5
+# Stage times, API latencies and change counts; None to skip.
+METRICS_FILE = "incremental_metrics.json"
+# ---------------------
+
+
+class _AllExcept:
+    """Contains every id except `ids`."""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __contains__(self, record_id):
+        return record_id not in self.ids
+
+
+class IncrementalUpdate:
+    """Applies the difference between the CSV and the manifest to every output."""
+
+    def __init__(self, embed_fn, csv_file=CSV_FILE, manifest_file=MANIFEST_FILE,
+                 embeddings_file=EMBEDDINGS_JSONL_FILE, delta_file=DELTA_EMBEDDINGS_FILE,
+                 delta_records_file=DELTA_RECORDS_FILE, records_file=RECORDS_FILE,
+                 vector_store_dir=VECTOR_STORE_DIR, bm25_file=BM25_INDEX_FILE, mongo_backend=None,
+                 record_limit=RECORD_LIMIT,
+                 chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT,
+                 requests_per_minute=REQUESTS_PER_MINUTE, max_retries=MAX_RETRIES, cache=None,
+                 chunk_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP, on_progress=print,
+                 metrics=None):
+        self.csv_file = csv_file
+        self.manifest_file = manifest_file
+        self.embeddings_file = embeddings_file
+        self.delta_file = delta_file
+        self.delta_records_file = delta_records_file
+        self.records_file = records_file
+        self.vector_store_dir = vector_store_dir
+        self.bm25_file = bm25_file
+        self.mongo_backend = mongo_backend
+        self.record_limit = record_limit
+        self.chunk_size = chunk_size
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.on_progress = on_progress
+        self.model = getattr(embed_fn, "model", None)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.engine = EmbeddingEngine(
+            embed_fn, batch_size=batch_size, max_in_flight=max_in_flight,
+            requests_per_minute=requests_per_minute, max_retries=max_retries, cache=cache,
+            metrics=self.metrics,
+        )
+        self.changes = None
+        self.failed_ids = set()
+        self.skipped = 0
+        self.embedded = 0
+        self.removed = []
+        self.added = []
+        self.mongo_stats = []
+
+    def _note(self, message):
+        if self.on_progress:
+            self.on_progress(message)
+
+    def previous_fingerprints(self):
+        """The manifest's fingerprints, or None if every row has to be embedded again."""
+        manifest = load_manifest(self.manifest_file)
+        if manifest is None:
+            self._note(f"No '{self.manifest_file}' yet: every row counts as added. If the outputs "
+                       f"are already up to date, run with --init instead.")
+            return None
+        if manifest.get("model") != self.model:
+            self._note(f"The outputs were embedded with '{manifest.get('model')}', not "
+                       f"'{self.model}': every row counts as added.")
+            return None
+        return manifest["records"]
+
+    def init_manifest(self):
+        """Records the CSV as already processed, without changing any output; returns the row count."""
+        changes = detect_changes(self.csv_file, None, self.record_limit, self.chunk_size)
+        save_manifest(changes.fingerprints, self.manifest_file, self.model)
+        return len(changes.fingerprints)
+
+    def _scan(self, changes, done_ids):
+        """Diffs every CSV row; yields the embedding items of the added and updated ones."""
+        records_tmp = self.records_file + ".tmp" if self.records_file else None
+        records_out = open(records_tmp, "w", encoding="utf-8") if records_tmp else None
+        delta_out = open(self.delta_records_file, "w", encoding="utf-8")
+        # Only the time spent here counts as "scan", not the time spent embedding
+        # while this generator waits at `yield`.
+        rows, busy, start = 0, 0.0, time.perf_counter()
+        try:
+            for record_id, record in iter_csv_records(self.csv_file, self.record_limit, self.chunk_size):
+                rows += 1
+                if records_out is not None:
+                    records_out.write(json.dumps(record, ensure_ascii=False, allow_nan=False) + "\n")
+                if changes.check(record_id, record) is None:
+                    continue
+                delta_out.write(json.dumps(dict(record, _id=record_id), ensure_ascii=False,
+                                           allow_nan=False) + "\n")
+                text = record_to_text(record)
+                if not text:
+                    self.skipped += 1
+                    self.metrics.count("records_skipped_total", reason="empty_after_cleaning")
+                    continue
+                metadata = record_metadata(record)
+                for result_id, offset, chunk in split_record(record_id, text, self.chunk_tokens,
+                                                             self.overlap):
+                    if result_id not in done_ids:
+                        busy += time.perf_counter() - start
+                        yield (result_id, record_id, offset, metadata), chunk
+                        start = time.perf_counter()
+        finally:
+            delta_out.close()
+            if records_out is not None:
+                records_out.close()
+        if records_tmp:
+            os.replace(records_tmp, self.records_file)
+        self._scan_seconds = busy + time.perf_counter() - start
+        self.metrics.add_time("scan", self._scan_seconds, rows)
+
+    def _embed(self, changes):
+        """Embeds the added and updated records into the delta file."""
+        writer = CheckpointedJsonlWriter(self.delta_file)
+        self.resumed = len(writer.done_ids)
+        self._scan_seconds = 0.0
+        embedded, start = 0, time.perf_counter()
+        try:
+            for batch in self.engine.embed(self._scan(changes, set(writer.done_ids))):
+                if not batch.ok:
+                    self.failed_ids.update(record_id for (_, record_id, _, _), _ in batch.items)
+                    self.metrics.count("records_failed_total", len(batch.items),
+                                       reason=error_reason(batch.error))
+                    continue
+                writer.write_batch([
+                    embedding_result(result_id, text, vector, metadata, record_id, offset)
+                    for ((result_id, record_id, offset, metadata), text), vector
+                    in zip(batch.items, batch.vectors)
+                ])
+                self.embedded += len(batch.items)
+                embedded += len(batch.items)
+        finally:
+            writer.close()
+            # The engine pulls its items from `_scan` inside this loop; that time
+            # is already reported as the "scan" stage.
+            self.metrics.add_time("embed", time.perf_counter() - start - self._scan_seconds, embedded)
+
+    def _delta_embeddings(self, record_ids):
+        """The new embeddings of `record_ids` from the delta file."""
+        for result in iter_jsonl(self.delta_file):
+            if parent_id(result["id"]) in record_ids:
+                yield result
+
+    def _delta_records(self):
+        if os.path.exists(self.delta_records_file):
+            yield from iter_jsonl(self.delta_records_file)
+
+    def run(self):
+        """Detects the changes and applies them to every output; returns `stats()`."""
+        if not os.path.exists(self.csv_file):
+            raise FileNotFoundError(2, "No such file or directory", self.csv_file)
+        previous = self.previous_fingerprints()
+        changes = self.changes = ChangeSet(previous)
+        self._embed(changes)
+        changes.finish()
+        self._note(f"'{self.csv_file}': {changes.summary()}.")
+
+        # Records that failed to embed keep their old outputs until the next run.
+        # Without a manifest, nothing is known about the outputs, so everything
+        # else in them is replaced, including records no longer in the CSV.
+        if previous is None:
+            replaced = _AllExcept(self.failed_ids)
+        else:
+            replaced = changes.changed_ids - self.failed_ids
+        with self.metrics.stage("merge") as timer:
+            self.removed, self.added = replace_records(self.embeddings_file, self.delta_file, replaced)
+            timer.records = len(self.removed) + len(self.added)
+        if self.vector_store_dir:
+            with self.metrics.stage("vector_store") as timer:
+                if os.path.exists(os.path.join(self.vector_store_dir, META_FILE)):
+                    removed, added = update_store(self.vector_store_dir, replaced,
+                                                  self._delta_embeddings(replaced))
+                    timer.records = removed + added
+                else:
+                    timer.records = convert_embeddings_file(self.embeddings_file, self.vector_store_dir)
+        if self.bm25_file and os.path.exists(self.bm25_file):
+            with self.metrics.stage("bm25") as timer:
+                from bm25_index import BM25Index
+
+                index = BM25Index.load(self.bm25_file)
+                timer.records = index.remove(self.removed)
+                ids, texts = [], []
+                for result in self._delta_embeddings(replaced):
+                    ids.append(result["id"])
+                    texts.append(result.get("text"))
+                timer.records += index.add(ids, texts)
+                index.save(self.bm25_file)
+        if self.mongo_backend is not None:
+            with self.metrics.stage("mongodb"):
+                from mongo_loader import apply_changes
+
+                gone = {parent_id(result_id) for result_id in self.removed} - set(changes.fingerprints)
+                self.mongo_stats = apply_changes(
+                    self.mongo_backend, sorted(gone.union(changes.deleted)),
+                    sorted(set(self.removed) - set(self.added)),
+                    self._delta_records(), self._delta_embeddings(replaced),
+                )
+
+        fingerprints = changes.fingerprints
+        for record_id in self.failed_ids:
+            if record_id in changes.previous:
+                fingerprints[record_id] = changes.previous[record_id]
+            else:
+                del fingerprints[record_id]
+        save_manifest(fingerprints, self.manifest_file, self.model)
+        for path in (self.delta_file, self.delta_file + CHECKPOINT_SUFFIX, self.delta_records_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self._record_metrics()
+        return self.stats()
+
+    def _record_metrics(self):
+        for kind in ("added", "updated", "deleted"):
+            self.metrics.count("records_changed_total", len(getattr(self.changes, kind)), change=kind)
+        self.metrics.count("records_changed_total", self.changes.unchanged, change="unchanged")
+        self.metrics.finish()
+
+    def stats(self):
+        return {
+            "added": len(self.changes.added),
+            "updated": len(self.changes.updated),
+            "deleted": len(self.changes.deleted),
+            "unchanged": self.changes.unchanged,
+            "embedded": self.embedded,
+            "resumed": self.resumed,
+            "embeddings_removed": len(self.removed),
+            "embeddings_added": len(self.added),
+            "api_calls": self.engine.calls,
+            "retries": self.engine.retries,
+            "skipped": self.skipped,
+            "failed": len(self.failed_ids),
+            "metrics": self.metrics.as_dict(),
+        }
+
+
+def main():
+    from embedding_cache import EmbeddingCache
+
+    parser = argparse.ArgumentParser(description="Apply the changes in the CSV to every output.")
+    parser.add_argument("--init", action="store_true",
+                        help="only record the current CSV as processed (the outputs are up to date)")
+    parser.add_argument("--mongodb", action="store_true",
+                        help="also apply the changes to MongoDB (MONGODB_URI in the .env file)")
+    args = parser.parse_args()
+
+    cache = backend = None
+    try:
+        embedder = create_embedder(EMBEDDING_BACKEND, model=EMBEDDING_MODEL)
+        if args.init:
+            count = IncrementalUpdate(embedder).init_manifest()
+            print(f"Success! '{MANIFEST_FILE}' now lists {count:,} records as up to date.")
+        else:
+            if args.mongodb:
+                from mongo_loader import MongoBackend
+                from settings import setting
+
+                uri = setting("MONGODB_URI")
+                if not uri:
+                    raise RuntimeError("MONGODB_URI not found in environment variables")
+                backend = MongoBackend(uri)
+            if EMBEDDING_CACHE_FILE:
+                cache = EmbeddingCache(EMBEDDING_CACHE_FILE, model=embedder.model,
+                                       task_type="retrieval_document")
+            update = IncrementalUpdate(embedder, mongo_backend=backend, cache=cache)
+            stats = update.run()
+            print(f"Done: {stats['embedded']:,} texts embedded with {stats['api_calls']:,} API calls "
+                  f"({stats['retries']:,} retries); {stats['embeddings_removed']:,} old embeddings "
+                  f"replaced or removed.")
+            for load in update.mongo_stats:
+                print(f"MongoDB {load.summary()}")
+            if stats["failed"]:
+                print(f"WARNING: {stats['failed']:,} records could not be embedded and kept their "
+                      f"old embeddings; run again to retry them.")
+            for line in update.metrics.summary():
+                print(f"  {line}")
+            if METRICS_FILE:
+                update.metrics.write(METRICS_FILE)
+                print(f"Metrics saved to '{METRICS_FILE}'.")
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"ERROR: {e}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if backend is not None:
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
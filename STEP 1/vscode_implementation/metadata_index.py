@@ -0,0 +1,95 @@
+# ==============================================================================
+# METADATA POSTING-LIST INDEX (PRE-FILTERING)
+# ==============================================================================
+# What it does:
+# For each filterable metadata field (`year`, `county`, `operator`), keeps a
+# sorted array of row numbers per distinct value (a "posting list"). A filter
+# such as `{"metadata.county": "Allegany", "metadata.year": 2019}` becomes
+# the intersection of two posting lists, so the vector search only has to
+# score the rows that match instead of the whole collection.
+#
+# Filters use the same syntax as the `filter` option of Atlas `$vectorSearch`
+# for the operators supported here: a plain value (equality), `$eq`, `$in`,
+# and `$and` of those. Field names may be written with or without the
+# `metadata.` prefix.
+# ==============================================================================
+
+import numpy as np
+
+# The metadata fields that can be filtered on; they match the filter fields of
+# the Atlas index definition in `vector_index_client.py`.
+FILTER_FIELDS = ("year", "county", "operator")
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def field_name(path):
+    """`metadata.year` -> `year`."""
+    return path[len("metadata."):] if path.startswith("metadata.") else path
+
+
+class MetadataIndex:
+    """Posting lists (value -> sorted row numbers) for a few metadata fields."""
+
+    def __init__(self, metadata, fields=FILTER_FIELDS):
+        self.fields = tuple(fields)
+        self.count = 0
+        self._postings = {field: {} for field in self.fields}
+        self.add(metadata)
+
+    def add(self, metadata):
+        """Indexes more rows; they are numbered after the rows already indexed."""
+        grouped = {field: {} for field in self.fields}
+        row = self.count
+        for entry in metadata:
+            entry = entry or {}
+            for field in self.fields:
+                grouped[field].setdefault(entry.get(field), []).append(row)
+            row += 1
+        for field, values in grouped.items():
+            postings = self._postings[field]
+            for value, rows in values.items():
+                rows = np.array(rows, dtype=np.int64)
+                if value in postings:
+                    rows = np.concatenate([postings[value], rows])
+                postings[value] = rows
+        self.count = row
+
+    def values(self, field):
+        """The distinct values of `field` and how many rows have each."""
+        return {value: len(rows) for value, rows in self._postings[field_name(field)].items()}
+
+    def _condition_rows(self, field, condition):
+        field = field_name(field)
+        if field not in self._postings:
+            raise ValueError(
+                f"'{field}' is not a filter field (available: {', '.join(self.fields)})"
+            )
+        postings = self._postings[field]
+        if isinstance(condition, dict):
+            if set(condition) == {"$eq"}:
+                return postings.get(condition["$eq"], _EMPTY)
+            if set(condition) == {"$in"}:
+                lists = [postings.get(value, _EMPTY) for value in condition["$in"]]
+                return np.unique(np.concatenate(lists)) if lists else _EMPTY
+            raise ValueError(f"unsupported filter operator(s) {sorted(condition)} (use $eq or $in)")
+        return postings.get(condition, _EMPTY)
+
+    def rows(self, filter):
+        """Sorted row numbers that match every condition of `filter`."""
+        conditions = []
+        for key, condition in filter.items():
+            if key == "$and":
+                conditions.extend(item for part in condition for item in part.items())
+            else:
+                conditions.append((key, condition))
+        if not conditions:
+            return np.arange(self.count, dtype=np.int64)
+        # Intersect the shortest lists first so the intermediate results stay small.
+        lists = sorted((self._condition_rows(key, value) for key, value in conditions), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
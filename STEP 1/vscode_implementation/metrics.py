@@ -0,0 +1,310 @@
+# ==============================================================================
+# PIPELINE METRICS AND PROFILING
+# ==============================================================================
+# What it does:
+# Collects what the pipeline spends its time on, in one place:
+# - stage timers: wall seconds and records for each stage (convert, clean,
+#   serialize, embed, write, ...), and from them records/sec;
+# - counters with a reason label, e.g. retries by cause (rate_limited,
+#   ConnectionError, ...) and skipped records by why they were skipped;
+# - histograms, e.g. the latency of every embedding API call (p50/p95/p99);
+# - gauges, e.g. the peak resident memory (RSS) of the process.
+# The result is written as JSON, or as Prometheus text when the file name
+# ends in `.prom` (for the node exporter's textfile collector).
+#
+# `profile("cprofile")` / `profile("tracemalloc")` wraps a hot loop and
+# prints where its time / memory goes. The scripts turn it on with the
+# PROFILE environment variable:
+# > PROFILE=cprofile python 3_generate_embeddings.py
+# ==============================================================================
+
+import bisect
+import contextlib
+import json
+import sys
+import threading
+import time
+
+# --- DEFAULTS ---
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prefix of every metric name in the Prometheus output.
+METRIC_PREFIX = "pipeline"
+# Rows printed by the profilers.
+PROFILE_TOP = 15
+# ----------------
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or None where it is unknown (Windows)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimated `q` quantile: the upper bound of the bucket it falls in (or the maximum)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            "over": self.counts[-1],
+        }
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _StageTimer:
+    def __init__(self, records):
+        self.records = records
+
+
+class Metrics:
+    """Thread-safe counters, gauges, histograms and stage timers for one run."""
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._started = time.perf_counter()
+
+    def count(self, name, amount=1, **labels):
+        """Adds `amount` to a counter, e.g. `count("retries_total", reason="rate_limited")`."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Sets a gauge."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Adds one observation (usually seconds) to a histogram."""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_time(self, stage, seconds, records=0):
+        """Adds wall time (and processed records) to a stage."""
+        self.count("stage_seconds_total", seconds, stage=stage)
+        if records:
+            self.count("stage_records_total", records, stage=stage)
+
+    @contextlib.contextmanager
+    def stage(self, stage, records=0):
+        """Times the `with` block as (part of) `stage`.
+
+        The block may set `.records` on the yielded timer once it knows the count:
+        >>> with metrics.stage("load") as timer:
+        ...     timer.records = len(load())
+        """
+        timer = _StageTimer(records)
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            self.add_time(stage, time.perf_counter() - start, timer.records)
+
+    def counter(self, name, **labels):
+        return self._counters.get(_key(name, labels), 0)
+
+    def by_label(self, name, label):
+        """{label value: total} of a counter, e.g. skipped records by reason."""
+        totals = {}
+        with self._lock:
+            for (counter, labels), value in self._counters.items():
+                labels = dict(labels)
+                if counter == name and label in labels:
+                    totals[labels[label]] = totals.get(labels[label], 0) + value
+        return totals
+
+    def finish(self):
+        """Records the run's wall time and peak RSS; call once at the end."""
+        self.set("run_seconds", time.perf_counter() - self._started)
+        peak = peak_rss()
+        if peak is not None:
+            self.set("peak_rss_bytes", peak)
+
+    def stages(self):
+        """{stage: {"seconds", "records", "records_per_second"}} in the order they ran."""
+        seconds = self.by_label("stage_seconds_total", "stage")
+        records = self.by_label("stage_records_total", "stage")
+        return {
+            stage: {
+                "seconds": elapsed,
+                "records": records.get(stage, 0),
+                "records_per_second": records.get(stage, 0) / elapsed if elapsed else 0.0,
+            }
+            for stage, elapsed in seconds.items()
+        }
+
+    def as_dict(self):
+        def entries(items, value):
+            grouped = {}
+            for (name, labels), item in items:
+                grouped.setdefault(name, []).append({"labels": dict(labels), "value": value(item)})
+            return grouped
+
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            histograms = list(self._histograms.items())
+        return {
+            "stages": self.stages(),
+            "counters": entries(counters, lambda value: value),
+            "gauges": entries(gauges, lambda value: value),
+            "histograms": entries(histograms, lambda histogram: histogram.as_dict()),
+        }
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for kind, items in (("counter", self._counters), ("gauge", self._gauges)):
+                declared = set()
+                for (name, labels), value in sorted(items.items()):
+                    metric = f"{self.prefix}_{name}"
+                    if metric not in declared:
+                        lines.append(f"# TYPE {metric} {kind}")
+                        declared.add(metric)
+                    lines.append(f"{metric}{_label_text(labels)} {value}")
+            declared = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} histogram")
+                    declared.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{_label_text(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes JSON, or Prometheus text if `path` ends in `.prom`."""
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.as_dict(), f, indent=2)
+
+    def summary(self):
+        """Human-readable lines: time and throughput per stage, latencies, waits, peak memory."""
+        lines = []
+        for stage, values in self.stages().items():
+            line = f"{stage}: {values['seconds']:.2f}s"
+            if values["records"]:
+                line += f", {values['records']:,} records ({values['records_per_second']:,.0f}/s)"
+            lines.append(line)
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            waits = sorted((key, value) for key, value in self._counters.items()
+                           if key[0].endswith("_seconds_total") and key[0] != "stage_seconds_total")
+        for (name, labels), histogram in histograms:
+            lines.append(f"{name}{_label_text(labels)}: {histogram.count:,} x, "
+                         f"p50 {histogram.quantile(0.5):.3f}s, p99 {histogram.quantile(0.99):.3f}s, "
+                         f"max {histogram.max:.3f}s")
+        for (name, labels), value in waits:
+            lines.append(f"{name}{_label_text(labels)}: {value:.2f}s")
+        peak = self._gauges.get(_key("peak_rss_bytes", {}))
+        if peak is not None:
+            lines.append(f"peak memory: {peak / 2**20:,.0f} MB")
+        return lines
+
+
+@contextlib.contextmanager
+def profile(kind=None, output=None, top=PROFILE_TOP):
+    """Profiles the `with` block with "cprofile" or "tracemalloc"; None does nothing.
+
+    cProfile statistics are also saved to `output` (for `snakeviz` and the like).
+    """
+    if not kind:
+        yield
+        return
+    if kind == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+    elif kind == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"tracemalloc: {current / 2**20:,.1f} MB still allocated, peak {peak / 2**20:,.1f} MB")
+            for statistic in snapshot.statistics("lineno")[:top]:
+                print(f"  {statistic}")
+    else:
+        raise ValueError(f"unknown profiler {kind!r}; expected 'cprofile' or 'tracemalloc'")
@@ -0,0 +1,290 @@
+# ==============================================================================
+# BULK LOADER: EMBEDDINGS AND SOURCE RECORDS INTO MONGODB
+# ==============================================================================
+# What it does:
+# Streams `embeddings.jsonl` into `vector_db.embeddings` and the source
+# records (`output_cleaned.json` from step 2, or `output_cleaned.jsonl` from
+# `pipeline.py`) into `vector_db.documents`. Documents are
+# sent as unordered bulk upserts (`ReplaceOne` with `upsert=True`) in batches
+# of `BATCH_SIZE`, with up to `WRITERS` batches in flight at the same time.
+#
+# Every document's `_id` is its stable record id (see `record_ids.py`), so the
+# loader can be re-run at any time: existing documents are replaced instead
+# of duplicated, and a run that was interrupted can simply be started again.
+#
+# Why it's here:
+# Importing the files by hand in Compass is slow for large files and cannot be
+# repeated or automated.
+#
+# How to run:
+# 1. Put your connection string in the .env file: MONGODB_URI='mongodb+srv://...'
+# 2. > python mongo_loader.py
+#
+# `apply_changes` loads only what `incremental_update.py` found changed:
+# deleted documents are removed, new and updated ones upserted.
+#
+# For tests and benchmarks, `MemoryBackend` is an in-process stand-in for
+# MongoDB with the same `bulk_upsert` / `bulk_delete` interface.
+# ==============================================================================
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from embedding_engine import iter_batches
+from record_ids import RecordIdAssigner
+from settings import setting
+from vector_store import iter_embeddings_file
+
+# --- CONFIGURATION ---
+# The connection string is read from MONGODB_URI in the .env file when needed.
+DATABASE_NAME = "vector_db"
+EMBEDDINGS_COLLECTION = "embeddings"
+DOCUMENTS_COLLECTION = "documents"
+# The files written by the earlier steps.
+EMBEDDINGS_FILE = "embeddings.jsonl"
+# Step 2 writes the source records as JSON, `pipeline.py` as JSON Lines; the
+# one that exists is loaded (the newer one if both do).
+SOURCE_FILES = ("output_cleaned.json", "output_cleaned.jsonl")
+# Documents per bulk write, and how many bulk writes may run at the same time.
+BATCH_SIZE = 1000
+WRITERS = 4
+# ---------------------
+
+# One MongoClient per connection string, shared by everything in the process.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(uri):
+    """Returns the process-wide `MongoClient` for `uri`, creating it on first use.
+
+    A client is thread-safe and keeps its own connection pool, so reusing it
+    avoids a new TLS handshake and server discovery for every call.
+    """
+    # Imported here so the rest of the pipeline does not need pymongo installed.
+    from pymongo import MongoClient
+
+    with _clients_lock:
+        if uri not in _clients:
+            _clients[uri] = MongoClient(uri, maxPoolSize=max(WRITERS, 10))
+        return _clients[uri]
+
+
+class MongoBackend:
+    """Writes batches to a MongoDB database with unordered bulk upserts."""
+
+    def __init__(self, uri, database=DATABASE_NAME, client=None):
+        from pymongo import ReplaceOne
+
+        self._replace_one = ReplaceOne
+        self.client = client or shared_client(uri)
+        self.database = self.client[database]
+
+    def bulk_upsert(self, collection, documents):
+        """Upserts `documents` by `_id`; returns (inserted, replaced) counts."""
+        operations = [
+            self._replace_one({"_id": document["_id"]}, document, upsert=True)
+            for document in documents
+        ]
+        result = self.database[collection].bulk_write(operations, ordered=False)
+        return result.upserted_count, result.matched_count
+
+    def bulk_delete(self, collection, ids):
+        """Deletes the documents with these `_id`s; returns how many existed."""
+        return self.database[collection].delete_many({"_id": {"$in": list(ids)}}).deleted_count
+
+    def close(self):
+        # The shared client stays open for the rest of the process.
+        pass
+
+
+class MemoryBackend:
+    """In-process stand-in for MongoDB: one dict of documents per collection.
+
+    `latency` (seconds) is added to every bulk write to mimic a network round trip.
+    """
+
+    def __init__(self, latency=0.0):
+        self.collections = {}
+        self.latency = latency
+        self.bulk_writes = 0
+        self._lock = threading.Lock()
+
+    def bulk_upsert(self, collection, documents):
+        if self.latency:
+            time.sleep(self.latency)
+        inserted = replaced = 0
+        with self._lock:
+            self.bulk_writes += 1
+            target = self.collections.setdefault(collection, {})
+            for document in documents:
+                if document["_id"] in target:
+                    replaced += 1
+                else:
+                    inserted += 1
+                target[document["_id"]] = document
+        return inserted, replaced
+
+    def bulk_delete(self, collection, ids):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.bulk_writes += 1
+            target = self.collections.setdefault(collection, {})
+            return sum(target.pop(document_id, None) is not None for document_id in ids)
+
+    def close(self):
+        pass
+
+
+class LoadStats:
+    """Counts for one collection load (or, with `deletes=True`, one bulk delete)."""
+
+    def __init__(self, collection, deletes=False):
+        self.collection = collection
+        self.deletes = deletes
+        self.documents = 0
+        self.inserted = 0
+        self.replaced = 0
+        self.deleted = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def docs_per_second(self):
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        if self.deletes:
+            counts = f"{self.deleted:,} deleted"
+        else:
+            counts = f"{self.inserted:,} new, {self.replaced:,} replaced"
+        return (f"'{self.collection}': {self.documents:,} documents "
+                f"({counts}) in {self.batches:,} batches, "
+                f"{self.seconds:.1f}s, {self.docs_per_second:,.0f} docs/sec")
+
+
+class BulkLoader:
+    """Upserts a stream of documents in batches with a small pool of writers."""
+
+    def __init__(self, backend, batch_size=BATCH_SIZE, writers=WRITERS):
+        if batch_size < 1 or writers < 1:
+            raise ValueError("batch_size and writers must be at least 1")
+        self.backend = backend
+        self.batch_size = batch_size
+        self.writers = writers
+
+    def load(self, collection, documents):
+        """Upserts every document (each must have an `_id`); returns `LoadStats`."""
+        def count(stats, result):
+            inserted, replaced = result
+            stats.inserted += inserted
+            stats.replaced += replaced
+
+        return self._run(LoadStats(collection), documents, self.backend.bulk_upsert, count)
+
+    def delete(self, collection, ids):
+        """Deletes the documents with these `_id`s; returns `LoadStats`."""
+        def count(stats, deleted):
+            stats.deleted += deleted
+
+        return self._run(LoadStats(collection, deletes=True), ids, self.backend.bulk_delete, count)
+
+    def _run(self, stats, items, write, count):
+        """Sends `items` to `write(collection, batch)` in batches; `count` adds each result to `stats`."""
+        start = time.perf_counter()
+
+        def collect(done):
+            for future in done:
+                count(stats, future.result())
+
+        with ThreadPoolExecutor(max_workers=self.writers) as pool:
+            pending = set()
+            for batch in iter_batches(items, self.batch_size):
+                pending.add(pool.submit(write, stats.collection, batch))
+                stats.documents += len(batch)
+                stats.batches += 1
+                # Bounded: at most `writers` batches are held in memory at once.
+                if len(pending) >= self.writers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            done, _ = wait(pending)
+            collect(done)
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+
+def embedding_documents(filename):
+    """Embedding records from the output file, keyed by their record id."""
+    for record in iter_embeddings_file(filename):
+        record["_id"] = record["id"]
+        yield record
+
+
+def source_documents(filename):
+    """Source records, keyed by the same stable ids the embeddings use."""
+    assign = RecordIdAssigner()
+    for record in iter_embeddings_file(filename):
+        record["_id"] = assign(record)
+        yield record
+
+
+def find_source_file(candidates=SOURCE_FILES):
+    """The most recently written of `candidates`, or the first one if none exists."""
+    existing = [name for name in candidates if os.path.exists(name)]
+    if not existing:
+        return candidates[0]
+    return max(existing, key=os.path.getmtime)
+
+
+def load_all(backend, embeddings_file=EMBEDDINGS_FILE, source_file=None,
+             batch_size=BATCH_SIZE, writers=WRITERS):
+    """Loads the source records and the embeddings; returns both `LoadStats`.
+
+    `source_file` defaults to `find_source_file()`.
+    """
+    source_file = source_file or find_source_file()
+    loader = BulkLoader(backend, batch_size, writers)
+    documents = loader.load(DOCUMENTS_COLLECTION, source_documents(source_file))
+    embeddings = loader.load(EMBEDDINGS_COLLECTION, embedding_documents(embeddings_file))
+    return documents, embeddings
+
+
+def apply_changes(backend, deleted_records, removed_embeddings, records, embeddings,
+                  batch_size=BATCH_SIZE, writers=WRITERS):
+    """Deletes records and embeddings by id, then upserts the changed ones; returns the `LoadStats`.
+
+    `records` and `embeddings` are iterables of documents (records need an
+    `_id`; embeddings are keyed by their `id`).
+    """
+    loader = BulkLoader(backend, batch_size, writers)
+    return [
+        loader.delete(DOCUMENTS_COLLECTION, deleted_records),
+        loader.delete(EMBEDDINGS_COLLECTION, removed_embeddings),
+        loader.load(DOCUMENTS_COLLECTION, records),
+        loader.load(EMBEDDINGS_COLLECTION, (dict(record, _id=record["id"]) for record in embeddings)),
+    ]
+
+
+def main():
+    uri = setting("MONGODB_URI")
+    if not uri:
+        print("ERROR: MONGODB_URI not found in environment variables.")
+        print("Please add it to your .env file: MONGODB_URI='mongodb+srv://...'")
+        return
+    backend = MongoBackend(uri)
+    try:
+        source_file = find_source_file()
+        print(f"Loading '{source_file}' and '{EMBEDDINGS_FILE}' into '{DATABASE_NAME}'...")
+        for stats in load_all(backend, source_file=source_file):
+            print(f"Loaded {stats.summary()}")
+    except FileNotFoundError as e:
+        print(f"ERROR: {e.filename} was not found. Run the earlier steps first.")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# ==============================================================================
+# STREAMING PIPELINE: CSV -> EMBEDDINGS IN ONE RUN
+# ==============================================================================
+# What it does:
+# Runs steps 1 to 3 as one streaming graph instead of three scripts that each
+# re-read the previous script's whole output file:
+#
+#   reader ──▶ prepare (process pool) ──▶ embed (API calls) ──▶ writer
+#
+# - reader:  reads the CSV in chunks of `CHUNK_SIZE` rows (same column types
+#            as the streaming converter of step 1);
+# - prepare: in `WORKERS` processes, turns each chunk into clean records
+#            (blanks as null), `record_to_text` strings (column-wise, see
+#            `text_serializer.py`), overlapping chunks for long texts, and
+#            the enriched metadata; then hands out stable record ids in file
+#            order;
+# - embed:   `EmbeddingEngine` with batching, several requests in flight,
+#            rate limiting, retries and the embedding cache, as in step 2;
+# - writer:  appends the results to `embeddings.jsonl` with checkpoints, so
+#            an interrupted run resumes where it stopped.
+#
+# The stages are connected by bounded queues, so CPU work (parsing,
+# serializing) overlaps with the network wait, and memory stays bounded when
+# one stage is slower than the others. Per-stage throughput and queue depths
+# are printed while it runs and returned at the end.
+#
+# How to run (needs GEMINI_API_KEY in the .env file and `original.csv`):
+# > python pipeline.py
+# or offline, with hash vectors instead of Gemini embeddings:
+# > EMBEDDING_BACKEND=local python pipeline.py
+# ==============================================================================
+
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from chunking import CHUNK_OVERLAP, MAX_CHUNK_TOKENS, chunk_text, count_tokens, label_chunks
+from embedders import create_embedder
+from embedding_engine import EmbeddingEngine, error_reason
+from embedding_output import CheckpointedJsonlWriter, embedding_result
+from enrichment import record_metadata
+from metrics import Metrics
+from record_ids import RecordIdAssigner, record_key
+from text_serializer import frame_to_texts
+
+_convert = importlib.import_module("1_convert_csv")
+
+# --- CONFIGURATION ---
+CSV_FILE = "original.csv"
+EMBEDDINGS_JSONL_FILE = "embeddings.jsonl"
+# The clean source records are written here too; `mongo_loader.py` loads them
+# from here (one of its SOURCE_FILES). Set to None to skip them.
+RECORDS_FILE = "output_cleaned.jsonl"
+# Compact binary copy of the embeddings for local search; None to skip.
+VECTOR_STORE_DIR = "embeddings_store"
+# "gemini", or "local" for offline hash vectors (see `embedders.py`); None
+# reads EMBEDDING_BACKEND from the environment or the .env file.
+EMBEDDING_BACKEND = None
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+# Set to None to process every row.
+RECORD_LIMIT = 10000
+# Rows per CSV chunk. Smaller chunks let the stages overlap sooner.
+CHUNK_SIZE = 5_000
+# Processes that clean and serialize chunks.
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# Embedding requests: texts per request, requests in flight, budget, retries.
+BATCH_SIZE = 100
+MAX_IN_FLIGHT = 4
+REQUESTS_PER_MINUTE = 150
+MAX_RETRIES = 5
+# Chunks (or batches) each queue may hold before the stage in front of it waits.
+QUEUE_SIZE = 4
+# Seconds between progress lines.
+PROGRESS_INTERVAL = 10
+# Stage times, API call latencies, retries and skips by reason, queue depths
+# and peak memory (JSON, or Prometheus text for a `.prom` name). None to skip.
+METRICS_FILE = "pipeline_metrics.json"
+# ---------------------
+
+_SAMPLE_INTERVAL = 0.05
+
+
+class _Stopped(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+def prepare_chunk(df, chunk_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP, with_records=True):
+    """Process-pool task: one CSV chunk -> (prepared rows, JSON Lines of the records, CPU seconds).
+
+    Each prepared row is (record key, metadata, [(offset, text)]), with None
+    instead of the chunks when the record is empty after cleaning.
+    """
+    start = time.process_time()
+    records = _convert.chunk_to_records(df)
+    texts = frame_to_texts(df)
+    prepared = [
+        (record_key(record), record_metadata(record),
+         chunk_text(text, chunk_tokens, overlap) if text else None)
+        for record, text in zip(records, texts)
+    ]
+    lines = None
+    if with_records:
+        lines = "".join(json.dumps(record, ensure_ascii=False, allow_nan=False) + "\n"
+                        for record in records)
+    return prepared, lines, time.process_time() - start
+
+
+class StageStats:
+    """Counts, busy time and input-queue depth of one pipeline stage."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.max_queue = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    def observe_queue(self, depth):
+        self.max_queue = max(self.max_queue, depth)
+        self._depth_total += depth
+        self._depth_samples += 1
+
+    @property
+    def mean_queue(self):
+        return self._depth_total / self._depth_samples if self._depth_samples else 0.0
+
+    def as_dict(self, seconds):
+        return {
+            "items": self.items,
+            "unit": self.unit,
+            "per_second": self.items / seconds if seconds else 0.0,
+            "busy_seconds": self.busy_seconds,
+            "mean_queue": self.mean_queue,
+            "max_queue": self.max_queue,
+        }
+
+
+class Pipeline:
+    """Streams a CSV file through prepare -> embed -> write with bounded queues."""
+
+    def __init__(self, embed_fn, csv_file=CSV_FILE, output_file=EMBEDDINGS_JSONL_FILE,
+                 records_file=RECORDS_FILE, record_limit=RECORD_LIMIT, chunk_size=CHUNK_SIZE,
+                 workers=WORKERS, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT,
+                 requests_per_minute=REQUESTS_PER_MINUTE, max_retries=MAX_RETRIES, cache=None,
+                 queue_size=QUEUE_SIZE, chunk_tokens=MAX_CHUNK_TOKENS, overlap=CHUNK_OVERLAP,
+                 progress_interval=PROGRESS_INTERVAL, on_progress=print, metrics=None):
+        self.csv_file = csv_file
+        self.output_file = output_file
+        self.records_file = records_file
+        self.record_limit = record_limit
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.engine = EmbeddingEngine(
+            embed_fn, batch_size=batch_size, max_in_flight=max_in_flight,
+            requests_per_minute=requests_per_minute, max_retries=max_retries, cache=cache,
+            metrics=self.metrics,
+        )
+        self._chunks = queue.Queue(queue_size)
+        self._items = queue.Queue(queue_size)
+        self._batches = queue.Queue(queue_size * max_in_flight)
+        self._stop = threading.Event()
+        self._error = None
+        self.stages = {
+            "read": StageStats("read", "rows"),
+            "prepare": StageStats("prepare", "rows"),
+            "embed": StageStats("embed", "texts"),
+            "write": StageStats("write", "embeddings"),
+        }
+        self.skipped = 0
+        self.failed = 0
+        self.tokens = 0
+        self.seconds = 0.0
+
+    # --- queue helpers: block, but give up as soon as another stage fails ---
+
+    def _put(self, target, item):
+        while True:
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise _Stopped()
+
+    def _get(self, source):
+        while True:
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Stopped()
+
+    def _run_stage(self, stage):
+        try:
+            stage()
+        except _Stopped:
+            pass
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    # --- stages ---
+
+    def _read(self):
+        """CSV chunks -> `_chunks`."""
+        stats = self.stages["read"]
+        dtypes = _convert.csv_dtypes(self.csv_file)
+        remaining = self.record_limit
+        start = time.perf_counter()
+        for chunk in pd.read_csv(self.csv_file, dtype=dtypes, chunksize=self.chunk_size):
+            if remaining is not None:
+                chunk = chunk.iloc[:remaining]
+                remaining -= len(chunk)
+            stats.items += len(chunk)
+            stats.busy_seconds += time.perf_counter() - start
+            self._put(self._chunks, chunk)
+            start = time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                break
+        self._put(self._chunks, None)
+
+    def _prepare(self, done_ids):
+        """`_chunks` -> process pool -> ids and chunk texts, in file order -> `_items`."""
+        stats = self.stages["prepare"]
+        assign = RecordIdAssigner()
+        records_out = open(self.records_file, "w", encoding="utf-8") if self.records_file else None
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+                pending = deque()
+
+                def emit(future):
+                    prepared, lines, cpu_seconds = future.result()
+                    stats.items += len(prepared)
+                    stats.busy_seconds += cpu_seconds
+                    if records_out is not None:
+                        records_out.write(lines)
+                    items = []
+                    for key, metadata, chunks in prepared:
+                        record_id = assign.from_key(key)
+                        if chunks is None:
+                            self.skipped += 1
+                            self.metrics.count("records_skipped_total", reason="empty_after_cleaning")
+                            continue
+                        for result_id, offset, text in label_chunks(record_id, chunks):
+                            if result_id not in done_ids:
+                                items.append(((result_id, record_id, offset, metadata), text))
+                    if items:
+                        self._put(self._items, items)
+
+                while True:
+                    chunk = self._get(self._chunks)
+                    if chunk is None:
+                        break
+                    pending.append(pool.submit(prepare_chunk, chunk, self.chunk_tokens,
+                                               self.overlap, records_out is not None))
+                    # Keep every worker busy, but no more chunks than that in memory.
+                    if len(pending) > self.workers:
+                        emit(pending.popleft())
+                while pending:
+                    emit(pending.popleft())
+        finally:
+            if records_out is not None:
+                records_out.close()
+        self._put(self._items, None)
+
+    def _embed(self):
+        """`_items` -> `EmbeddingEngine` -> `_batches`."""
+        stats = self.stages["embed"]
+
+        def items():
+            while True:
+                block = self._get(self._items)
+                if block is None:
+                    return
+                yield from block
+
+        start = time.perf_counter()
+        for batch in self.engine.embed(items()):
+            stats.items += len(batch.items)
+            if batch.ok and not batch.cached:
+                self.tokens += sum(count_tokens(text) for _, text in batch.items)
+            self._put(self._batches, batch)
+        stats.busy_seconds = time.perf_counter() - start
+        self._put(self._batches, None)
+
+    def _write(self, writer):
+        """`_batches` -> `embeddings.jsonl`."""
+        stats = self.stages["write"]
+        while True:
+            batch = self._get(self._batches)
+            if batch is None:
+                return
+            if not batch.ok:
+                self.failed += len(batch.items)
+                self.metrics.count("records_failed_total", len(batch.items),
+                                   reason=error_reason(batch.error))
+                continue
+            start = time.perf_counter()
+            writer.write_batch([
+                embedding_result(result_id, text, vector, metadata, record_id, offset)
+                for ((result_id, record_id, offset, metadata), text), vector
+                in zip(batch.items, batch.vectors)
+            ])
+            stats.items += len(batch.items)
+            stats.busy_seconds += time.perf_counter() - start
+
+    # --- driver ---
+
+    def progress(self):
+        """One line with the count of every stage and the depth of every queue."""
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        parts = [f"{stats.name} {stats.items:,} {stats.unit} ({stats.items / elapsed:,.0f}/s)"
+                 for stats in self.stages.values()]
+        depths = (f"queues {self._chunks.qsize()}/{self._items.qsize()}/"
+                  f"{self._batches.qsize()}")
+        return " | ".join(parts + [depths])
+
+    def run(self):
+        """Runs every stage to completion; returns `stats()`. Raises the first stage error."""
+        if not os.path.exists(self.csv_file):
+            raise FileNotFoundError(2, "No such file or directory", self.csv_file)
+        writer = CheckpointedJsonlWriter(self.output_file)
+        self.resumed = len(writer.done_ids)
+        self._started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._run_stage, args=(stage,), name=name, daemon=True)
+            for name, stage in (
+                ("read", self._read),
+                ("prepare", lambda: self._prepare(set(writer.done_ids))),
+                ("embed", self._embed),
+                ("write", lambda: self._write(writer)),
+            )
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            last_report = self._started
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(_SAMPLE_INTERVAL)
+                self.stages["prepare"].observe_queue(self._chunks.qsize())
+                self.stages["embed"].observe_queue(self._items.qsize())
+                self.stages["write"].observe_queue(self._batches.qsize())
+                if self.on_progress and time.perf_counter() - last_report >= self.progress_interval:
+                    self.on_progress(self.progress())
+                    last_report = time.perf_counter()
+        except BaseException as e:
+            # Ctrl+C: let the stages wind down, keeping what was written.
+            self._error = self._error or e
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            writer.close()
+            self.seconds = time.perf_counter() - self._started
+            self._record_metrics()
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    def _record_metrics(self):
+        """Copies the stage counters and queue depths into `self.metrics`."""
+        for name, stats in self.stages.items():
+            self.metrics.add_time(name, stats.busy_seconds, stats.items)
+            self.metrics.set("queue_depth_mean", stats.mean_queue, stage=name)
+            self.metrics.set("queue_depth_max", stats.max_queue, stage=name)
+        self.metrics.count("embedding_tokens_total", self.tokens)
+        self.metrics.finish()
+
+    def stats(self):
+        return {
+            "seconds": self.seconds,
+            "stages": {name: stats.as_dict(self.seconds) for name, stats in self.stages.items()},
+            "api_calls": self.engine.calls,
+            "retries": self.engine.retries,
+            "tokens": self.tokens,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "metrics": self.metrics.as_dict(),
+        }
+
+
+def main():
+    from embedding_cache import EmbeddingCache
+    from vector_store import convert_embeddings_file
+
+    cache = None
+    try:
+        embedder = create_embedder(EMBEDDING_BACKEND, model=EMBEDDING_MODEL)
+        if EMBEDDING_CACHE_FILE:
+            cache = EmbeddingCache(EMBEDDING_CACHE_FILE, model=embedder.model,
+                                   task_type="retrieval_document")
+        pipeline = Pipeline(embedder, cache=cache)
+        print(f"Streaming '{CSV_FILE}' into '{EMBEDDINGS_JSONL_FILE}' with {WORKERS} worker(s)...")
+        stats = pipeline.run()
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"ERROR: {e}")
+    else:
+        print(pipeline.progress())
+        print(f"Done in {stats['seconds']:.1f}s: {stats['api_calls']:,} API calls "
+              f"({stats['retries']:,} retries), about {stats['tokens']:,} tokens sent.")
+        if stats["skipped"]:
+            print(f"{stats['skipped']:,} records were empty after cleaning and were skipped.")
+        if stats["failed"]:
+            print(f"WARNING: {stats['failed']:,} texts could not be embedded; run again to retry them.")
+        if VECTOR_STORE_DIR:
+            stored = convert_embeddings_file(EMBEDDINGS_JSONL_FILE, VECTOR_STORE_DIR)
+            print(f"{stored:,} embeddings saved to the vector store '{VECTOR_STORE_DIR}'.")
+        for line in pipeline.metrics.summary():
+            print(f"  {line}")
+        if METRICS_FILE:
+            pipeline.metrics.write(METRICS_FILE)
+            print(f"Metrics saved to '{METRICS_FILE}'.")
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
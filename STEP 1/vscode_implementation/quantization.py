@@ -0,0 +1,283 @@
+# ==============================================================================
+# QUANTIZED VECTOR SEARCH (INT8 SCALAR AND PRODUCT QUANTIZATION)
+# ==============================================================================
+# What it does:
+# Compresses the normalized embedding vectors so more of them fit in memory,
+# and searches the compressed codes directly:
+# - `ScalarQuantizer` stores every dimension as one byte (4x smaller than
+#   float32), using a per-dimension minimum and step size.
+# - `ProductQuantizer` splits each vector into `subspaces` slices and stores
+#   each slice as the one-byte id of its nearest k-means centroid (768 dims
+#   with 96 subspaces is 96 bytes per vector, 32x smaller).
+#
+# Queries are never quantized (asymmetric distance computation): the query
+# is compared with the decoded codes, or, for PQ, with a small table of
+# query-to-centroid scores that is built once per query.
+#
+# Re-ranking: if the full-precision vectors are available (for example the
+# memory-mapped matrix of a `VectorStore`, which stays on disk), the best
+# `rerank` candidates from the quantized search are scored again exactly.
+#
+# How to use:
+# >>> engine = QuantizedSearchEngine.from_store(VectorStore.open("embeddings_store"), method="pq")
+# >>> engine.search(query_vector, limit=3, rerank=100)
+# >>> engine.search(query_vector, limit=3, filter={"metadata.county": "Allegany"})
+# ==============================================================================
+
+import numpy as np
+
+from vector_search import VectorSearchEngine, top_k
+
+# --- DEFAULTS ---
+# 768 dimensions / 96 subspaces = 8 dimensions per subspace.
+DEFAULT_SUBSPACES = 96
+# Centroids per subspace; 256 is the most that fits in one byte.
+PQ_CENTROIDS = 256
+KMEANS_ITERATIONS = 10
+# At most this many vectors are used to train the quantizers. PQ training runs
+# k-means in every subspace, so it uses a smaller sample (64 per centroid).
+TRAINING_SAMPLE = 65_536
+PQ_TRAINING_SAMPLE = 16_384
+# ----------------
+
+# Rows decoded or scored per block, to bound temporary memory.
+_BLOCK = 65_536
+# From this many queries at once, PQ decodes the codes instead of using lookup tables.
+_PQ_DECODE_QUERIES = 16
+_PQ_DECODE_BLOCK = 8_192
+
+
+def _training_sample(vectors, seed, size=TRAINING_SAMPLE):
+    rng = np.random.default_rng(seed)
+    if len(vectors) <= size:
+        return np.asarray(vectors, dtype=np.float32)
+    rows = np.sort(rng.choice(len(vectors), size, replace=False))
+    return np.asarray(vectors[rows], dtype=np.float32)
+
+
+def kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Plain (Euclidean) k-means; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=clusters)
+        sums = np.stack(
+            [np.bincount(assignments, weights=column, minlength=clusters) for column in vectors.T],
+            axis=1,
+        )
+        # Keep the old position for clusters that lost all their members.
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+def nearest_centroids(vectors, centroids):
+    """Index of the closest centroid (Euclidean) for every row."""
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 is the same for every c.
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _BLOCK):
+        block = vectors[start:start + _BLOCK]
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assignments
+
+
+class ScalarQuantizer:
+    """One byte per dimension, with a per-dimension minimum and step size."""
+
+    def __init__(self, low, step):
+        self.low = np.asarray(low, dtype=np.float32)
+        self.step = np.asarray(step, dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors, seed=0):
+        sample = _training_sample(vectors, seed)
+        low = sample.min(axis=0)
+        step = (sample.max(axis=0) - low) / 255
+        step[step == 0] = 1.0
+        return cls(low, step)
+
+    @property
+    def dimensions(self):
+        return len(self.low)
+
+    @property
+    def nbytes(self):
+        return self.low.nbytes + self.step.nbytes
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), len(self.low)), dtype=np.uint8)
+        for start in range(0, len(vectors), _BLOCK):
+            block = np.asarray(vectors[start:start + _BLOCK], dtype=np.float32)
+            scaled = np.rint((block - self.low) / self.step)
+            codes[start:start + len(block)] = np.clip(scaled, 0, 255)
+        return codes
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.step + self.low
+
+    def scores(self, codes, queries):
+        """Inner products of every (float) query with every decoded row; shape (queries, rows)."""
+        # query . (low + step * code) = query . low + (query * step) . code
+        weights = (queries * self.step).T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        # Each block is converted to float32 once and shared by all the queries.
+        for start in range(0, len(codes), _BLOCK):
+            block = codes[start:start + _BLOCK].astype(np.float32)
+            scores[:, start:start + len(block)] = (block @ weights).T
+        scores += (queries @ self.low)[:, None]
+        return scores
+
+
+class ProductQuantizer:
+    """Each vector slice is stored as the id of its nearest k-means centroid."""
+
+    def __init__(self, codebooks):
+        # Shape: (subspaces, centroids per subspace, dimensions per subspace).
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors, subspaces=DEFAULT_SUBSPACES, seed=0):
+        sample = _training_sample(vectors, seed, PQ_TRAINING_SAMPLE)
+        if sample.shape[1] % subspaces:
+            raise ValueError(f"{sample.shape[1]} dimensions cannot be split into {subspaces} subspaces")
+        width = sample.shape[1] // subspaces
+        codebooks = np.zeros((subspaces, PQ_CENTROIDS, width), dtype=np.float32)
+        for m in range(subspaces):
+            part = np.ascontiguousarray(sample[:, m * width:(m + 1) * width])
+            centroids = kmeans(part, PQ_CENTROIDS, seed=seed + m)
+            codebooks[m, :len(centroids)] = centroids
+        return cls(codebooks)
+
+    @property
+    def subspaces(self):
+        return self.codebooks.shape[0]
+
+    @property
+    def dimensions(self):
+        return self.subspaces * self.codebooks.shape[2]
+
+    @property
+    def nbytes(self):
+        return self.codebooks.nbytes
+
+    def encode(self, vectors):
+        """Returns the codes subspace-major, shape (subspaces, rows), for fast lookups."""
+        width = self.codebooks.shape[2]
+        codes = np.empty((self.subspaces, len(vectors)), dtype=np.uint8)
+        for start in range(0, len(vectors), _BLOCK):
+            block = np.asarray(vectors[start:start + _BLOCK], dtype=np.float32)
+            for m in range(self.subspaces):
+                part = block[:, m * width:(m + 1) * width]
+                codes[m, start:start + len(block)] = nearest_centroids(part, self.codebooks[m])
+        return codes
+
+    def decode(self, codes):
+        return np.concatenate(
+            [self.codebooks[m][codes[m]] for m in range(self.subspaces)], axis=1
+        )
+
+    def scores(self, codes, queries):
+        """Inner products of every (float) query with every decoded row; shape (queries, rows)."""
+        if len(queries) >= _PQ_DECODE_QUERIES:
+            # Enough queries to pay for decoding: decode blocks once, then one matrix product.
+            scores = np.empty((len(queries), codes.shape[1]), dtype=np.float32)
+            for start in range(0, codes.shape[1], _PQ_DECODE_BLOCK):
+                block = self.decode(codes[:, start:start + _PQ_DECODE_BLOCK])
+                scores[:, start:start + block.shape[0]] = queries @ block.T
+            return scores
+        # tables[q, m, c] = slice m of query q . centroid c of subspace m
+        tables = np.einsum(
+            "mcw,qmw->qmc", self.codebooks, queries.reshape(len(queries), self.subspaces, -1)
+        )
+        scores = np.zeros((len(queries), codes.shape[1]), dtype=np.float32)
+        for row, table in enumerate(tables):
+            # One contiguous row of codes per subspace keeps every lookup sequential.
+            for m in range(self.subspaces):
+                scores[row] += table[m].take(codes[m])
+        return scores
+
+
+class QuantizedSearchEngine(VectorSearchEngine):
+    """Top-k cosine search over quantized codes, with optional exact re-ranking.
+
+    Takes the same `filter` as `VectorSearchEngine`: only the codes of the
+    matching rows are scored.
+    """
+
+    def __init__(self, quantizer, codes, ids, texts, metadata, full_vectors=None):
+        self.quantizer = quantizer
+        self.codes = codes
+        self.full_vectors = full_vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadata = metadata
+
+    @classmethod
+    def build(cls, vectors, ids, texts, metadata, method="int8", subspaces=DEFAULT_SUBSPACES,
+              keep_full_vectors=True, seed=0):
+        """Trains a quantizer on normalized `vectors` and encodes them all.
+
+        With `keep_full_vectors`, `vectors` is kept (not copied) for re-ranking.
+        """
+        if method == "int8":
+            quantizer = ScalarQuantizer.train(vectors, seed)
+        elif method == "pq":
+            quantizer = ProductQuantizer.train(vectors, subspaces, seed)
+        else:
+            raise ValueError(f"unknown quantization method '{method}' (use 'int8' or 'pq')")
+        codes = quantizer.encode(vectors)
+        return cls(quantizer, codes, ids, texts, metadata, vectors if keep_full_vectors else None)
+
+    @classmethod
+    def from_store(cls, store, method="int8", subspaces=DEFAULT_SUBSPACES, seed=0):
+        """Quantizes a normalized `VectorStore`; its memory-mapped vectors are used for re-ranking."""
+        if not store.normalized:
+            raise ValueError("the vector store is not normalized; rebuild it from unit-length vectors")
+        return cls.build(store.vectors, store.ids, store.texts, store.metadata, method, subspaces,
+                         keep_full_vectors=True, seed=seed)
+
+    @property
+    def dimensions(self):
+        return self.quantizer.dimensions
+
+    @property
+    def nbytes(self):
+        """Memory used by the codes and the quantizer itself."""
+        return self.codes.nbytes + self.quantizer.nbytes
+
+    def _scores(self, queries, rows=None):
+        """Quantized similarities of every query with every row (or only with `rows`)."""
+        if rows is None:
+            return self.quantizer.scores(self.codes, queries)
+        # PQ codes are stored subspace-major, int8 codes row-major.
+        codes = self.codes[:, rows] if isinstance(self.quantizer, ProductQuantizer) else self.codes[rows]
+        return self.quantizer.scores(codes, queries)
+
+    def search(self, query_vector, limit=3, filter=None, rerank=0):
+        """Returns the `limit` best records; `rerank` > 0 re-scores that many candidates exactly."""
+        return self.search_batch([query_vector], limit, filter, rerank)[0]
+
+    def search_batch(self, query_vectors, limit=3, filter=None, rerank=0):
+        """Scores all queries in one pass over the codes; returns one result list per query."""
+        queries = self._prepare_queries(query_vectors)
+        rows = self.metadata_index.rows(filter) if filter else None
+        scores = self._scores(queries, rows)
+        if rows is None:
+            rows = np.arange(scores.shape[1])
+        if not rerank or self.full_vectors is None:
+            best = top_k(scores, limit)
+            return [
+                [self.result(rows[index], scores[row, index]) for index in best[row]]
+                for row in range(len(queries))
+            ]
+        candidates = top_k(scores, max(rerank, limit))
+        results = []
+        for query, picked in zip(queries, candidates):
+            # Sorted rows read the (possibly memory-mapped) vectors front to back.
+            picked = np.sort(rows[picked])
+            exact = np.asarray(self.full_vectors[picked], dtype=np.float32) @ query
+            results.append([self.result(picked[i], exact[i]) for i in top_k(exact, limit)])
+        return results
@@ -0,0 +1,78 @@
+# ==============================================================================
+# STABLE RECORD IDS
+# ==============================================================================
+# What it does:
+# Gives every source record an id derived from what the record *is* (its
+# operator, production year, field, town and location) instead of where it
+# happens to sit in the file. Records that share the same key get a numbered
+# suffix in the order they appear.
+#
+# Why it's here:
+# Positional ids (`"id": i`) change meaning as soon as `RECORD_LIMIT` slicing,
+# skipped records or new CSV rows shift the positions. A stable id lets a run
+# be resumed, and lets later stages match an embedding back to its record.
+#
+# `record_fingerprint` hashes a record's full content instead, so a later run
+# can tell whether the record behind an id has changed (`change_detection.py`).
+# ==============================================================================
+
+import hashlib
+import json
+import math
+
+# The columns that identify a well-production row.
+KEY_COLUMNS = ("Operator", "Production Year", "Field", "Town", "Location")
+# Length of the hex digest used as the id.
+ID_LENGTH = 16
+
+
+def _normalize(value):
+    """Makes equal values hash equally (`1995.0` vs `1995`, NaN vs None)."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def record_key(record):
+    """Returns the base id for a record: a short hash of its key columns.
+
+    Records without any of the key columns fall back to hashing the whole record.
+    """
+    if any(column in record for column in KEY_COLUMNS):
+        key = [_normalize(record.get(column)) for column in KEY_COLUMNS]
+    else:
+        key = sorted((str(k), _normalize(v)) for k, v in record.items())
+    encoded = json.dumps(key, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:ID_LENGTH]
+
+
+def record_fingerprint(record):
+    """Returns a short hash of every column of a record, in any column order."""
+    content = sorted((str(k), _normalize(v)) for k, v in record.items())
+    encoded = json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:ID_LENGTH]
+
+
+class RecordIdAssigner:
+    """Hands out stable, unique ids, numbering records that share a key."""
+
+    def __init__(self):
+        self._seen = {}
+
+    def __call__(self, record):
+        return self.from_key(record_key(record))
+
+    def from_key(self, base):
+        """The id for the next record whose `record_key` is `base`."""
+        count = self._seen.get(base, 0) + 1
+        self._seen[base] = count
+        return base if count == 1 else f"{base}-{count}"
+
+
+def assign_record_ids(records):
+    """Returns the list of stable ids for `records`, in order."""
+    assign = RecordIdAssigner()
+    return [assign(record) for record in records]
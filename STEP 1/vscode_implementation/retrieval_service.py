@@ -0,0 +1,345 @@
+# ==============================================================================
+# RETRIEVAL SERVICE (ASYNCIO HTTP)
+# ==============================================================================
+# What it does:
+# A small HTTP service for the chatbot side. For every question it:
+# 1. normalizes the text (case and whitespace), so "Oil  production?" and
+#    "oil production?" are the same question;
+# 2. returns the cached top-k results if the same question was answered
+#    recently (LRU cache with a time-to-live);
+# 3. otherwise embeds the question (task type `retrieval_query`), reusing a
+#    cached query vector when there is one. Identical questions that arrive
+#    while their embedding is still being computed wait for that one call
+#    instead of starting their own ("coalescing");
+# 4. runs the vector search and returns `text`, `metadata` and `score`.
+#
+# Endpoints:
+#   GET  /search?q=<question>&limit=3
+#   POST /search   {"query": "<question>", "limit": 3}
+#   GET  /stats    cache hit rates, embedding calls, coalesced requests
+#   GET  /health
+#
+# Why it's here:
+# Popular questions repeat constantly, and each embedding call is a network
+# round trip that costs quota. Caching and coalescing turn most of them into
+# dictionary lookups.
+#
+# How to run (needs GEMINI_API_KEY in the .env file, or EMBEDDING_BACKEND=local,
+# and the step 2 output):
+# > python retrieval_service.py
+# > curl "http://127.0.0.1:8080/search?q=oil+production+in+New+York"
+# ==============================================================================
+
+import asyncio
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+# --- CONFIGURATION ---
+HOST = "127.0.0.1"
+PORT = 8080
+# Searched in this order; the binary store opens much faster. With USE_SHARDS,
+# the shards (`sharded_search.py split`) are searched by one worker process
+# each instead; split again after every run that rewrites the store.
+USE_SHARDS = False
+SHARDS_DIR = "embeddings_shards"
+VECTOR_STORE_DIR = "embeddings_store"
+EMBEDDINGS_FILE = "embeddings.jsonl"
+LIMIT = 3
+MAX_LIMIT = 50
+# Query -> vector cache. Embeddings of a question never change, so keep them long.
+VECTOR_CACHE_SIZE = 10_000
+VECTOR_CACHE_TTL = 24 * 3600
+# Query -> results cache. Shorter, so re-loaded data shows up soon.
+RESULT_CACHE_SIZE = 10_000
+RESULT_CACHE_TTL = 300
+# Threads for the blocking embedding and search calls.
+WORKERS = 32
+# ---------------------
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            500: "Internal Server Error"}
+
+
+def normalize_query(text):
+    """Lower-cases and collapses whitespace, so trivially different questions share a cache entry."""
+    return " ".join(str(text).lower().split())
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """The cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RetrievalService:
+    """Question -> top-k records, with vector/result caches and coalesced embedding calls.
+
+    `embed_fn(text)` returns the query vector and `search_fn(vector, limit)` the
+    results; either may be a plain function (run in a thread) or a coroutine function.
+    """
+
+    def __init__(self, embed_fn, search_fn, vector_cache=None, result_cache=None,
+                 workers=WORKERS):
+        self.embed_fn = embed_fn
+        self.search_fn = search_fn
+        if vector_cache is None:
+            vector_cache = TTLCache(VECTOR_CACHE_SIZE, VECTOR_CACHE_TTL)
+        if result_cache is None:
+            result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        self.vector_cache = vector_cache
+        self.result_cache = result_cache
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = {}
+        self.requests = 0
+        self.embed_calls = 0
+        self.coalesced = 0
+
+    async def _call(self, function, *args):
+        if inspect.iscoroutinefunction(function):
+            return await function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def _embed(self, key, text):
+        """The query vector for `key`, from the cache, an in-flight call, or a new call."""
+        vector = self.vector_cache.get(key)
+        if vector is not None:
+            return vector
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        try:
+            self.embed_calls += 1
+            vector = await self._call(self.embed_fn, text)
+        except BaseException as e:
+            pending.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting.
+            pending.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        pending.set_result(vector)
+        self.vector_cache.put(key, vector)
+        return vector
+
+    async def retrieve(self, text, limit=LIMIT):
+        """Returns the `limit` most similar records to a natural-language question."""
+        self.requests += 1
+        key = normalize_query(text)
+        if not key:
+            raise ValueError("the query is empty")
+        results = self.result_cache.get((key, limit))
+        if results is None:
+            vector = await self._embed(key, text)
+            results = await self._call(self.search_fn, vector, limit)
+            self.result_cache.put((key, limit), results)
+        return results
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "embed_calls": self.embed_calls,
+            "coalesced": self.coalesced,
+            "vector_cache": {"size": len(self.vector_cache), "hit_rate": self.vector_cache.hit_rate},
+            "result_cache": {"size": len(self.result_cache), "hit_rate": self.result_cache.hit_rate},
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class RetrievalServer:
+    """Minimal HTTP/1.1 front end (keep-alive, JSON responses) for a `RetrievalService`."""
+
+    def __init__(self, service, host=HOST, port=PORT):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        """Starts listening; with port 0 the chosen port is stored in `self.port`."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _route(self, method, target, body):
+        """Returns (status, JSON payload) for one request."""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/stats":
+            return 200, self.service.stats()
+        if url.path != "/search":
+            return 404, {"error": f"no such endpoint: {url.path}"}
+        if method == "GET":
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        elif method == "POST":
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "the body is not valid JSON"}
+            if not isinstance(params, dict):
+                return 400, {"error": "the body must be a JSON object"}
+        else:
+            return 405, {"error": f"{method} is not allowed"}
+        query = params.get("q", params.get("query"))
+        try:
+            limit = int(params.get("limit", LIMIT))
+        except (TypeError, ValueError):
+            return 400, {"error": "limit must be an integer"}
+        if not query or not 1 <= limit <= MAX_LIMIT:
+            return 400, {"error": f"a query and a limit between 1 and {MAX_LIMIT} are required"}
+        try:
+            results = await self.service.retrieve(query, limit)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 200, {"query": query, "results": results}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    body = await reader.readexactly(int(headers.get("content-length", 0)))
+                except ValueError:
+                    status, payload, keep_alive = 400, {"error": "malformed request"}, False
+                else:
+                    status, payload = await self._route(method, target, body)
+                    keep_alive = (version == "HTTP/1.1"
+                                  and headers.get("connection", "").lower() != "close")
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def load_engine():
+    """The search engine over the step 2 output (shards if enabled, else binary store if present).
+
+    Results are whole records: chunk hits of a long record are merged into
+    one hit under the record id (see `chunking.ParentSearch`).
+    """
+    from chunking import ParentSearch
+
+    if USE_SHARDS:
+        from sharded_search import ShardedSearch, check_current
+
+        check_current(SHARDS_DIR, VECTOR_STORE_DIR)
+        return ParentSearch(ShardedSearch.start(SHARDS_DIR))
+    if os.path.isdir(VECTOR_STORE_DIR):
+        from vector_store import VectorStore
+
+        return ParentSearch(VectorStore.open(VECTOR_STORE_DIR).search_engine())
+    from vector_search import VectorSearchEngine
+
+    return ParentSearch(VectorSearchEngine.from_file(EMBEDDINGS_FILE))
+
+
+def main():
+    # The query embedder uses the same EMBEDDING_BACKEND as the records.
+    from embedders import create_query_embedder
+
+    try:
+        embed = create_query_embedder()
+        engine = load_engine()
+    except FileNotFoundError as e:
+        if USE_SHARDS or os.path.isdir(VECTOR_STORE_DIR):
+            # e.g. a store whose conversion was interrupted before meta.json was written.
+            print(f"ERROR: {e}. Run 3_generate_embeddings.py again.")
+        else:
+            print(f"ERROR: neither '{VECTOR_STORE_DIR}' nor '{EMBEDDINGS_FILE}' was found. "
+                  f"Run 3_generate_embeddings.py first.")
+        return
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return
+    service = RetrievalService(embed, engine.search)
+    server = RetrievalServer(service)
+    print(f"Serving {len(engine):,} records on http://{HOST}:{PORT}/search?q=...")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if hasattr(engine, "close"):
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
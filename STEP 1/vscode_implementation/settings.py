@@ -0,0 +1,38 @@
+# ==============================================================================
+# SETTINGS FROM THE ENVIRONMENT AND THE .env FILE
+# ==============================================================================
+# What it does:
+# `setting("GEMINI_API_KEY")` returns an environment variable. The .env file
+# is read the first time any setting is asked for, not when a module is
+# imported; variables that are already set in the environment win.
+#
+# Why it's here:
+# With `load_dotenv()` at the top of the scripts, importing any of them (say,
+# a worker that only needs `record_to_text`) read the .env file and changed
+# the process environment. Now only the code that needs a setting does that.
+# ==============================================================================
+
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """Reads the .env file into the environment, once per process."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
+
+
+def setting(name, default=None):
+    """The value of environment variable `name` (after reading .env), or `default`."""
+    load_env()
+    return os.getenv(name, default)
@@ -0,0 +1,469 @@
+# ==============================================================================
+# SHARDED VECTOR SEARCH (SCATTER-GATHER)
+# ==============================================================================
+# What it does:
+# 1. `split_store` partitions the vector store (`embeddings_store`) into N
+#    smaller stores, `embeddings_shards/shard_000`, `shard_001`, ... A record
+#    goes to the shard picked by a stable hash of its record id (chunks stay
+#    with their record), or of a metadata field such as `county` or `year`,
+#    so that every record with the same value lands in the same shard.
+# 2. Every shard is served by its own process, which memory-maps its store
+#    and answers top-k queries with `VectorSearchEngine`:
+#    - `ShardedSearch.start` starts one worker process per shard on this
+#      machine, connected through pipes;
+#    - `python sharded_search.py serve --shard 2 --port 8102` runs a shard as
+#      a node on a TCP port instead, and `ShardedSearch.connect` talks to a
+#      list of such nodes.
+# 3. The coordinator (`ShardedSearch`) sends each query to every shard at
+#    once, gathers each shard's top-k and merges them into the global top-k.
+#    Results have the same `id`, `text`, `metadata` and `score` as
+#    `VectorSearchEngine` and the STEP 3 `$project` stage. When the shards
+#    are split by a metadata field and the filter pins that field, only the
+#    shards that can hold matches are asked.
+#
+# Why it's here:
+# One process scores a query with one core, and holds every vector in one
+# machine's memory. With shards, each core (or machine) scores a slice.
+#
+# How to run:
+# > python sharded_search.py split --shards 4 --by county
+# (again whenever `embeddings_store` is rewritten: shards split from an older
+# store are refused)
+# > python sharded_search.py search "oil production in Allegany"
+# Or with nodes on local ports (one terminal each):
+# > python sharded_search.py serve --shard 0 --port 8100
+# > python sharded_search.py serve --shard 1 --port 8101
+# > python sharded_search.py search "oil production" --nodes 127.0.0.1:8100,127.0.0.1:8101
+#
+# Nodes exchange pickled messages, so whoever can connect to a node can run
+# code on it. They only start with a secret SHARD_AUTHKEY in .env, shared by
+# the nodes and the coordinator; only expose them on a network you trust.
+# ==============================================================================
+
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from embedding_output import line_record_id
+from metadata_index import field_name
+from record_ids import _normalize
+from settings import setting
+
+# --- CONFIGURATION ---
+STORE_DIR = "embeddings_store"
+SHARDS_DIR = "embeddings_shards"
+# How many shards `split` makes, and what decides a record's shard: "id", or a
+# metadata field ("county", "year", "operator", ...).
+SHARD_COUNT = os.cpu_count() or 1
+SHARD_BY = "id"
+# Nodes listen on this interface; keep it local unless the network is trusted.
+NODE_HOST = "127.0.0.1"
+BASE_PORT = 8100
+# Seconds to wait for a shard's answer.
+TIMEOUT = 30
+# Queries that arrive together are scored with one matrix product, up to this many.
+MAX_BATCH = 64
+# ---------------------
+
+MANIFEST_FILE = "shards.json"
+# The math libraries behind NumPy start a thread per core by default; with one
+# worker process per core, that would oversubscribe every core.
+_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def shard_for(value, shard_count):
+    """The shard of a record id or metadata value (stable across runs and machines).
+
+    Equal values share a shard however they were typed: 2019 and 2019.0 (a year
+    column with blanks), NaN and None.
+    """
+    value = _normalize(value)
+    return zlib.crc32(json.dumps(value, sort_keys=True).encode("utf-8")) % shard_count
+
+
+def node_authkey(authkey=None):
+    """The secret nodes and coordinators share: `authkey`, or SHARD_AUTHKEY from .env."""
+    authkey = authkey or setting("SHARD_AUTHKEY")
+    if not authkey:
+        raise RuntimeError(
+            "SHARD_AUTHKEY is not set. Put a long random secret in .env on the nodes and the "
+            "coordinator, e.g. the output of: python -c \"import secrets; print(secrets.token_hex(32))\""
+        )
+    return authkey.encode("utf-8") if isinstance(authkey, str) else authkey
+
+
+def shard_dir(directory, shard):
+    return os.path.join(directory, f"shard_{shard:03d}")
+
+
+def load_manifest(directory=SHARDS_DIR):
+    """`{"shards": N, "by": ..., "counts": [...], "source": ...}` of a split store."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"'{directory}' is not a sharded store (no {MANIFEST_FILE})")
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def store_version(store_dir=STORE_DIR):
+    """A vector store's `meta.json` and when it was written; changes on every rewrite."""
+    from vector_store import META_FILE
+
+    path = os.path.join(store_dir, META_FILE)
+    with open(path, "r") as f:
+        return {"meta": json.load(f), "written": os.stat(path).st_mtime_ns}
+
+
+def check_current(directory=SHARDS_DIR, store_dir=STORE_DIR):
+    """Raises RuntimeError if `store_dir` was rewritten after `directory` was split from it."""
+    if not os.path.isdir(store_dir):
+        return
+    if load_manifest(directory).get("source") != store_version(store_dir):
+        raise RuntimeError(f"'{directory}' was split from an older '{store_dir}'. "
+                           f"Run `python sharded_search.py split` again.")
+
+
+def split_store(store_dir=STORE_DIR, directory=SHARDS_DIR, shard_count=SHARD_COUNT, by=SHARD_BY,
+                batch_size=10_000):
+    """Splits a vector store into `shard_count` stores; returns the rows per shard.
+
+    Rows are copied as they are, vectors and record lines alike.
+    """
+    from vector_store import VectorStore, VectorStoreWriter
+
+    store = VectorStore.open(store_dir)
+    field = None if by == "id" else field_name(by)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    writers = [VectorStoreWriter(shard_dir(directory, shard), store.vectors.dtype.name)
+               for shard in range(shard_count)]
+    pending = [([], []) for _ in range(shard_count)]
+
+    def flush(shard):
+        rows, lines = pending[shard]
+        writers[shard].write_rows(store.vectors[rows], lines)
+        pending[shard] = ([], [])
+
+    with open(store._records_path, "rb") as f:
+        for row, line in zip(range(len(store)), f):
+            if field is None:
+                key = line_record_id(line.decode("utf-8"))
+            else:
+                key = (json.loads(line).get("metadata") or {}).get(field)
+            shard = shard_for(key, shard_count)
+            pending[shard][0].append(row)
+            pending[shard][1].append(line)
+            if len(pending[shard][0]) >= batch_size:
+                flush(shard)
+    for shard, writer in enumerate(writers):
+        flush(shard)
+        writer.close()
+    counts = [writer.count for writer in writers]
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump({"shards": shard_count, "by": by, "counts": counts,
+                   "source": store_version(store_dir)}, f, indent=2)
+    return counts
+
+
+def _answer(engine, messages):
+    """Replies to requests with the same limit and filter, scored in one `search_batch`."""
+    import numpy as np
+
+    _, _, limit, filter = messages[0]
+    try:
+        results = engine.search_batch(np.concatenate([queries for _, queries, _, _ in messages]),
+                                      limit, filter)
+    except Exception as e:
+        return [(request_id, False, f"{type(e).__name__}: {e}") for request_id, _, _, _ in messages]
+    replies, start = [], 0
+    for request_id, queries, _, _ in messages:
+        replies.append((request_id, True, results[start:start + len(queries)]))
+        start += len(queries)
+    return replies
+
+
+def _serve(connection, engine, max_batch=MAX_BATCH):
+    """Answers `(request id, query vectors, limit, filter)` messages until None arrives.
+
+    Requests that are already waiting are answered together: a matrix product
+    over many queries costs far less per query than one product each.
+    """
+    while True:
+        try:
+            messages = [connection.recv()]
+            while messages[-1] is not None and len(messages) < max_batch and connection.poll():
+                messages.append(connection.recv())
+        except EOFError:
+            return
+        stop = messages[-1] is None
+        groups = {}
+        for message in messages[:-1] if stop else messages:
+            key = (message[2], json.dumps(message[3], sort_keys=True, default=str))
+            groups.setdefault(key, []).append(message)
+        for group in groups.values():
+            for reply in _answer(engine, group):
+                connection.send(reply)
+        if stop:
+            return
+
+
+def _open_engine(directory):
+    from vector_store import VectorStore
+
+    return VectorStore.open(directory).search_engine()
+
+
+def run_worker(connection, directory):
+    """Entry point of a shard worker process started by `ShardedSearch.start`."""
+    try:
+        engine = _open_engine(directory)
+    except Exception as e:
+        connection.send((None, False, f"{type(e).__name__}: {e}"))
+        return
+    connection.send((None, True, len(engine)))
+    _serve(connection, engine)
+
+
+def serve_node(directory, port, host=NODE_HOST, authkey=None):
+    """Serves one shard on `host:port`, each coordinator connection in its own thread."""
+    authkey = node_authkey(authkey)
+    engine = _open_engine(directory)
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"Serving {len(engine):,} records of '{directory}' on {host}:{port}")
+        while True:
+            try:
+                connection = listener.accept()
+                # Tell the coordinator how many rows this shard has, then answer queries.
+                connection.send((None, True, len(engine)))
+            except (AuthenticationError, OSError) as e:
+                print(f"Refused a connection: {e}")
+                continue
+            threading.Thread(target=_serve, args=(connection, engine), daemon=True).start()
+
+
+class ShardClient:
+    """One shard connection; many queries may be in flight on it at once.
+
+    Requests are numbered, and a reader thread hands every reply to the
+    `Future` of its request.
+    """
+
+    def __init__(self, connection, process=None):
+        self.connection = connection
+        self.process = process
+        request_id, ok, value = connection.recv()
+        if not ok:
+            raise RuntimeError(f"shard failed to start: {value}")
+        self.count = value
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def submit(self, queries, limit, filter=None):
+        """Sends a batch of queries; returns a `Future` of one result list per query."""
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self.connection.send((request_id, queries, limit, filter))
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, value = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(f"shard search failed: {value}"))
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("shard connection closed"))
+
+    def close(self):
+        try:
+            with self._lock:
+                self.connection.send(None)
+        except OSError:
+            pass
+        self.connection.close()
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+class ShardedSearch:
+    """Scatter-gather top-k search over shard workers, with `VectorSearchEngine`'s interface."""
+
+    def __init__(self, shards, by="id", timeout=TIMEOUT):
+        self.shards = shards
+        self.by = by
+        self.timeout = timeout
+
+    @classmethod
+    def start(cls, directory=SHARDS_DIR, **options):
+        """Starts one worker process per shard of a split store."""
+        manifest = load_manifest(directory)
+        context = multiprocessing.get_context("spawn")
+        saved = {name: os.environ.get(name) for name in _THREAD_VARIABLES}
+        os.environ.update({name: "1" for name in _THREAD_VARIABLES})
+        try:
+            started = []
+            for shard in range(manifest["shards"]):
+                parent, child = context.Pipe()
+                process = context.Process(target=run_worker, args=(child, shard_dir(directory, shard)),
+                                          daemon=True)
+                process.start()
+                child.close()
+                started.append((parent, process))
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        shards = []
+        try:
+            for parent, process in started:
+                shards.append(ShardClient(parent, process))
+        except Exception:
+            for shard in shards:
+                shard.close()
+            for _, process in started:
+                process.terminate()
+            raise
+        return cls(shards, manifest["by"], **options)
+
+    @classmethod
+    def connect(cls, addresses, by="id", authkey=None, **options):
+        """Connects to shard nodes at `[(host, port), ...]`, in shard order."""
+        authkey = node_authkey(authkey)
+        shards = [ShardClient(Client(tuple(address), authkey=authkey)) for address in addresses]
+        return cls(shards, by, **options)
+
+    def __len__(self):
+        return sum(shard.count for shard in self.shards)
+
+    def _targets(self, filter):
+        """The non-empty shards that can hold matches for `filter`."""
+        return [shard for shard in self._pick(filter) if shard.count]
+
+    def _pick(self, filter):
+        """All shards, unless `filter` pins the field the shards were split by."""
+        if self.by == "id" or not filter:
+            return self.shards
+        conditions = filter.get("$and", [filter]) if set(filter) == {"$and"} else [filter]
+        for condition in conditions:
+            for path, value in condition.items():
+                if field_name(path) != field_name(self.by):
+                    continue
+                if isinstance(value, dict):
+                    if set(value) == {"$eq"}:
+                        value = value["$eq"]
+                    elif set(value) == {"$in"}:
+                        wanted = {shard_for(item, len(self.shards)) for item in value["$in"]}
+                        return [self.shards[shard] for shard in sorted(wanted)]
+                    else:
+                        continue
+                return [self.shards[shard_for(value, len(self.shards))]]
+        return self.shards
+
+    def search_batch(self, query_vectors, limit=3, filter=None):
+        """Answers many queries; returns one merged result list per query."""
+        import numpy as np
+
+        # A float32 array pickles as one block of bytes rather than 768 floats.
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        futures = [shard.submit(queries, limit, filter) for shard in self._targets(filter)]
+        per_shard = [future.result(self.timeout) for future in futures]
+        if not per_shard:
+            return [[] for _ in range(len(queries))]
+        return [
+            heapq.nlargest(limit, itertools.chain.from_iterable(lists), key=lambda hit: hit["score"])
+            for lists in zip(*per_shard)
+        ]
+
+    def search(self, query_vector, limit=3, filter=None):
+        """The `limit` most similar records to one query vector, across all shards."""
+        return self.search_batch([query_vector], limit, filter)[0]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_nodes(text):
+    """`host:port,host:port` -> [(host, port), ...]."""
+    addresses = []
+    for item in text.split(","):
+        host, _, port = item.strip().rpartition(":")
+        addresses.append((host or NODE_HOST, int(port)))
+    return addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded vector search over the embeddings store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help=f"split '{STORE_DIR}' into '{SHARDS_DIR}'")
+    split.add_argument("--shards", type=int, default=SHARD_COUNT)
+    split.add_argument("--by", default=SHARD_BY, help='"id" or a metadata field, e.g. "county"')
+    serve = commands.add_parser("serve", help="serve one shard on a TCP port")
+    serve.add_argument("--shard", type=int, required=True)
+    serve.add_argument("--port", type=int, help=f"default: {BASE_PORT} + shard")
+    search = commands.add_parser("search", help="answer one question across the shards")
+    search.add_argument("question", nargs="+")
+    search.add_argument("--limit", type=int, default=3)
+    search.add_argument("--nodes", help="host:port of every shard node, in shard order")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "split":
+            counts = split_store(shard_count=args.shards, by=args.by)
+            print(f"Success! Split '{STORE_DIR}' by {args.by} into {len(counts)} shards "
+                  f"in '{SHARDS_DIR}': {', '.join(f'{count:,}' for count in counts)} records.")
+        elif args.command == "serve":
+            port = args.port if args.port is not None else BASE_PORT + args.shard
+            serve_node(shard_dir(SHARDS_DIR, args.shard), port)
+        else:
+            from embedders import create_query_embedder
+
+            embed = create_query_embedder()
+            if args.nodes:
+                engine = ShardedSearch.connect(parse_nodes(args.nodes), load_manifest()["by"])
+            else:
+                check_current()
+                engine = ShardedSearch.start()
+            with engine:
+                for result in engine.search(embed(" ".join(args.question)), args.limit):
+                    print(f"[{result['score']:.4f}] {result['text'][:200]}")
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# ==============================================================================
+# RECORD TO TEXT SERIALIZATION
+# ==============================================================================
+# What it does:
+# Turns well-production records into the "key: value | key: value" strings
+# that are sent to the embedding model.
+# - `record_to_text` handles one record (a dictionary) at a time.
+# - `frame_to_texts` handles a whole pandas DataFrame chunk at once, working
+#   column by column: each column is factorized, the "key: value" text is built
+#   once per distinct value, and NumPy gathers it back out to every row. Its
+#   output is byte-for-byte identical to calling `record_to_text` on each row.
+#
+# Why it's here:
+# For wide rows, the per-field Python work in `record_to_text` is a noticeable
+# share of CPU time before the API is even called.
+#
+# `record_to_text` is plain Python, so workers that only serialize records
+# don't pay for importing NumPy and pandas (about 0.4 s).
+#
+# How to check that both still agree (exits with an error if they don't):
+# > python text_serializer.py
+# ==============================================================================
+
+FIELD_SEPARATOR = " | "
+
+
+def is_null(value):
+    """True for None and the missing-value markers NaN, NaT and pandas.NA."""
+    if value is None or type(value).__name__ == "NAType":
+        return True
+    try:
+        # NaN and NaT are the only values that differ from themselves.
+        return bool(value != value)
+    except (TypeError, ValueError):
+        return False
+
+
+def record_to_text(record):
+    """Converts a single JSON record (dictionary) into a clean text string."""
+    parts = []
+    for key, value in record.items():
+        if is_null(value) or str(value).strip() == "":
+            continue
+        clean_key = str(key).replace("_", " ")
+        clean_value = str(value).replace("\n", " ")
+        parts.append(f"{clean_key}: {clean_value}")
+    return FIELD_SEPARATOR.join(parts)
+
+
+def _piece(lead, value):
+    """The " | key: value" piece for one value, or "" if `record_to_text` skips it."""
+    text = str(value)
+    if text.strip() == "":
+        return ""
+    return lead + text.replace("\n", " ")
+
+
+def _column_pieces(series, lead):
+    """Returns the list of pieces for one column, one per row."""
+    import numpy as np
+    import pandas as pd
+
+    dtype = series.dtype
+    if dtype == np.float64:
+        # Factorize the raw bits so values that compare equal but print
+        # differently (0.0 and -0.0) keep their own text.
+        values = np.ascontiguousarray(series.to_numpy())
+        codes, uniques = pd.factorize(values.view(np.int64))
+        codes[np.isnan(values)] = -1
+        uniques = uniques.view(np.float64)
+    elif (pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+          or pd.api.types.is_string_dtype(dtype)) and dtype != object:
+        codes, uniques = pd.factorize(series)
+    else:
+        # Object and other columns may mix types that compare equal but print
+        # differently (1, 1.0 and True), so every value is handled on its own.
+        return [
+            "" if is_null(value) else _piece(lead, value)
+            for value in series.tolist()
+        ]
+    # Build each distinct piece once; code -1 (missing) picks the trailing "".
+    table = [_piece(lead, value) for value in uniques.tolist()]
+    table.append("")
+    return np.array(table, dtype=object)[codes].tolist()
+
+
+def frame_to_texts(df):
+    """Converts every row of a DataFrame into its `record_to_text` string.
+
+    Returns a list with one string per row, in row order.
+    """
+    if len(df) == 0:
+        return []
+    columns = []
+    for position, column in enumerate(df.columns):
+        lead = FIELD_SEPARATOR + str(column).replace("_", " ") + ": "
+        columns.append(_column_pieces(df.iloc[:, position], lead))
+    if not columns:
+        return [""] * len(df)
+    # Every non-empty row starts with one separator too many.
+    cut = len(FIELD_SEPARATOR)
+    return ["".join(row)[cut:] for row in zip(*columns)]
+
+
+def check_parity(df):
+    """Raises ValueError if `frame_to_texts` and `record_to_text` disagree on any row of `df`."""
+    actual = frame_to_texts(df)
+    expected = [record_to_text(record) for record in df.astype(object).to_dict(orient="records")]
+    for row, (got, want) in enumerate(zip(actual, expected)):
+        if got != want:
+            raise ValueError(f"frame_to_texts differs from record_to_text at row {row}:\n"
+                             f"  {got!r}\n  {want!r}")
+    if len(actual) != len(expected):
+        raise ValueError(f"frame_to_texts returned {len(actual)} rows for {len(expected)}")
+    return len(actual)
+
+
+def edge_case_frame():
+    """A small DataFrame with the values and dtypes the column-wise path treats specially."""
+    import numpy as np
+    import pandas as pd
+
+    return pd.DataFrame({
+        "Oil_Produced": [0.0, -0.0, np.nan, 1e20, 1.5, 0.1],
+        "Year": pd.array([2019, None, 2019, 0, -1, 2020], dtype="Int64"),
+        "Flag": pd.array([True, False, None, True, False, None], dtype="boolean"),
+        "County": pd.array(["Allegany", "", "  ", None, "two\nlines", "Allegany"], dtype="string"),
+        "Well Type": pd.Categorical(["GW", "OW", None, "GW", "GW", ""]),
+        "Reported": pd.to_datetime(["2019-01-01 00:00:00", None, "2019-01-01 00:00:00", "2020-06-30 12:00:00", None, None]),
+        "Mixed": [1, 1.0, True, None, "1", np.nan],
+    })
+
+
+if __name__ == "__main__":
+    rows = check_parity(edge_case_frame())
+    print(f"frame_to_texts matches record_to_text on all {rows} edge-case rows.")
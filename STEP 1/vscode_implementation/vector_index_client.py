@@ -0,0 +1,260 @@
+# ==============================================================================
+# VECTOR INDEX CLIENT (CREATE, WAIT, QUERY)
+# ==============================================================================
+# What it does:
+# Automates the manual steps of the STEP 3 guide for `vector_index_poc_rag`:
+# 1. creates the vector search index (path `vector`, 768 dimensions, cosine,
+#    plus filter fields for `metadata.year`, `metadata.county` and
+#    `metadata.operator`), or updates it if its definition has changed;
+# 2. polls Atlas until the index has finished building;
+# 3. embeds a natural-language question with the same model as the records
+#    (task type `retrieval_query`, see `embedders.create_query_embedder`);
+# 4. runs the `$vectorSearch` + `$project` pipeline and returns the results,
+#    optionally pre-filtered on those metadata fields, e.g.
+#    `client.query("gas wells", filter={"metadata.county": "Allegany"})`.
+#    Chunks of a long record are merged, so every result is a whole record
+#    with its record id (see `chunking.ParentSearch`).
+#
+# The database work goes through a backend:
+# - `AtlasVectorBackend` talks to MongoDB Atlas through one shared, pooled
+#   `MongoClient` (see `shared_client` in `mongo_loader.py`), so repeated
+#   queries reuse open connections.
+# - `LocalVectorBackend` has the same interface but searches an in-process
+#   `VectorSearchEngine` (or `IVFIndex`), for offline use and profiling.
+#
+# How to run (needs GEMINI_API_KEY and MONGODB_URI in the .env file):
+# > python vector_index_client.py "oil production in New York"
+# ==============================================================================
+
+import sys
+import time
+from collections import deque
+
+from ann_index import IVFIndex
+from chunking import ParentSearch
+from embedders import create_query_embedder
+from metadata_index import FILTER_FIELDS, field_name
+from mongo_loader import DATABASE_NAME, EMBEDDINGS_COLLECTION, shared_client
+from settings import setting
+
+# --- CONFIGURATION ---
+INDEX_NAME = "vector_index_poc_rag"
+VECTOR_PATH = "vector"
+NUM_DIMENSIONS = 768
+SIMILARITY = "cosine"
+# Must be the model the embeddings were generated with.
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Metadata fields that `$vectorSearch` can pre-filter on.
+FILTER_PATHS = tuple(f"metadata.{field}" for field in FILTER_FIELDS)
+# Defaults for the `$vectorSearch` stage, as in the STEP 3 test.
+NUM_CANDIDATES = 100
+LIMIT = 3
+# How often (seconds) and how long to poll while the index is building.
+POLL_INTERVAL = 5
+READY_TIMEOUT = 600
+# Latest queries whose timings are kept for profiling.
+TIMINGS_KEPT = 10_000
+# ---------------------
+
+
+def index_definition(dimensions=NUM_DIMENSIONS, similarity=SIMILARITY, path=VECTOR_PATH,
+                     filter_paths=FILTER_PATHS):
+    """The vector search index definition from the STEP 3 JSON editor."""
+    return {
+        "fields": [
+            {"type": "vector", "path": path, "numDimensions": dimensions, "similarity": similarity}
+        ] + [{"type": "filter", "path": filter_path} for filter_path in filter_paths]
+    }
+
+
+def vector_search_pipeline(query_vector, limit=LIMIT, num_candidates=NUM_CANDIDATES,
+                           index=INDEX_NAME, path=VECTOR_PATH, filter=None):
+    """The `$vectorSearch` + `$project` test pipeline from the STEP 3 guide."""
+    stage = {
+        "index": index,
+        "path": path,
+        "queryVector": list(query_vector),
+        "numCandidates": max(num_candidates, limit),
+        "limit": limit,
+    }
+    if filter:
+        stage["filter"] = filter
+    return [
+        {"$vectorSearch": stage},
+        {
+            # `id` instead of `_id`, so results look the same as the local backend's.
+            "$project": {
+                "_id": 0,
+                "id": 1,
+                "text": 1,
+                "metadata": 1,
+                "score": {"$meta": "vectorSearchScore"},
+            }
+        },
+    ]
+
+
+class AtlasVectorBackend:
+    """Index management and `$vectorSearch` queries against MongoDB Atlas."""
+
+    def __init__(self, uri, database=DATABASE_NAME, collection=EMBEDDINGS_COLLECTION, client=None):
+        self.client = client or shared_client(uri)
+        self.collection = self.client[database][collection]
+
+    def get_index(self, name):
+        """The index description from Atlas, or None if it does not exist."""
+        for index in self.collection.list_search_indexes(name):
+            return index
+        return None
+
+    def create_index(self, name, definition):
+        from pymongo.operations import SearchIndexModel
+
+        self.collection.create_search_index(
+            SearchIndexModel(definition=definition, name=name, type="vectorSearch")
+        )
+
+    def update_index(self, name, definition):
+        self.collection.update_search_index(name, definition)
+
+    def search(self, query_vector, limit=LIMIT, num_candidates=NUM_CANDIDATES, index=INDEX_NAME,
+               filter=None):
+        return list(self.collection.aggregate(
+            vector_search_pipeline(query_vector, limit, num_candidates, index, filter=filter)
+        ))
+
+
+class LocalVectorBackend:
+    """The `AtlasVectorBackend` interface over an in-process search engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._indexes = {}
+
+    def get_index(self, name):
+        definition = self._indexes.get(name)
+        if definition is None:
+            return None
+        # An in-memory index is usable as soon as it exists.
+        return {"name": name, "status": "READY", "queryable": True, "latestDefinition": definition}
+
+    def create_index(self, name, definition):
+        for field in definition["fields"]:
+            if field.get("type") == "vector" and field["numDimensions"] != self.engine.dimensions:
+                raise ValueError(
+                    f"index expects {field['numDimensions']} dimensions, "
+                    f"the embeddings have {self.engine.dimensions}"
+                )
+        self._indexes[name] = definition
+
+    def update_index(self, name, definition):
+        self.create_index(name, definition)
+
+    def _check_filter(self, index, filter):
+        """Like Atlas, only fields indexed as `filter` fields may be filtered on."""
+        declared = {
+            field_name(field["path"])
+            for field in self._indexes[index]["fields"] if field.get("type") == "filter"
+        }
+        paths = [key for key in filter if key != "$and"]
+        paths += [key for part in filter.get("$and", []) for key in part]
+        for path in paths:
+            if field_name(path) not in declared:
+                raise ValueError(f"'{path}' is not indexed as a filter field in '{index}'")
+
+    def search(self, query_vector, limit=LIMIT, num_candidates=NUM_CANDIDATES, index=INDEX_NAME,
+               filter=None):
+        if index not in self._indexes:
+            raise LookupError(f"search index '{index}' does not exist")
+        if filter:
+            self._check_filter(index, filter)
+        if isinstance(self.engine, IVFIndex):
+            # Approximate index: honour numCandidates like Atlas does.
+            return self.engine.search(query_vector, limit, num_candidates=num_candidates,
+                                      filter=filter)
+        return self.engine.search(query_vector, limit, filter=filter)
+
+
+class VectorIndexClient:
+    """Creates and waits for the vector index, and answers natural-language queries."""
+
+    def __init__(self, backend, embed_fn, index_name=INDEX_NAME, sleep=time.sleep,
+                 clock=time.monotonic):
+        self.backend = backend
+        # Long records are stored as several chunks; return each record once.
+        self._parents = ParentSearch(backend)
+        self.embed_fn = embed_fn
+        self.index_name = index_name
+        self._sleep = sleep
+        self._clock = clock
+        # (embed seconds, search seconds) of the last TIMINGS_KEPT queries, for profiling.
+        self.timings = deque(maxlen=TIMINGS_KEPT)
+
+    def create_or_update_index(self, definition=None):
+        """Creates the index, or updates it if its definition differs; returns what was done."""
+        definition = definition or index_definition()
+        existing = self.backend.get_index(self.index_name)
+        if existing is None:
+            self.backend.create_index(self.index_name, definition)
+            return "created"
+        if existing.get("latestDefinition") != definition:
+            self.backend.update_index(self.index_name, definition)
+            return "updated"
+        return "unchanged"
+
+    def wait_until_ready(self, timeout=READY_TIMEOUT, poll_interval=POLL_INTERVAL):
+        """Polls until the index is queryable; raises TimeoutError or RuntimeError."""
+        deadline = self._clock() + timeout
+        while True:
+            index = self.backend.get_index(self.index_name)
+            status = index.get("status") if index else "MISSING"
+            if index and status == "READY" and index.get("queryable", True):
+                return index
+            if status == "FAILED":
+                raise RuntimeError(f"search index '{self.index_name}' failed to build")
+            if self._clock() >= deadline:
+                raise TimeoutError(
+                    f"search index '{self.index_name}' is still {status} after {timeout}s"
+                )
+            self._sleep(poll_interval)
+
+    def query(self, text, limit=LIMIT, num_candidates=NUM_CANDIDATES, filter=None):
+        """Embeds `text` and returns the `limit` most similar records.
+
+        `filter` restricts the search to records whose metadata match it, e.g.
+        `{"metadata.county": "Allegany", "metadata.year": {"$in": [2018, 2019]}}`.
+        """
+        start = time.perf_counter()
+        vector = self.embed_fn(text)
+        embedded = time.perf_counter()
+        results = self._parents.search(vector, limit, num_candidates=num_candidates,
+                                       index=self.index_name, filter=filter)
+        self.timings.append((embedded - start, time.perf_counter() - embedded))
+        return results
+
+
+def main():
+    question = " ".join(sys.argv[1:]) or "oil production in New York"
+    uri = setting("MONGODB_URI")
+    if not uri:
+        print("ERROR: MONGODB_URI not found in environment variables.")
+        print("Please add it to your .env file: MONGODB_URI='mongodb+srv://...'")
+        return
+    try:
+        embed = create_query_embedder(model=EMBEDDING_MODEL)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return
+    client = VectorIndexClient(AtlasVectorBackend(uri), embed)
+    print(f"Index '{INDEX_NAME}': {client.create_or_update_index()}.")
+    print("Waiting for the index to be ready...")
+    client.wait_until_ready()
+    print(f"Searching for: {question!r}\n")
+    for result in client.query(question):
+        print(f"[{result['score']:.4f}] {result['text'][:200]}")
+    embed_seconds, search_seconds = client.timings[-1]
+    print(f"\nEmbedding: {embed_seconds * 1000:.0f} ms, search: {search_seconds * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
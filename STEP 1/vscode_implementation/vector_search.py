@@ -0,0 +1,165 @@
+# ==============================================================================
+# LOCAL EXACT VECTOR SEARCH
+# ==============================================================================
+# What it does:
+# Loads the embeddings output (`embeddings.jsonl` or `embeddings.json`) into
+# one contiguous float32 matrix, L2-normalizes it once, and answers top-k
+# cosine-similarity queries with a single matrix-vector product followed by
+# `argpartition`. Many queries can be answered at once with `search_batch`.
+#
+# `search` and `search_batch` accept an Atlas-style `filter` on the metadata
+# `year`, `county` and `operator` fields. Matching rows are looked up in
+# posting lists (`metadata_index.py`) first, so only those rows are scored.
+#
+# Results have the same shape as the `$vectorSearch` + `$project` test in the
+# STEP 3 guide: `id`, `text`, `metadata` and `score`, where `score` uses the
+# Atlas cosine scale `(1 + cosine) / 2` so numbers are directly comparable.
+#
+# Why it's here:
+# It lets you query the embeddings during development or offline, without
+# pasting a 768-number vector into Compass.
+#
+# How to use:
+# >>> engine = VectorSearchEngine.from_file("embeddings.jsonl")
+# >>> engine.search(query_vector, limit=3)
+# >>> engine.search(query_vector, limit=3, filter={"metadata.county": "Allegany", "metadata.year": 2019})
+# ==============================================================================
+
+import json
+
+import numpy as np
+
+from embedding_output import iter_jsonl
+from metadata_index import MetadataIndex
+
+
+def iter_embeddings(filename):
+    """Yields embedding records from a JSON Lines or JSON array output file."""
+    if filename.endswith(".jsonl"):
+        yield from iter_jsonl(filename)
+    else:
+        with open(filename, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def normalize_rows(matrix):
+    """L2-normalizes every row in place (rows of zeros are left as zeros)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def cosine_to_score(cosine):
+    """Converts cosine similarity to the Atlas `vectorSearchScore` scale (0 to 1)."""
+    return (1.0 + cosine) / 2.0
+
+
+def top_k(scores, limit):
+    """Returns the indices of the `limit` highest scores, best first."""
+    limit = min(limit, scores.shape[-1])
+    if limit <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    candidates = np.argpartition(-scores, limit - 1, axis=-1)[..., :limit]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class VectorSearchEngine:
+    """Exact cosine top-k search over an in-memory float32 matrix."""
+
+    # Built on the first filtered search.
+    _metadata_index = None
+
+    def __init__(self, vectors, ids, texts, metadata, normalized=False):
+        if normalized:
+            self.vectors = np.asarray(vectors, dtype=np.float32)
+        else:
+            self.vectors = normalize_rows(np.array(vectors, dtype=np.float32, order="C"))
+        self.ids = ids
+        self.texts = texts
+        self.metadata = metadata
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds the engine from an iterable of embedding records."""
+        ids, texts, metadata, rows = [], [], [], []
+        for record in records:
+            ids.append(record["id"])
+            texts.append(record.get("text"))
+            metadata.append(record.get("metadata"))
+            rows.append(np.asarray(record["vector"], dtype=np.float32))
+        if not rows:
+            raise ValueError("no embeddings to search")
+        return cls(normalize_rows(np.vstack(rows)), ids, texts, metadata, normalized=True)
+
+    @classmethod
+    def from_file(cls, filename):
+        """Builds the engine from an embeddings output file."""
+        return cls.from_records(iter_embeddings(filename))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimensions(self):
+        return self.vectors.shape[1]
+
+    def _prepare_queries(self, queries):
+        queries = np.array(queries, dtype=np.float32, ndmin=2)
+        if queries.shape[1] != self.dimensions:
+            raise ValueError(
+                f"query has {queries.shape[1]} dimensions, the index has {self.dimensions}"
+            )
+        return normalize_rows(queries)
+
+    def result(self, index, cosine):
+        """Formats one hit like the STEP 3 `$project` stage."""
+        return {
+            "id": self.ids[index],
+            "text": self.texts[index],
+            "metadata": self.metadata[index],
+            "score": float(cosine_to_score(cosine)),
+        }
+
+    @property
+    def metadata_index(self):
+        """Posting lists over the filterable metadata fields, built on first use."""
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadata)
+        return self._metadata_index
+
+    def _scores(self, queries, rows=None):
+        """Similarities of every query with every row (or only with `rows`)."""
+        if rows is None:
+            return queries @ self.vectors.T
+        if len(rows) > len(self.vectors) // 4:
+            # Copying a large subset costs more than scoring everything.
+            return (queries @ self.vectors.T)[:, rows]
+        return queries @ self.vectors[rows].T
+
+    def search(self, query_vector, limit=3, filter=None):
+        """Returns the `limit` most similar records to one query vector.
+
+        With a `filter`, only records whose metadata match it are considered.
+        """
+        query = self._prepare_queries([query_vector])[0]
+        if not filter:
+            similarities = self.vectors @ query
+            return [self.result(index, similarities[index]) for index in top_k(similarities, limit)]
+        rows = self.metadata_index.rows(filter)
+        similarities = self._scores(query[None, :], rows)[0]
+        return [self.result(rows[i], similarities[i]) for i in top_k(similarities, limit)]
+
+    def search_batch(self, query_vectors, limit=3, filter=None):
+        """Answers many queries with one matrix product; returns one result list per query."""
+        queries = self._prepare_queries(query_vectors)
+        rows = self.metadata_index.rows(filter) if filter else None
+        similarities = self._scores(queries, rows)
+        best = top_k(similarities, limit)
+        if rows is None:
+            rows = np.arange(similarities.shape[1])
+        return [
+            [self.result(rows[index], similarities[row, index]) for index in best[row]]
+            for row in range(len(queries))
+        ]
@@ -0,0 +1,311 @@
+# ==============================================================================
+# BINARY, MEMORY-MAPPED EMBEDDING STORE
+# ==============================================================================
+# What it does:
+# Stores embeddings as a directory with four files:
+# - `vectors.bin`    all vectors as one raw little-endian float32 (or float16)
+#                    matrix, one row per record, opened with `numpy.memmap`;
+# - `records.jsonl`  one `{"id", "text", "metadata"}` line per row;
+# - `offsets.npy`    the byte offset of every line in `records.jsonl`, so any
+#                    record can be read on its own without parsing the rest;
+# - `meta.json`      row count, dimensions, dtype and whether the vectors are
+#                    already unit length.
+#
+# Opening a store reads only `meta.json` and `offsets.npy`. Vectors and records
+# stay on disk and are paged in by the operating system when they are used, so
+# a 1M-vector store opens almost instantly and is not copied into the heap.
+#
+# Why it's here:
+# `embeddings.json` stores each 768-number vector as pretty-printed decimal
+# text (10-15 KB per record), which is slow to parse and turns into millions
+# of Python float objects when loaded. float32 needs 3 KB per vector, float16
+# 1.5 KB.
+#
+# How to run (converts an existing embeddings file):
+# > python vector_store.py
+#
+# How to use:
+# >>> store = VectorStore.open("embeddings_store")
+# >>> store.vectors[42], store.record(42)
+# >>> engine = store.search_engine()        # VectorSearchEngine over the memmap
+#
+# `update_store` replaces or removes the rows of some records (used by
+# `incremental_update.py`) by copying the rest into a new store.
+# ==============================================================================
+
+import importlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from embedding_engine import iter_batches
+from embedding_output import iter_jsonl, line_record_id
+from vector_search import VectorSearchEngine
+
+# --- CONFIGURATION ---
+# The embeddings file to convert (`embeddings.jsonl` or `embeddings.json`).
+INPUT_FILE = "embeddings.jsonl"
+# The directory the store is written to.
+STORE_DIR = "embeddings_store"
+# "float32" keeps the vectors exact; "float16" halves the size again.
+VECTOR_DTYPE = "float32"
+# ---------------------
+
+VECTORS_FILE = "vectors.bin"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+
+# Rows whose length is within this distance of 1 count as normalized.
+_UNIT_TOLERANCE = 1e-3
+
+
+class VectorStoreWriter:
+    """Appends embedding records to a new store; `close()` finishes it."""
+
+    def __init__(self, directory, dtype=VECTOR_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        os.makedirs(directory, exist_ok=True)
+        # Rewriting a store in place: drop the old meta.json first, so a crash
+        # before close() leaves a store that is known to be incomplete.
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self._vectors = open(os.path.join(directory, VECTORS_FILE), "wb")
+        self._records = open(os.path.join(directory, RECORDS_FILE), "wb")
+        self._offsets = [0]
+        self.dimensions = None
+        self.normalized = True
+        self.count = 0
+
+    def write_batch(self, results):
+        """Appends a list of `{"id", "text", "vector", "metadata"}` records."""
+        if not results:
+            return
+        matrix = np.array([result["vector"] for result in results], dtype=np.float32, ndmin=2)
+        lines = [
+            json.dumps(
+                {"id": result["id"], "text": result.get("text"), "metadata": result.get("metadata")},
+                ensure_ascii=False,
+            ).encode("utf-8") + b"\n"
+            for result in results
+        ]
+        self.write_rows(matrix, lines)
+
+    def write_rows(self, matrix, lines):
+        """Appends a matrix of vectors and their `records.jsonl` lines (bytes, newline included)."""
+        if not lines:
+            return
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.dimensions is None:
+            self.dimensions = matrix.shape[1]
+        elif matrix.shape[1] != self.dimensions:
+            raise ValueError(
+                f"vector has {matrix.shape[1]} dimensions, the store has {self.dimensions}"
+            )
+        norms = np.linalg.norm(matrix, axis=1)
+        self.normalized = self.normalized and bool(np.all(np.abs(norms - 1) <= _UNIT_TOLERANCE))
+        self._vectors.write(matrix.astype(self.dtype).tobytes())
+        for line in lines:
+            self._records.write(line)
+            self._offsets.append(self._records.tell())
+        self.count += len(lines)
+
+    def close(self):
+        """Writes the offsets and `meta.json`; the store is complete once this returns."""
+        self._vectors.close()
+        self._records.close()
+        np.save(os.path.join(self.directory, OFFSETS_FILE), np.array(self._offsets, dtype=np.int64))
+        meta = {
+            "count": self.count,
+            "dimensions": self.dimensions or 0,
+            "dtype": self.dtype.name,
+            "normalized": self.normalized,
+        }
+        # meta.json is written last, so a store without it is known to be incomplete.
+        with open(os.path.join(self.directory, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Column:
+    """A read-only, lazily loaded list view of one record field."""
+
+    def __init__(self, store, field):
+        self._store = store
+        self._field = field
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, index):
+        return self._store.record(index)[self._field]
+
+    def __iter__(self):
+        for record in self._store.iter_records():
+            yield record[self._field]
+
+
+class VectorStore:
+    """A store opened for reading; vectors and records stay on disk until used."""
+
+    def __init__(self, directory, vectors, offsets, meta):
+        self.directory = directory
+        self.vectors = vectors
+        self.normalized = meta["normalized"]
+        self._offsets = offsets
+        self._records_path = os.path.join(directory, RECORDS_FILE)
+        self._records = None
+        self.ids = _Column(self, "id")
+        self.texts = _Column(self, "text")
+        self.metadata = _Column(self, "metadata")
+
+    @classmethod
+    def open(cls, directory):
+        """Opens a store written by `VectorStoreWriter` without loading it."""
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"'{directory}' is not a complete vector store (no {META_FILE})")
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        shape = (meta["count"], meta["dimensions"])
+        dtype = np.dtype(meta["dtype"]).newbyteorder("<")
+        if meta["count"]:
+            vectors = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=dtype, mode="r", shape=shape)
+        else:
+            vectors = np.empty(shape, dtype=dtype)
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        return cls(directory, vectors, offsets, meta)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def close(self):
+        """Drops this store's memory maps, so its files can be moved or deleted.
+
+        The id/text/metadata columns point back at the store, so it is not
+        freed (nor are its maps) as soon as the last outside reference goes.
+        """
+        self.vectors = self._offsets = self._records = None
+
+    @property
+    def dimensions(self):
+        return self.vectors.shape[1]
+
+    def record(self, index):
+        """Reads the `id`, `text` and `metadata` of one row."""
+        if self._records is None:
+            with open(self._records_path, "rb") as f:
+                # An empty file cannot be memory-mapped; an empty store has no rows anyway.
+                self._records = np.memmap(f, dtype=np.uint8, mode="r") if self._offsets[-1] else b""
+        index = range(len(self))[index]
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return json.loads(bytes(self._records[start:end]))
+
+    def iter_records(self, with_vectors=False):
+        """Yields every record in row order, optionally with its `vector` as a list."""
+        with open(self._records_path, "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                if with_vectors:
+                    record["vector"] = self.vectors[row].astype(np.float32).tolist()
+                yield record
+
+    def search_engine(self):
+        """A `VectorSearchEngine` that searches the memory-mapped vectors directly.
+
+        float32 stores that are already normalized are used without a copy;
+        otherwise the vectors are converted (and normalized) into memory.
+        """
+        copy_free = self.normalized and self.vectors.dtype == np.float32
+        return VectorSearchEngine(self.vectors, self.ids, self.texts, self.metadata, normalized=copy_free)
+
+
+def iter_embeddings_file(filename):
+    """Yields records from `embeddings.jsonl`, or one at a time from `embeddings.json`."""
+    if filename.endswith(".jsonl"):
+        yield from iter_jsonl(filename)
+        return
+    # Reuses the incremental JSON array reader from the clean step, so even a
+    # very large embeddings.json is never fully in memory.
+    iter_json_array = importlib.import_module("2_clean_json").iter_json_array
+    with open(filename, "r", encoding="utf-8") as f:
+        yield from iter_json_array(f, json.JSONDecoder())
+
+
+def convert_embeddings_file(input_file=INPUT_FILE, directory=STORE_DIR, dtype=VECTOR_DTYPE,
+                            batch_size=10_000):
+    """Converts an embeddings JSON / JSON Lines file into a vector store; returns its size."""
+    with VectorStoreWriter(directory, dtype) as writer:
+        batch = []
+        for record in iter_embeddings_file(input_file):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                writer.write_batch(batch)
+                batch = []
+        writer.write_batch(batch)
+    return writer.count
+
+
+def update_store(directory, record_ids, results, batch_size=10_000):
+    """Rewrites a store without the rows of `record_ids` (and their chunks), plus `results`.
+
+    Kept rows are copied as they are, vectors and record lines alike, so
+    nothing is parsed or converted; the new store replaces the old one only
+    once it is complete. Returns the number of (removed, added) rows.
+    """
+    store = VectorStore.open(directory)
+    tmp = directory + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    removed = 0
+    try:
+        with VectorStoreWriter(tmp, store.vectors.dtype.name) as writer:
+            rows, lines = [], []
+            with open(store._records_path, "rb") as f:
+                for row, line in zip(range(len(store)), f):
+                    if line_record_id(line.decode("utf-8")) in record_ids:
+                        removed += 1
+                        continue
+                    rows.append(row)
+                    lines.append(line)
+                    if len(rows) >= batch_size:
+                        writer.write_rows(store.vectors[rows], lines)
+                        rows, lines = [], []
+            writer.write_rows(store.vectors[rows], lines)
+            kept = writer.count
+            for batch in iter_batches(results, batch_size):
+                writer.write_batch(batch)
+    finally:
+        # Windows cannot rename a directory with mapped files in it.
+        store.close()
+    old = directory + ".old"
+    if os.path.exists(old):
+        # Left behind by an update that was interrupted after the swap.
+        shutil.rmtree(old)
+    os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old)
+    return removed, writer.count - kept
+
+
+if __name__ == "__main__":
+    print(f"Converting '{INPUT_FILE}' into the {VECTOR_DTYPE} vector store '{STORE_DIR}'...")
+    try:
+        count = convert_embeddings_file()
+        size = sum(
+            os.path.getsize(os.path.join(STORE_DIR, name))
+            for name in (VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE, META_FILE)
+        )
+        print(f"Success! {count:,} records, {size / 1024 / 1024:,.1f} MB on disk "
+              f"(was {os.path.getsize(INPUT_FILE) / 1024 / 1024:,.1f} MB).")
+    except FileNotFoundError:
+        print(f"ERROR: The input file '{INPUT_FILE}' was not found. Run the embeddings step first.")